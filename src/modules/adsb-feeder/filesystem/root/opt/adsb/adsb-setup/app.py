@@ -1,6 +1,5 @@
 import base64
 import copy
-import filecmp
 import gzip
 import io
 import ipaddress
@@ -17,6 +16,7 @@ import secrets
 import shlex
 import shutil
 import signal
+import sqlite3
 import string
 import subprocess
 import sys
@@ -29,7 +29,7 @@ from base64 import b64encode
 from copy import deepcopy
 from datetime import datetime, timezone
 from time import sleep
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from uuid import uuid4
 from zlib import compress
 
@@ -48,10 +48,15 @@ from flask import (
     url_for,
 )
 from flask.logging import logging as flask_logging  # pyright: ignore[reportPrivateImportUsage]
-from utils.agg_status import AggStatus, Healthcheck, ImStatus
+from utils.agg_status import AggStatus, AggStatusPool, Healthcheck, ImStatus
+from utils.aircraft import AircraftSnapshot
+from utils.airports import AirportIndex
 from utils.auth import WebAuth
 from utils.background import Background
+from utils.backup import BackupEngine
+from utils.compose import ComposeImpact
 from utils.config import (
+    config_cache_stats,
     config_lock,
     read_values_from_env_file,
     write_values_to_config_json,
@@ -59,7 +64,12 @@ from utils.config import (
 )
 from utils.data import Data
 from utils.environment import Env
+from utils.events import EventHub
 from utils.flask import RouteManager, check_restart_lock
+from utils.http_client import http_client
+from utils.icao_set import IcaoSet
+from utils.logtail import LogFollower, parse_last_event_id
+from utils.microfeeders import MicroPoller
 from utils.netconfig import UltrafeederConfig
 from utils.other_aggregators import (
     ADSBHub,
@@ -73,8 +83,12 @@ from utils.other_aggregators import (
     Sdrmap,
     Uk1090,
 )
-from utils.paths import get_adsb_base_dir
+from utils.paths import AIRPORTS_FILE, BACKUP_MANIFEST_FILE, STATS_DB_FILE, get_adsb_base_dir
+from utils.prom import PromSnapshot
+from utils.restore import RestoreEngine
 from utils.sdr import SDRDevices
+from utils.server import Server
+from utils.stats_store import DAY, RESOLUTIONS, StatsStore
 from utils.system import System
 from utils.util import (
     cleanup_str,
@@ -113,6 +127,7 @@ flask_logging.getLogger("werkzeug").addFilter(NoStatic())
 class AdsbIm:
     def __init__(self):
         print_err("starting AdsbIm.__init__", level=4)
+        init_start = time.perf_counter()
         self._d = Data()
         os_flag_file = self._d.data_path / "os.adsb.feeder.image"
         if os_flag_file.exists():
@@ -121,6 +136,9 @@ class AdsbIm:
                 print_err("Using the staging infrastructure as backend")
                 self._d.adsbim_api_url = "https://staging.adsb.im/api"
         self._system = System(data=self._d)
+        # .env variables that changed since containers were last (re)started after a settings change
+        self._pending_env_changes: set[str] = set()
+        self._compose_impact = ComposeImpact()
         self.app = Flask(__name__)
         # Initialize authentication system (with persistent secret key)
         if self._d.env_by_tags("app_secret").valuestr == "":
@@ -250,12 +268,32 @@ class AdsbIm:
 
         self._current_site_name = None
         self._agg_status_instances = dict()
+        self._agg_status_instances_lock = threading.Lock()
+        self._agg_status_pool = AggStatusPool(on_done=self.publish_agg_status)
+        # everything the index page used to poll for, pushed to /api/events
+        self._events = EventHub()
+        # one reader of the image log for all /stream-log clients
+        self._log_follower = LogFollower("/run/adsb-feeder-image.log")
+        try:
+            self._stats_store: Optional[StatsStore] = StatsStore(str(STATS_DB_FILE))
+        except sqlite3.Error as e:
+            print_err(f"can't open the stats database {STATS_DB_FILE}: {e}")
+            self._stats_store = None
         self._im_status = ImStatus(self._d)
+        # the most recent backup, for /api/backup_progress
+        self._backup: Optional[BackupEngine] = None
+        # the backup that is being uploaded / restored, for /api/restore_progress
+        self._restore: Optional[RestoreEngine] = None
         self._next_url_from_director = ""
         self._last_stage2_contact = ""
         self._last_stage2_contact_time = 0
 
-        self._last_base_info = dict()
+        # fetches base_info from all microfeeders concurrently, remembering ports and ETags and backing off from dead ones
+        self._micro_poller = MicroPoller()
+        self._server: Optional[Server] = None
+        # offline closest airport lookups, loaded on first use
+        self._airport_index: Optional[AirportIndex] = None
+        self._airport_index_lock = threading.Lock()
 
         self._multi_outline_bg = None
         self._push_multi_thread = None
@@ -314,6 +352,8 @@ class AdsbIm:
         ]
         self.agg_matrix = None
         self.agg_structure = []
+        # Env.generation() the aggregator structure was built for
+        self._agg_structure_generation = -1
         self.last_cache_agg_status = 0.0
         self.ci = False
         self.cache_agg_status_lock = threading.Lock()
@@ -363,8 +403,10 @@ class AdsbIm:
         self.app.add_url_rule("/backupexecutegraphs", "backupexecutegraphs", self.backup_execute_graphs)
         self.app.add_url_rule("/backupexecuteconfig", "backupexecuteconfig", self.backup_execute_config)
         self.app.add_url_rule("/backupexecuteskystatsdb", "backupexecuteskystatsdb", self.backup_execute_skystats_db)
+        self.app.add_url_rule("/api/backup_progress", "backup_progress", self.backup_progress)
         self.app.add_url_rule("/restore", "restore", self.restore, methods=["GET", "POST"])
         self.app.add_url_rule("/executerestore", "executerestore", self.executerestore, methods=["GET", "POST"])
+        self.app.add_url_rule("/api/restore_progress", "restore_progress", self.restore_progress)
         self.app.add_url_rule("/sdr_setup", "sdr_setup", self.sdr_setup, methods=["GET", "POST"])
         self.app.add_url_rule("/visualization", "visualization", self.visualization, methods=["GET", "POST"])
         self.app.add_url_rule("/advanced", "advanced", self.advanced, methods=["GET", "POST"])
@@ -391,6 +433,9 @@ class AdsbIm:
         self.app.add_url_rule("/api/stage2_connection", "stage2_connection", self.stage2_connection)
         self.app.add_url_rule("/api/get_temperatures.json", "temperatures", self.temperatures)
         self.app.add_url_rule("/api/ambient_raw", "ambient_raw", self.ambient_raw)
+        self.app.add_url_rule("/api/debug/config_stats", "config_stats", self.config_stats)
+        self.app.add_url_rule("/api/debug/http_stats", "http_stats", self.http_stats)
+        self.app.add_url_rule("/api/events", "events", self.events)
         self.app.add_url_rule("/api/check_changelog_status", "check_changelog_status", self.check_changelog_status)
         self.app.add_url_rule("/api/mark_changelog_seen", "mark_changelog_seen", self.mark_changelog_seen, methods=["POST"])
         self.app.add_url_rule("/api/scan_wifi", "scan_wifi", self.scan_wifi)
@@ -432,6 +477,7 @@ class AdsbIm:
         # to lists)
         with config_lock:
             write_values_to_config_json(self._d.env_values, reason="Startup")
+        self._d.startup_timing["AdsbIm init"] = time.perf_counter() - init_start
 
     def require_auth(self, f):
         """Decorator to require authentication for a route."""
@@ -592,9 +638,32 @@ class AdsbIm:
 
         threading.Thread(target=update_dns).start()
 
-    def write_envfile(self):
-        print_err("writing env file")
-        write_values_to_env_file(self._d.envs_for_envfile)
+    def write_envfile(self, force=False):
+        # only regenerate the .env file if a relevant Env changed - returns the set of changed variables
+        values, changed = self._d.envfile_changes(force=force)
+        if values is None:
+            print_err("env file unchanged", level=8)
+            return changed
+        print_err(f"writing env file ({len(changed)} changed variables)")
+        write_values_to_env_file(values)
+        self._pending_env_changes |= changed
+        return changed
+
+    def start_affected_containers(self):
+        # recreate only the services that use one of the changed .env variables; if the set of
+        # compose files could have changed (or we can't tell), fall back to docker-compose-start
+        changed, self._pending_env_changes = self._pending_env_changes, set()
+
+        def start():
+            services = self._compose_impact.services_for(changed, self._system.list_containers()) if changed else None
+            if services:
+                self._system.recreate_containers(sorted(services))
+            else:
+                self._system.start_containers()
+
+        if not self._system._restart.bg_run(func=start):
+            # try again with the next settings change
+            self._pending_env_changes |= changed
 
     def setup_ultrafeeder_args(self):
         # set all of the ultrafeeder config data up
@@ -681,8 +750,12 @@ class AdsbIm:
         # fmt: on
 
         print_err("startup: run handle_implied_settings()")
+        phase_start = time.perf_counter()
         self.handle_implied_settings()
-        self.write_envfile()
+        self.write_envfile(force=True)
+        # the containers get started with this .env file, there's nothing to recreate yet
+        self._pending_env_changes.clear()
+        self._d.startup_timing["implied settings and .env"] = time.perf_counter() - phase_start
 
         # if all the user wanted is to make sure the housekeeping tasks are completed,
         # don't start the flask app and exit instead
@@ -694,16 +767,22 @@ class AdsbIm:
         if self._d.is_enabled("use_gpsd"):
             self.get_lat_lon_alt()
 
+        self._system.start_docker_watcher()
+        threading.Thread(target=self.events_feeder, name="events-feeder", daemon=True).start()
+
         self._every_minute = Background(60, self.every_minute)
         # every_minute stuff is required to initialize some values, run it synchronously
         print_err("startup: run every_minute()")
+        phase_start = time.perf_counter()
         self.every_minute()
+        self._d.startup_timing["every_minute"] = time.perf_counter() - phase_start
 
         if self._d.is_enabled("stage2"):
-            # let's make sure we tell the micro feeders every ten minutes that
-            # the stage2 is around, looking at them
+            # let's make sure we tell the micro feeders every minute that
+            # the stage2 is around, looking at them - thanks to the ETags an unchanged
+            # microfeeder only costs an empty 304, and dead ones are backed off
             threading.Thread(target=self.stage2_checks).start()
-            self._stage2_checks = Background(600, self.stage2_checks)
+            self._stage2_checks = Background(60, self.stage2_checks)
 
         # reset undervoltage indicator
         self._d.env_by_tags("under_voltage").value = False
@@ -716,12 +795,28 @@ class AdsbIm:
         log = logging.getLogger("werkzeug")
         log.setLevel(logging.ERROR)
 
-        print_err("starting up werkzeug")
-        self.app.run(
-            host="0.0.0.0",
-            port=self._d.env_by_tags("webport").valueint,
-            debug=debug,
-        )
+        print_err(f"startup timing: {self._d.startup_timing_str()}")
+        # these responses stay open as long as the client wants (or until the pipe feeding them ends),
+        # so they get their own threads instead of tying up the pool
+        streams = [
+            "/api/events",
+            "/stream-log",
+            "/get-logs",
+            "/view-logs",
+            "/backupexecutefull",
+            "/backupexecutegraphs",
+            "/backupexecuteconfig",
+            "/backupexecuteskystatsdb",
+        ]
+        self._server = Server(self.app, "0.0.0.0", self._d.env_by_tags("webport").valueint, debug=debug, stream_paths=streams)
+        self._server.serve()
+
+    def shutdown_server(self):
+        # called from the signal handler: end the event streams, stop taking requests and let the running ones finish
+        self._events.close()
+        self._log_follower.close()
+        if self._server:
+            self._server.shutdown()
 
     # only need to check for undervoltage during runtime in monitor_dmesg
     # let's keep this around for the moment
@@ -846,9 +941,7 @@ class AdsbIm:
         self._push_multi_thread = thread
 
     def stage2_checks(self):
-        for i in self.micro_indices():
-            if self._d.env_by_tags("mf_version").list_get(i) != "not an adsb.im feeder":
-                self.get_base_info(i)
+        self.refresh_micro_info(self.micro_indices())
 
     def geojson(self):
         print_err("got geojson request")
@@ -916,6 +1009,12 @@ class AdsbIm:
     def backup_execute_full(self):
         return self.create_backup_zip(include_graphs=True, include_heatmap=True)
 
+    def backup_progress(self):
+        # how far along the most recent backup download is
+        if not self._backup:
+            return {"state": "idle"}
+        return self._backup.progress()
+
     def backup_execute_skystats_db(self):
         db_user = self._d.env_by_tags("skystats_db_user").value
         db_password = self._d.env_by_tags("skystats_db_password").value
@@ -962,103 +1061,29 @@ class AdsbIm:
 
     def create_backup_zip(self, include_graphs=False, include_heatmap=False):
         adsb_path = self._d.config_path
+        incremental = include_heatmap and request.args.get("incremental") == "1"
 
-        def graphs1090_writeback(uf_path, microIndex):
-            # the rrd file will be updated via move after collectd is done writing it out
-            # so killing collectd and waiting for the mtime to change is enough
-
-            rrd_file = uf_path / "graphs1090/rrd/localhost.tar.gz"
-
-            def timeSinceWrite(rrd_file):
-                # because of the way the file gets updated, it will briefly not exist
-                # when the new copy is moved in place, which will make os.stat unhappy
-                try:
-                    return time.time() - os.stat(rrd_file).st_mtime
-                except Exception:
-                    return time.time() - 0  # fallback to long time since last write
-
-            context = f"graphs1090 writeback {microIndex}"
-
-            t = timeSinceWrite(rrd_file)
-            if t < 120:
-                print_err(f"{context}: not needed, timeSinceWrite: {round(t)}s")
-                return
-
-            print_err(f"{context}: requesting")
-            try:
-                if microIndex == 0:
-                    uf_container = "ultrafeeder"
-                else:
-                    uf_container = f"uf_{microIndex}"
-                subprocess.run(
-                    f"docker exec {uf_container} pkill collectd",
-                    timeout=10.0,
-                    shell=True,
-                    check=True,
-                )
-            except Exception:
-                report_issue(f"{context}: docker exec failed - backed up graph data might miss up to 6h")
-                pass
+        sites = []
+        for microIndex in [0] + self.micro_indices():
+            if microIndex == 0:
+                uf_path = adsb_path / "ultrafeeder"
             else:
-                count = 0.0
-                increment = 0.1
-                # give up after 30 seconds
-                while count < 30:
-                    count += increment
-                    sleep(increment)
-                    if timeSinceWrite(rrd_file) < 120:
-                        print_err(f"{context}: success")
-                        return
-
-                report_issue(f"{context}: writeback timed out - backed up graph data might miss up to 6h")
+                uf_path = adsb_path / "ultrafeeder" / str(self._d.env_by_tags("mf_ip").list_get(microIndex))
+            sites.append((microIndex, uf_path))
 
         fdOut, fdIn = os.pipe()
         pipeOut = os.fdopen(fdOut, "rb")
         pipeIn = os.fdopen(fdIn, "wb")
 
-        def zip2fobj(fobj, include_graphs, include_heatmap):
-            try:
-                with fobj as file, zipfile.ZipFile(file, mode="w") as backup_zip:
-                    backup_zip.write(adsb_path / "config.json", arcname="config.json")
-
-                    for microIndex in [0] + self.micro_indices():
-                        if microIndex == 0:
-                            uf_path = adsb_path / "ultrafeeder"
-                        else:
-                            uf_path = adsb_path / "ultrafeeder" / str(self._d.env_by_tags("mf_ip").list_get(microIndex))
-
-                        gh_path = uf_path / "globe_history"
-                        if include_heatmap and gh_path.is_dir():
-                            for subpath in gh_path.iterdir():
-                                pstring = str(subpath)
-                                if subpath.name == "internal_state":
-                                    continue
-                                if subpath.name == "tar1090-update":
-                                    continue
-
-                                print_err(f"add: {pstring}")
-                                for f in subpath.rglob("*"):
-                                    backup_zip.write(f, arcname=f.relative_to(adsb_path))
-
-                        # do graphs after heatmap data as this can pause a couple seconds in graphs1090_writeback
-                        # due to buffers, the download won't be recognized by the browsers until some data is added to the zipfile
-                        if include_graphs:
-                            graphs1090_writeback(uf_path, microIndex)
-                            graphs_path = uf_path / "graphs1090/rrd/localhost.tar.gz"
-                            if graphs_path.exists():
-                                backup_zip.write(graphs_path, arcname=graphs_path.relative_to(adsb_path))
-                            else:
-                                report_issue(f"graphs1090 backup failed, file not found: {graphs_path}")
-
-            except BrokenPipeError:
-                report_issue(f"warning: backup download aborted mid-stream")
-
+        self._backup = BackupEngine(adsb_path, BACKUP_MANIFEST_FILE)
         thread = threading.Thread(
-            target=zip2fobj,
+            target=self._backup.write,
             kwargs={
                 "fobj": pipeIn,
+                "sites": sites,
                 "include_graphs": include_graphs,
                 "include_heatmap": include_heatmap,
+                "incremental": incremental,
             },
         )
         thread.start()
@@ -1067,7 +1092,7 @@ class AdsbIm:
         if self._d.is_enabled("stage2"):
             site_name = f"stage2-{site_name}"
         now = datetime.now().replace(microsecond=0).isoformat().replace(":", "-")
-        download_name = f"adsb-feeder-config-{site_name}-{now}.backup"
+        download_name = f"adsb-feeder-config-{site_name}-{now}{'-incremental' if incremental else ''}.backup"
         try:
             return send_file(
                 pipeOut,
@@ -1122,20 +1147,10 @@ class AdsbIm:
             shutil.rmtree(restore_path, ignore_errors=True)
             restore_path.mkdir(mode=0o755, exist_ok=True)  # was 0o644; directories need execute bit
 
-            received_bytes = 0
-            next_progress = time.time() + 5
-
-            with open(restore_path / filename, "bw") as f:
-                # this while loop looks backwards but it's not because we start with the first chunk
-                # we read further up in this function
-                while len(chunk) > 0:
-                    received_bytes += len(chunk)
-                    if time.time() > next_progress:
-                        next_progress = time.time() + 5
-                        print_err(f"Restore: upload progress: {round(received_bytes / (1024 * 1024))} MB")
-
-                    f.write(chunk)
-                    chunk = request.stream.read(chunk_size)
+            # the first line of the body is the multipart boundary, which also closes the file part
+            boundary = header_bytes.split(b"\r\n", 1)[0][2:]
+            self._restore = RestoreEngine(restore_path / filename)
+            self._restore.receive(request.stream, chunk, boundary, request.content_length or 0)
 
             print_err(f"Restore: saved file to {restore_path / filename}")
             return redirect(url_for("executerestore", zipfile=filename))
@@ -1153,76 +1168,104 @@ class AdsbIm:
             return render_template("/restarting.html")
         return self.restore_get(request)
 
+    def restore_engine(self, filename) -> RestoreEngine:
+        # normally the engine that received the upload, unless we were restarted since
+        path = pathlib.Path(f"{get_adsb_base_dir()}/config/restore") / secure_filename(filename)
+        if not self._restore or self._restore.path != path:
+            self._restore = RestoreEngine(path)
+        return self._restore
+
+    def restore_progress(self):
+        # upload / extraction progress of the current restore
+        if not self._restore:
+            return {"state": "idle"}
+        return self._restore.progress()
+
     def restore_get(self, request):
         # the user has uploaded a zip file and we need to take a look.
         # be very careful with the content of this zip file...
         print_err("zip file uploaded, looking at the content")
-        filename = secure_filename(request.args["zipfile"])  # sanitize user-supplied filename
         adsb_path = pathlib.Path(f"{get_adsb_base_dir()}/config")
-        restore_path = adsb_path / "restore"
-        restore_path.mkdir(mode=0o755, exist_ok=True)
-        restored_files: List[str] = []
-        with zipfile.ZipFile(restore_path / filename, "r") as restore_zip:
-            for name in restore_zip.namelist():
-                print_err(f"found file {name} in archive")
-                # remove files with a name that results in a path that doesn't start with our decompress path
-                if not str(os.path.normpath(os.path.join(restore_path, name))).startswith(str(restore_path)):
-                    print_err(f"restore skipped for path breakout name: {name}")
-                    continue
-                # only accept the .env file and config.json and files for ultrafeeder
-                if name != ".env" and name != "config.json" and not name.startswith("ultrafeeder/"):
-                    continue
-                restore_zip.extract(name, restore_path)
-                restored_files.append(name)
+        restore = self.restore_engine(request.args["zipfile"])  # sanitized in restore_engine
+        try:
+            members = restore.members()
+        except (OSError, zipfile.BadZipFile) as err:
+            flash(f"Can't read the backup file: {err}")
+            return redirect(url_for("restore"))
+        missing = restore.check_manifest()
+        if missing:
+            flash(f"The backup file is incomplete, {len(missing)} files are missing or truncated, e.g. {missing[0]}")
+        if restore.incremental:
+            since = restore.manifest.get("since") if restore.manifest else None
+            flash(
+                f"This is an incremental backup, it only has the files changed since the backup from {since}; "
+                "files it doesn't have are left as they are"
+            )
         # now check which ones are different from the installed versions
         changed: List[str] = []
         unchanged: List[str] = []
         uf_paths = set()
-        for name in restored_files:
+        for name in members:
             if name.startswith("ultrafeeder/"):
                 parts = name.split("/")
                 if len(parts) < 3:
                     continue
                 uf_paths.add(parts[0] + "/" + parts[1] + "/")
             elif os.path.isfile(adsb_path / name):
-                if filecmp.cmp(adsb_path / name, restore_path / name):
+                if not restore.differs(name, adsb_path / name):
                     print_err(f"{name} is unchanged")
                     unchanged.append(name)
                 else:
                     print_err(f"{name} is different from current version")
                     changed.append(name)
 
-        changed += list(uf_paths)
+        changed += sorted(uf_paths)
 
         print_err(f"offering the usr to restore the changed files: {changed}")
-        return render_template("/restoreexecute.html", changed=changed, unchanged=unchanged)
+        return render_template("/restoreexecute.html", changed=changed, unchanged=unchanged, zipfile=restore.path.name)
 
     def restore_post(self, form):
         # they have selected the files to restore
         print_err("restoring the files the user selected")
         adsb_path = pathlib.Path(f"{get_adsb_base_dir()}/config")
         (adsb_path / "ultrafeeder").mkdir(mode=0o755, exist_ok=True)
-        restore_path = adsb_path / "restore"
-        restore_path.mkdir(mode=0o755, exist_ok=True)
+        restore = self.restore_engine(form.get("zipfile", ""))
+        try:
+            restore.members()
+        except (OSError, zipfile.BadZipFile) as err:
+            print_err(f"restore: can't read {restore.path}: {err}")
+            return
         try:
             subprocess.call(f"{get_adsb_base_dir()}/docker-compose-adsb down -t 30", timeout=40.0, shell=True)
         except subprocess.TimeoutExpired:
             print_err("timeout expired stopping docker... trying to continue...")
         for name, value in form.items():
             if value == "1":
+                names = restore.names(name) if name.endswith("/") else [name] if name in restore.members() else []
+                if not names:
+                    print_err(f"restore: {name} isn't in the backup")
+                    continue
                 print_err(f"restoring {name}")
+                if name.endswith("/"):
+                    # straight from the uploaded archive into place
+                    try:
+                        restore.restore_dir(name, adsb_path)
+                    except Exception:
+                        print_err(f"restore of {name} failed: {traceback.format_exc()}")
+                    continue
                 dest = adsb_path / name
                 if dest.is_file():
                     shutil.move(dest, adsb_path / (name + ".dist"))
-                elif dest.is_dir():
-                    shutil.rmtree(dest, ignore_errors=True)
 
                 if name != "config.json" and name != ".env":
-                    shutil.move(restore_path / name, dest)
+                    try:
+                        restore.extract(names, adsb_path)
+                    except Exception:
+                        print_err(f"restore of {name} failed: {traceback.format_exc()}")
                     continue
 
                 with config_lock:
-                    shutil.move(restore_path / name, dest)
+                    restore.extract(names, adsb_path)
 
                     if name == ".env":
                         if "config.json" in form.keys():
@@ -1278,7 +1321,8 @@ class AdsbIm:
                 print_err("timeout expired joining Zerotier network... trying to continue...")
 
         self.handle_implied_settings()
-        self.write_envfile()
+        # the values were pulled from the restored config.json, so nothing is marked dirty
+        self.write_envfile(force=True)
 
         # adjust the planes per day stuff to potentially more / less microsites
         self.load_planes_seen_per_day()
@@ -1286,6 +1330,7 @@ class AdsbIm:
         # make sure the cpuinfo files for stage2 exist before calling compose up
         create_fake_info([0] + self.micro_indices())
 
+        self._pending_env_changes.clear()
         try:
             subprocess.call(f"{get_adsb_base_dir()}/docker-compose-start", timeout=180.0, shell=True)
         except subprocess.TimeoutExpired:
@@ -1370,13 +1415,32 @@ class AdsbIm:
     def configured_serials(self):
         return {serial for serial in {self._d.env_by_tags(e).valuestr for e in self.serial_env_names()} if serial != ""}
 
+    def airport_index(self) -> Optional[AirportIndex]:
+        # built on first use from the airport file that comes with the feeder (data/airports.csv)
+        with self._airport_index_lock:
+            if self._airport_index is None and AIRPORTS_FILE.exists():
+                try:
+                    self._airport_index = AirportIndex.from_csv(AIRPORTS_FILE)
+                    print_err(f"loaded {len(self._airport_index)} airports from {AIRPORTS_FILE}")
+                except Exception as e:
+                    print_err(f"failed to load the airports from {AIRPORTS_FILE}: {e}")
+            return self._airport_index
+
     def closest_airport_dict(self, lat, lon) -> dict:
         airport = None
         if lat and lon:
-            airport, status = generic_get_json(f"{self._d.adsbim_api_url}/closest_airport/{lat}/{lon}", timeout=10.0)
-            if status != 200 or airport == None:
-                print_err(f"closest_airport({lat}, {lon}) failed with status {status}")
-                return {"error": "Failed to fetch closest airport"}
+            index = self.airport_index()
+            if index:
+                try:
+                    airport = index.nearest(float(lat), float(lon))
+                except ValueError:
+                    return {"error": "Invalid position"}
+            else:
+                # the local airport file is missing or unreadable - ask the adsb.im API
+                airport, status = generic_get_json(f"{self._d.adsbim_api_url}/closest_airport/{lat}/{lon}", timeout=10.0)
+                if status != 200 or airport == None:
+                    print_err(f"closest_airport({lat}, {lon}) failed with status {status}")
+                    return {"error": "Failed to fetch closest airport"}
         return airport if airport else {"error": "No closest airport found"}
 
     def closest_airport(self, lat, lon) -> Response:
@@ -1426,10 +1490,10 @@ class AdsbIm:
             return self.base_info()
         # for a stage2 we return the base info for each of the micro feeders
         info_array = []
+        self.refresh_micro_info(self.micro_indices())
         for i in self.micro_indices():
             uat_capable = False
             if self._d.env_by_tags("mf_version").list_get(i) != "not an adsb.im feeder":
-                self.get_base_info(i)
                 uat_capable = self._d.env_by_tags("978url").list_get(i) != ""
 
             info_array.append(
@@ -1501,7 +1565,9 @@ class AdsbIm:
             )
         )
         response.headers.add("Access-Control-Allow-Origin", "*")
-        return response
+        # the stage2 polls this regularly - if nothing changed it gets an empty 304
+        response.add_etag()
+        return response.make_conditional(request)
 
     def sdr_config(self, value):
         try:
@@ -1611,6 +1677,8 @@ class AdsbIm:
         return suffix
 
     def stats(self):
+        if any(arg in request.args for arg in ("from", "to", "resolution")):
+            return self.stats_history()
         # collect the stats for each microfeeder and ensure that they are all the same
         # length by padding with zeros (that means the value for days for which we have
         # no data is 0)
@@ -1623,7 +1691,35 @@ class AdsbIm:
             plane_stats[i] = plane_stats[i] + [0] * (max_length - len(plane_stats[i]))
         return Response(json.dumps(plane_stats), mimetype="application/json")
 
+    def stats_history(self):
+        # /api/stats?from=&to=&resolution= - unix timestamps, resolution "hour" (default) or "day"
+        resolution = request.args.get("resolution", "hour")
+        now = time.time()
+        try:
+            end = float(request.args.get("to", now))
+            start = float(request.args.get("from", end - (7 * DAY if resolution == "hour" else 365 * DAY)))
+        except ValueError:
+            start = end = -1
+        if resolution not in RESOLUTIONS or start < 0 or end < start:
+            return Response(
+                json.dumps({"error": f"need from <= to (unix timestamps) and resolution in {RESOLUTIONS}"}),
+                status=400,
+                mimetype="application/json",
+            )
+        sites = self._stats_store.query(start, end, resolution) if self._stats_store else {}
+        ret = {
+            "resolution": resolution,
+            "from": int(start),
+            "to": int(end),
+            "columns": ["ts", "planes", "messages", "positions"],
+            "sites": {i: sites.get(i, []) for i in [0] + self.micro_indices()},
+        }
+        return Response(json.dumps(ret), mimetype="application/json")
+
     def stage2_stats(self):
+        return Response(json.dumps(self.stage2_stats_data()), mimetype="application/json")
+
+    def stage2_stats_data(self):
         ret: list = []
         for i in [0] + self.micro_indices():
             if i == 0 and not self._d.is_enabled("stage2"):
@@ -1653,47 +1749,33 @@ class AdsbIm:
             ip, triplet = mf_get_ip_and_triplet(ip)
             suffix = self.uf_suffix(i)
             try:
-                with open(f"/run/adsb-feeder-{suffix}/readsb/stats.prom") as f:
-                    uptime = 0
-                    found = 0
-                    pps = 0.0
-                    mps = 0.0
-                    planes = 0
-                    for line in f:
-                        if "position_count_total" in line:
-                            pps = int(line.split()[1]) / 60
-                            # show precise position rate if less than 1
-                            pps = round(pps, 1) if pps < 1 else round(pps)
-                            found |= 1
-                        if "readsb_messages_valid" in line:
-                            mps = round(int(line.split()[1]) / 60)
-                            found |= 4
-                        if "readsb_aircraft_with_position" in line:
-                            planes = int(line.split()[1])
-                            found |= 8
-                        if i != 0 and f'readsb_net_connector_status{{host="{ip}"' in line:
-                            uptime = int(line.split()[1])
-                            found |= 2
-                        if i == 0 and "readsb_uptime" in line:
-                            uptime = int(int(line.split()[1]) / 1000)
-                            found |= 2
-                        if found == 15:
-                            break
-                    ret.append(
-                        {
-                            "pps": pps,
-                            "mps": mps,
-                            "uptime": uptime,
-                            "planes": planes,
-                            "tplanes": tplanes,
-                        }
-                    )
+                prom = PromSnapshot.get(f"/run/adsb-feeder-{suffix}/readsb/stats.prom")
+                if prom is None:
+                    raise FileNotFoundError
+                pps = (prom.find("position_count_total") or 0) / 60
+                # show precise position rate if less than 1
+                pps = round(pps, 1) if pps < 1 else round(pps)
+                mps = round((prom.find("readsb_messages_valid") or 0) / 60)
+                planes = int(prom.find("readsb_aircraft_with_position") or 0)
+                if i != 0:
+                    uptime = int(prom.value("readsb_net_connector_status", host=ip) or 0)
+                else:
+                    uptime = int((prom.find("readsb_uptime") or 0) / 1000)
+                ret.append(
+                    {
+                        "pps": pps,
+                        "mps": mps,
+                        "uptime": uptime,
+                        "planes": planes,
+                        "tplanes": tplanes,
+                    }
+                )
             except FileNotFoundError:
                 ret.append({"pps": 0, "mps": 0, "uptime": 0, "planes": 0, "tplanes": tplanes})
             except Exception:
                 print_err(traceback.format_exc())
                 ret.append({"pps": 0, "mps": 0, "uptime": 0, "planes": 0, "tplanes": tplanes})
-        return Response(json.dumps(ret), mimetype="application/json")
+        return ret
 
     def stage2_connection(self):
         if self._d.env_by_tags("aggregator_choice").value not in ["micro", "nano"] or self._last_stage2_contact == "":
@@ -1734,9 +1816,15 @@ class AdsbIm:
         microsettings["lng"] = microsettings["lon"]
         response = make_response(json.dumps(microsettings))
         response.headers.add("Access-Control-Allow-Origin", "*")
-        return response
+        response.add_etag()
+        return response.make_conditional(request)
 
     def generate_agg_structure(self):
+        # the structure only depends on the configuration, so only rebuild it when an Env changed
+        generation = Env.generation()
+        if generation == self._agg_structure_generation:
+            return
+        start = time.perf_counter()
         aggregators = copy.deepcopy(self.all_aggregators)
         n = len(self.micro_indices()) + 1
         matrix = [0] * n
@@ -1745,25 +1833,31 @@ class AdsbIm:
             agg = aggregators[idx][0]
             status_link_list = aggregators[idx][3]
             template_link = status_link_list[0]
+            # figure out once per aggregator how its status link is built, not once per site
+            match = None
+            agg_env = None
+            if not template_link.startswith("/"):
+                match = re.search("<([^>]*)>", template_link)
+                if match:
+                    agg_env = self._d.env(match.group(1))
+                    if not agg_env or not type(agg_env.value) == list:
+                        print_err(f"BAD CONFIG STATE, {match.group(1)} is not a list")
+                        report_issue(
+                            f"please report this to the maintainers, including the data from System->Share Diagnostics:"
+                            f"{match.group(1)} is not a list"
+                        )
             final_link = template_link
             agg_enabled = False
             for i in range(n):
-                agg_enabled |= self._d.list_is_enabled(agg, i)
-                matrix[i] |= 1 << idx if self._d.list_is_enabled(agg, i) else 0
+                enabled = self._d.list_is_enabled(agg, i)
+                agg_enabled |= enabled
+                matrix[i] |= 1 << idx if enabled else 0
                 if template_link.startswith("/"):
                     final_link = template_link.replace("STG2IDX", "" if i == 0 else f"_{i}")
-                else:
-                    match = re.search("<([^>]*)>", template_link)
-                    if match:
-                        agg_env = self._d.env(match.group(1))
-                        if not agg_env or not type(agg_env.value) == list:
-                            print_err(f"BAD CONFIG STATE, {match.group(1)} is not a list")
-                            report_issue(
-                                f"please report this to the maintainers, including the data from System->Share Diagnostics:"
-                                f"{match.group(1)} is not a list"
-                            )
-                            continue
-                        final_link = template_link.replace(match.group(0), agg_env.list_get(i))
+                elif match:
+                    if not agg_env or not type(agg_env.value) == list:
+                        continue
+                    final_link = template_link.replace(match.group(0), agg_env.list_get(i))
                 if i == 0:
                     status_link_list[0] = final_link
                 else:
@@ -1779,6 +1873,9 @@ class AdsbIm:
 
         self.agg_matrix = matrix
         self.agg_structure = active_aggregators
+        # if an Env changed while we were at it (including lists padded by reading them) we simply rebuild next time
+        self._agg_structure_generation = generation
+        print_err(f"generate_agg_structure took {(time.perf_counter() - start) * 1000:.1f}ms", level=8)
 
     def cache_agg_status(self):
         with self.cache_agg_status_lock:
@@ -1789,30 +1886,30 @@ class AdsbIm:
 
         # print_err("caching agg status")
 
-        # launch all the status checks there are in separate threads
-        # they will be requested by the index page soon
+        # queue all the status checks there are, they will be requested by the index page soon
+        # the pool skips aggregators whose previous check is still running
         for entry in self.agg_structure:
             agg = entry[0]
             for idx in [0] + self.micro_indices():
                 if self._d.list_is_enabled(agg, idx):
-                    threading.Thread(target=self.get_agg_status, args=(agg, idx)).start()
+                    self._agg_status_pool.submit(self.agg_status_instance(agg, idx))
+
+    def agg_status_instance(self, agg, idx):
+        with self._agg_status_instances_lock:
+            status = self._agg_status_instances.get(f"{agg}-{idx}")
+            if status is None:
+                status = self._agg_status_instances[f"{agg}-{idx}"] = AggStatus(
+                    agg,
+                    idx,
+                    self._d,
+                    f"http://127.0.0.1:{self._d.env_by_tags('webport').valueint}",
+                    self._system,
+                )
+        return status
 
     def get_agg_status(self, agg, idx):
-
-        status = self._agg_status_instances.get(f"{agg}-{idx}")
-        if status is None:
-            status = self._agg_status_instances[f"{agg}-{idx}"] = AggStatus(
-                agg,
-                idx,
-                self._d,
-                f"http://127.0.0.1:{self._d.env_by_tags('webport').valueint}",
-                self._system,
-            )
-
-        res = {
-            "beast": status.beast,
-            "mlat": status.mlat,
-        }
+        # never blocks on the check, this returns the last known status and its age
+        res = self.agg_status_instance(agg, idx).last_status()
 
         if agg == "adsbx":
             res["adsbxfeederid"] = self._d.env_by_tags("adsbxfeederid").list_get(idx)
@@ -1823,6 +1920,36 @@ class AdsbIm:
 
         return res
 
+    def publish_agg_status(self, status):
+        # called by the status pool after each check; the age is left out so only real changes get pushed
+        res = self.get_agg_status(status._agg, status._idx)
+        res.pop("age", None)
+        self._events.publish(f"status/{status._agg}/{status._idx}", res)
+
+    def events(self):
+        return Response(
+            self._events.stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def events_feeder(self):
+        # while somebody listens on /api/events, refresh what the pages would otherwise poll for
+        while True:
+            if not self._events.wait_for_subscribers():
+                return
+            try:
+                self.cache_agg_status()
+                self._events.publish("stage2_stats", self.stage2_stats_data())
+                # like the status, leave out the age so the temperatures are only pushed when they change;
+                # the page works it out from the sensor's timestamp
+                temperatures = self.temperatures()
+                temperatures.pop("age", None)
+                self._events.publish("temperatures", temperatures)
+            except Exception:
+                print_err(f"events_feeder: {traceback.format_exc()}")
+            sleep(5)
+
     def agg_status(self, agg):
         # print_err(f'agg_status(agg={agg})')
         if agg == "im":
@@ -1832,10 +1959,13 @@ class AdsbIm:
 
         res = dict()
 
-        # collect the data retrieved in the threads, this works due do each agg status object having a lock
+        # collect the results of the last checks done by the pool
         for idx in [0] + self.micro_indices():
             if self._d.list_is_enabled(agg, idx):
                 res[idx] = self.get_agg_status(agg, idx)
+                if res[idx]["age"] is None or res[idx]["age"] > 10:
+                    # not in the regular list (yet) or the page hasn't been polling - refresh it
+                    self._agg_status_pool.submit(self.agg_status_instance(agg, idx))
 
         return json.dumps(res)
 
@@ -1966,29 +2096,50 @@ class AdsbIm:
                 print_err(f"micro_settings API on {ip}:{port}: {status}, {micro_settings}")
 
             if status == 200 and micro_settings != None:
-                for key, value in micro_settings.items():
-                    # when getting values from a microfeeder older than v2.1.3
-                    if key == "lng":
-                        key = "lon"
-                    if key not in self.microfeeder_setting_tags:
-                        continue
-                    tags = key.split("--")
-                    e = self._d.env_by_tags(tags)  # type: ignore
-                    if e:
-                        e.list_set(n, value)
-        base_info, status = generic_get_json(f"http://{ip}:{port}/api/base_info", timeout=timeout)
-        if (status != 200 or base_info == None) and port == "80":
-            # maybe we're running on 1099?
-            port = "1099"
-            base_info, status = generic_get_json(f"http://{ip}:{port}/api/base_info", timeout=timeout)
-        if status == 200 and base_info != None:
+                with self._d.transaction(f"micro_settings import {n}"):
+                    for key, value in micro_settings.items():
+                        # when getting values from a microfeeder older than v2.1.3
+                        if key == "lng":
+                            key = "lon"
+                        if key not in self.microfeeder_setting_tags:
+                            continue
+                        tags = key.split("--")
+                        e = self._d.env_by_tags(tags)  # type: ignore
+                        if e:
+                            e.list_set(n, value)
+        # an explicit import always asks, even if the microfeeder didn't answer recently
+        base_info, port, changed = self._micro_poller.fetch(ip, port, force=do_import)
+        if self.apply_base_info(n, base_info, port, changed, do_import=do_import):
+            return True
 
-            base_info_string = json.dumps(base_info)
+        print_err(f"failed to get base_info from micro feeder {n}")
+        return False
 
-            if self._last_base_info.get(ip) != base_info_string:
-                self._last_base_info[ip] = base_info_string
-                print_err(f"got {base_info} for {ip}")
+    def refresh_micro_info(self, indices: List[int]):
+        # ask all the (adsb.im) microfeeders at the same time and apply what they sent in one config write
+        targets = []
+        for n in indices:
+            if self._d.env_by_tags("mf_version").list_get(n) == "not an adsb.im feeder":
+                continue
+            ip, _ = mf_get_ip_and_triplet(self._d.env_by_tags("mf_ip").list_get(n))
+            targets.append((n, ip, self._d.env_by_tags("mf_port").list_get(n) or "80"))
+        if not targets:
+            return
+        results = self._micro_poller.poll(targets)
+        with self._d.transaction("stage2 base_info"):
+            for n, (base_info, port, changed) in results.items():
+                self.apply_base_info(n, base_info, port, changed)
 
+    def apply_base_info(self, n, base_info, port, changed, do_import=False):
+        if base_info is None:
+            return False
+        mf_ip = self._d.env_by_tags("mf_ip").list_get(n)
+        ip, triplet = mf_get_ip_and_triplet(mf_ip)
+
+        if changed:
+            print_err(f"got {base_info} for {ip}")
+
+        with self._d.transaction(f"base_info {n}"):
             if do_import or not self._d.env_by_tags("site_name").list_get(n):
                 # only accept the remote name if this is our initial import
                 # after that the user may have overwritten it
@@ -2045,10 +2196,7 @@ class AdsbIm:
 
             self._d.env_by_tags("mf_brofm_capable").list_set(n, bool(base_info.get("brofm_capable")))
 
-            return True
-
-        print_err(f"failed to get base_info from micro feeder {n}")
-        return False
+        return True
 
     def check_remote_feeder(self, ip):
         print_err(f"check_remote_feeder({ip})")
@@ -2219,7 +2367,7 @@ class AdsbIm:
             # create fake cpu info for airnav
             create_fake_info([0] + self.micro_indices())
             self.plane_stats.append([])
-            self.planes_seen_per_day.append(set())
+            self.planes_seen_per_day.append(IcaoSet())
             return (True, "")
 
         # now let's see if we can get the data from the micro feeder
@@ -2243,7 +2391,7 @@ class AdsbIm:
         # create fake cpu info for airnav
         create_fake_info([0] + self.micro_indices())
         self.plane_stats.append([])
-        self.planes_seen_per_day.append(set())
+        self.planes_seen_per_day.append(IcaoSet())
 
         return (True, "")
 
@@ -2258,6 +2406,8 @@ class AdsbIm:
 
         self.plane_stats.pop()
         self.planes_seen_per_day.pop()
+        if self._stats_store:
+            self._stats_store.remove_site(num)
 
         # deal with env vars
         for e in self._d.stage2_envs:
@@ -2337,6 +2487,8 @@ class AdsbIm:
                 e.list_move(num, new_idx)
             self.plane_stats.insert(new_idx, self.plane_stats.pop(num))
             self.planes_seen_per_day.insert(new_idx, self.planes_seen_per_day.pop(num))
+            if self._stats_store:
+                self._stats_store.move_site(num, new_idx)
 
         return (True, "")
 
@@ -2809,6 +2961,11 @@ class AdsbIm:
         self._d.env_by_tags("graphs1090_other_temp1").value = "/run/ambient-temperature"
 
     def handle_implied_settings(self):
+        # this touches a lot of Envs - collect all of that into a single config.json write
+        with self._d.transaction("handle_implied_settings"):
+            self._handle_implied_settings()
+
+    def _handle_implied_settings(self):
         print_err("running handle_implied_settings")
 
         # make sure we show the temperature block if we have a temperature sensor
@@ -3441,6 +3598,11 @@ class AdsbIm:
 
     @check_restart_lock
     def update(self):
+        # every form field may change an Env - write config.json only once for the whole form
+        with self._d.transaction("update"):
+            return self._update()
+
+    def _update(self):
         # This is the one endpoint that handles all the updates coming in from the UI.
         # It walks through the form data and figures out what to do about the information provided.
         #
@@ -4067,7 +4229,7 @@ class AdsbIm:
             if self._d.is_enabled("sdrplay") and not self._d.is_enabled("sdrplay_license_accepted"):
                 return redirect(url_for("sdrplay_license"))
 
-            self._system._restart.bg_run(cmdline=f"{get_adsb_base_dir()}/docker-compose-start", silent=False)
+            self.start_affected_containers()
             return render_template("/restarting.html", extra_args=extra_args)
         print_err("base config not completed", level=2)
         return redirect(url_for("director"))
@@ -4330,7 +4492,7 @@ class AdsbIm:
         return self.aggregators()
 
     def reset_planes_seen_per_day(self):
-        self.planes_seen_per_day: list = [set() for i in [0] + self.micro_indices()]
+        self.planes_seen_per_day: list = [IcaoSet() for i in [0] + self.micro_indices()]
 
     def load_planes_seen_per_day(self):
         # set limit on how many days of statistics to keep
@@ -4346,12 +4508,17 @@ class AdsbIm:
                 planes = json.load(f)
                 ts = planes.get("timestamp", 0)
 
-                planelists = planes.get("planes")
+                if "planes_v2" in planes:
+                    # compact format: base64 of the delta encoded, sorted ICAO addresses
+                    planelists = [IcaoSet.from_bytes(base64.b64decode(b)) for b in planes.get("planes_v2")]
+                else:
+                    # older versions stored lists of hex strings
+                    planelists = [IcaoSet.from_hex(hexes) for hexes in planes.get("planes")]
                 planestats = planes.get("stats")
 
                 while len(planelists) < len([0] + self.micro_indices()):
                     print_err("load_planes: WEIRD or backup restore: padding planelists")
-                    planelists.append([])
+                    planelists.append(IcaoSet())
                 while len(planestats) < len([0] + self.micro_indices()):
                     print_err("load_planes: WEIRD or backup restore: padding planestats")
                     planestats.append([])
@@ -4362,8 +4529,7 @@ class AdsbIm:
                 if ts >= start_of_day.timestamp():
                     # ok, this dump is from today
                     for i in [0] + self.micro_indices():
-                        # json can't store sets, so we use list on disk, but sets in memory
-                        self.planes_seen_per_day[i] = set(planelists[i])
+                        self.planes_seen_per_day[i] = planelists[i]
 
                 for i in [0] + self.micro_indices():
                     self.plane_stats[i] = planestats[i]
@@ -4386,6 +4552,10 @@ class AdsbIm:
                 for i in [0] + self.micro_indices():
                     while len(self.plane_stats[i]) > self.plane_stats_limit:
                         self.plane_stats[i].pop()
+                    if self._stats_store:
+                        # plane_stats[i][0] is yesterday; rows that are already there win
+                        days = [(int(start_of_day.timestamp()) - (k + 1) * DAY, n) for k, n in enumerate(self.plane_stats[i])]
+                        self._stats_store.import_days(i, days)
 
         except Exception:
             print_err(f"error loading planes_seen_per_day:\n{traceback.format_exc()}")
@@ -4395,10 +4565,16 @@ class AdsbIm:
         # we want to make absolutely sure we don't throw any errors here as this is
         # called during termination
         try:
-            # json can't store sets, so we use list on disk, but sets in memory
-            planelists = [list(self.planes_seen_per_day[i]) for i in [0] + self.micro_indices()]
-            planes = {"timestamp": int(time.time()), "planes": planelists, "stats": self.plane_stats}
-            planes_json = json.dumps(planes, indent=2)
+            indices = [0] + self.micro_indices()
+            planelists = [base64.b64encode(self.planes_seen_per_day[i].to_bytes()).decode() for i in indices]
+            # keep an empty "planes" so that older versions still load the stats after a downgrade
+            planes = {
+                "timestamp": int(time.time()),
+                "planes": [[] for i in indices],
+                "planes_v2": planelists,
+                "stats": self.plane_stats,
+            }
+            planes_json = json.dumps(planes)
 
             path = f"{get_adsb_base_dir()}/adsb_planes_seen_per_day.json.gz"
             tmp = path + ".tmp"
@@ -4406,21 +4582,15 @@ class AdsbIm:
                 f.write(planes_json.encode("utf-8"))
             os.rename(tmp, path)
             print_err("wrote planes_seen_per_day")
+            if self._stats_store:
+                self._stats_store.flush()
         except Exception:
             print_err(f"error writing planes_seen_per_day:\n{traceback.format_exc()}")
             pass
 
     def get_current_planes(self, idx):
-        planes = set()
-        path = "/run/adsb-feeder-" + self.uf_suffix(idx) + "/readsb/aircraft.json"
-        try:
-            with open(path) as f:
-                aircraftdict = json.load(f)
-                aircraft = aircraftdict.get("aircraft", [])
-                planes = set([plane["hex"] for plane in aircraft if not plane["hex"].startswith("~")])
-        except Exception:
-            pass
-        return planes
+        aircraft = AircraftSnapshot.get("/run/adsb-feeder-" + self.uf_suffix(idx) + "/readsb/aircraft.json")
+        return aircraft.icao if aircraft else IcaoSet()
 
     def track_planes_seen_per_day(self):
         # we base this on UTC time so it's comparable across time zones
@@ -4442,8 +4612,17 @@ class AdsbIm:
             # write the data to disk every hour
             self.write_planes_seen_per_day()
         for i in ultrafeeders:
-            # using sets it's really easy to keep track of what we've seen
-            self.planes_seen_per_day[i] |= self.get_current_planes(i)
+            # merge the (sorted) current planes into today's set
+            current = self.get_current_planes(i)
+            self.planes_seen_per_day[i] |= current
+            if self._stats_store:
+                # stats.prom has the counts for the last minute
+                prom = PromSnapshot.get(f"/run/adsb-feeder-{self.uf_suffix(i)}/readsb/stats.prom")
+                messages = (prom.find("readsb_messages_valid") or 0) if prom else 0
+                positions = (prom.find("position_count_total") or 0) if prom else 0
+                self._stats_store.add_minute(
+                    i, now.timestamp(), current, int(messages), int(positions), len(self.planes_seen_per_day[i])
+                )
         if self.ci:
             pv = self._d.previous_version
             self._d.previous_version = "check-in"
@@ -4621,8 +4800,12 @@ class AdsbIm:
                 print_err("ERROR: broken IPv6 state detected")
 
         # refresh docker ps cache so the aggregator status is nicely up to date
-        threading.Thread(target=self._system.refreshDockerPs).start()
+        # (not needed while the docker watcher follows the events)
+        if not self._system.docker_watcher.connected:
+            threading.Thread(target=self._system.refreshDockerPs).start()
 
+        # free unless the configuration changed since the last time
+        self.generate_agg_structure()
         self.cache_agg_status()
 
         channel, current_branch = self.extract_channel()
@@ -4698,6 +4881,15 @@ class AdsbIm:
             pass
         return temperature
 
+    def config_stats(self):
+        # debug info: how often do we actually parse / write config.json
+        return {"cache": config_cache_stats(), "writes": self._d.config_write_stats}
+
+    def http_stats(self):
+        # debug info: latency and errors per host for the requests going through the shared http client,
+        # and how busy our own web server is
+        return dict(http_client.stats(), server=self._server.stats() if self._server else {})
+
     def check_changelog_status(self):
         """Check if changelog should be shown to user"""
         try:
@@ -4812,13 +5004,16 @@ class AdsbIm:
         pipeOut = os.fdopen(fdOut, "rb")
         pipeIn = os.fdopen(fdIn, "wb")
 
+        # the sanitizing happens in its own process, downloads get a zip with an index of the sections
+        bundle = " --bundle" if as_attachment else ""
+
         def get_log(fobj):
             try:
                 subprocess.run(
-                    f"bash {get_adsb_base_dir()}/log-sanitizer.sh",
+                    f"bash {get_adsb_base_dir()}/log-sanitizer.sh{bundle}",
                     shell=True,
                     stdout=fobj,
-                    stderr=subprocess.STDOUT,
+                    stderr=subprocess.DEVNULL if bundle else subprocess.STDOUT,
                     timeout=30,
                 )
             finally:
@@ -4834,6 +5029,13 @@ class AdsbIm:
 
         site_name = self._d.env_by_tags("site_name").list_get(0)
         now = datetime.now().replace(microsecond=0).isoformat().replace(":", "-")
+        if as_attachment:
+            return send_file(
+                pipeOut,
+                mimetype="application/zip",
+                as_attachment=True,
+                download_name=f"adsb-feeder-diagnostics-{site_name}-{now}.zip",
+            )
         download_name = f"adsb-feeder-config-{site_name}-{now}.txt"
         return send_file(
             pipeOut,
@@ -4926,25 +5128,13 @@ class AdsbIm:
         return render_template("waiting.html", title="ADS-B Feeder is performing requested actions")
 
     def stream_log(self):
-        logfile = "/run/adsb-feeder-image.log"
-
-        def tail():
-            with open(logfile, "r") as file:
-                ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-                tmp = file.read()[-16 * 1024 :]
-                # discard anything but the last 16 kB
-                while self._system._restart.state == "busy":
-                    tmp += file.read(16 * 1024)
-                    if tmp and tmp.find("\n") != -1:
-                        block, tmp = tmp.rsplit("\n", 1)
-                        block = ansi_escape.sub("", block)
-                        lines = block.split("\n")
-                        data = "".join(["data: " + line + "\n" for line in lines])
-                        yield data + "\n\n"
-                    else:
-                        time.sleep(0.2)
-
-        return Response(tail(), mimetype="text/event-stream")
+        # a browser reconnecting by itself sends Last-Event-ID, our pages pass it along when they start over
+        last_id = parse_last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+        return Response(
+            self._log_follower.stream(last_id, keep_going=lambda: self._system._restart.state == "busy"),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @check_restart_lock
     def feeder_update(self, channel):
@@ -5056,6 +5246,7 @@ if __name__ == "__main__":
         print_err(f"received signal {sig}, shutting down...")
         a.exiting = True
         a.write_planes_seen_per_day()
+        a.shutdown_server()
         signal.signal(sig, signal.SIG_DFL)  # Restore default handler
         signal.raise_signal(sig)
 
@@ -4,7 +4,7 @@ import sys
 import time
 import traceback
 
-from utils.multioutline import MultiOutline
+from utils.multioutline import MULTIOUTLINE_JSON, MultiOutline
 from utils.util import make_int, print_err
 
 n = make_int(sys.argv[1] if len(sys.argv) > 1 else 1)
@@ -14,8 +14,9 @@ t1 = time.process_time()
 # multioutline
 try:
     mo_data = MultiOutline().create_outline(n)
-    with open(f"/run/adsb-feeder-ultrafeeder/readsb/multiOutline.json", "w") as f:
-        json.dump(mo_data, f)
+    if mo_data is not None:
+        with open(MULTIOUTLINE_JSON, "w") as f:
+            json.dump(mo_data, f)
 except Exception:
     print_err(traceback.format_exc())
     print_err("failed to push multiOutline.json")
@@ -0,0 +1,28 @@
+import argparse
+import io
+import sys
+
+from utils.paths import CONFIG_JSON_FILE
+from utils.sanitizer import Sanitizer, SanitizerError, write_bundle, write_text
+
+# sanitize the log-sanitizer.sh output on stdin: replace the config secrets and everything else
+# that should stay private; additional search / replace pairs can be given as arguments
+parser = argparse.ArgumentParser()
+parser.add_argument("--bundle", action="store_true", help="write a zip with the log and an index of its sections")
+parser.add_argument("pairs", nargs="*", help="additional search replace pairs")
+args = parser.parse_args()
+
+if len(args.pairs) % 2 != 0:
+    print("ERROR: even number of search replace pairs required!")
+    sys.exit(1)
+
+write = write_bundle if args.bundle else write_text
+extra = list(zip(args.pairs[::2], args.pairs[1::2]))
+try:
+    sanitizer = Sanitizer.from_config_file(CONFIG_JSON_FILE, extra)
+except SanitizerError as e:
+    # the secrets from the config can't be removed, so send the error instead of the log
+    error = f"ERROR: not sharing the logs, {e}\n".encode()
+    write(Sanitizer([]), io.BytesIO(error), sys.stdout.buffer)
+    sys.exit(1)
+write(sanitizer, sys.stdin.buffer, sys.stdout.buffer)
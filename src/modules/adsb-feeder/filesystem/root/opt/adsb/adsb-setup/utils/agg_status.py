@@ -5,12 +5,15 @@ import subprocess
 import threading
 import time
 import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Optional
+from typing import Callable, Optional
 
+from .aircraft import AircraftSnapshot
 from .data import Data
 from .paths import PREVIOUS_VERSION_FILE
+from .prom import PromSnapshot
 from .util import generic_get_json, get_plain_url, make_int, print_err
 
 T = Enum("T", ["Disconnected", "Unknown", "Good", "Bad", "Warning", "Disabled", "Starting", "ContainerDown"])
@@ -59,6 +62,7 @@ class AggStatus:
         self._d = data
         self._url = url
         self._system = system
+        self._env_updates: list = []
 
     @property
     def beast(self) -> str:
@@ -72,6 +76,21 @@ class AggStatus:
             return status_short.get(self._mlat, ".")
         return "."
 
+    def last_status(self) -> dict:
+        """Return the result of the last check without checking again (age in seconds, None if never checked)."""
+        last_check = self._last_check
+        if last_check == datetime.fromtimestamp(0.0):
+            return {"beast": ".", "mlat": ".", "age": None}
+        return {
+            "beast": status_short.get(self._beast, "."),
+            "mlat": status_short.get(self._mlat, "."),
+            "age": round((datetime.now() - last_check).total_seconds(), 1),
+        }
+
+    def set_env_later(self, tags, value):
+        # no config.json transaction is held open while check_impl waits for the network
+        self._env_updates.append((tags, value))
+
     def get_json(self, json_url):
         return generic_get_json(json_url, None)
 
@@ -129,16 +148,13 @@ class AggStatus:
         if not bconf:
             print_err(f"ERROR: get_beast_status no netconfig for {self._agg}")
             return
-        pattern = f"readsb_net_connector_status{{host=\"{bconf.split(',')[1]}\",port=\"{bconf.split(',')[2]}\"}} (\\d+)"
-        filename = f"{self.uf_path()}/readsb/stats.prom"
-        try:
-            readsb_status = open(filename, "r").read()
-        except Exception:
+        host, port = bconf.split(",")[1:3]
+        prom = PromSnapshot.get(f"{self.uf_path()}/readsb/stats.prom")
+        if prom is None:
             self._beast = T.Disconnected
             return
-        match = re.search(pattern, readsb_status)
-        if match:
-            status = int(match.group(1))
+        status = prom.value("readsb_net_connector_status", host=host, port=port)
+        if status is not None:
             # this status is the time in seconds the connection has been established
             if status <= 0:
                 self._beast = T.Disconnected
@@ -150,7 +166,7 @@ class AggStatus:
             # if self._beast != T.Good:
             #    print_err(f"beast check {self._agg :{' '}<{20}}: {self._beast} status: {status}")
         else:
-            print_err(f"ERROR: no match checking beast for {pattern}")
+            print_err(f"ERROR: no readsb_net_connector_status for {host}:{port}")
 
         return
 
@@ -159,7 +175,17 @@ class AggStatus:
             if datetime.now() - self._last_check < timedelta(seconds=10.0):
                 return True
 
-            self.check_impl()
+            # the check may update several Envs (station serial, map links, feeder ids); they are
+            # collected while it talks to the network and applied afterwards in one transaction
+            self._env_updates = []
+            try:
+                self.check_impl()
+            finally:
+                updates, self._env_updates = self._env_updates, []
+                if updates:
+                    with self._d.transaction(f"{self._agg}-{self._idx} status check"):
+                        for tags, value in updates:
+                            self._d.env_by_tags(tags).list_set(self._idx, value)
 
             # if check_impl has updated last_check the status is available
             if datetime.now() - self._last_check < timedelta(seconds=10.0):
@@ -277,10 +303,11 @@ class AggStatus:
 
             rbkey = self._d.env_by_tags(["radarbox", "key"]).list_get(self._idx)
             # reset station number if the key has changed
+            station_serial = self._d.env_by_tags(["radarbox", "sn"]).list_get(self._idx)
             if rbkey != self._d.env_by_tags(["radarbox", "snkey"]).list_get(self._idx):
-                station_serial = self._d.env_by_tags(["radarbox", "sn"]).list_set(self._idx, "")
+                station_serial = ""
+                self.set_env_later(["radarbox", "sn"], "")
 
-            station_serial = self._d.env_by_tags(["radarbox", "sn"]).list_get(self._idx)
             if not station_serial:
                 # dang, I hate this part
                 suffix = "" if self._idx == 0 else f"_{self._idx}"
@@ -298,8 +325,8 @@ class AggStatus:
                 match = re.search(r"This is your station serial number: ([A-Z0-9]+)", serial_text)
                 if match:
                     station_serial = match.group(1)
-                    self._d.env_by_tags(["radarbox", "sn"]).list_set(self._idx, station_serial)
-                    self._d.env_by_tags(["radarbox", "snkey"]).list_set(self._idx, rbkey)
+                    self.set_env_later(["radarbox", "sn"], station_serial)
+                    self.set_env_later(["radarbox", "snkey"], rbkey)
             if station_serial:
                 html_url = f"https://www.radarbox.com/stations/{station_serial}"
                 rb_page, status = get_plain_url(html_url)
@@ -393,7 +420,7 @@ class AggStatus:
                 try:
                     for entry in response_dict.get("clients").get("beast"):
                         if entry.get("uuid", "xxxxxxxx-xxxx-")[:14] == uuid[:14]:
-                            self._d.env_by_tags("adsblol_link").list_set(self._idx, entry.get("adsblol_my_url"))
+                            self.set_env_later("adsblol_link", entry.get("adsblol_my_url"))
                 except Exception:
                     print_err(traceback.format_exc())
 
@@ -406,7 +433,7 @@ class AggStatus:
         uuid = str(self._d.env_by_tags("ultrafeeder_uuid").list_get(self._idx))
         feed_id = uuid.replace("-", "")[:16]
         map_link = f"https://globe.airplanes.live/?uuid={feed_id}"
-        self._d.env_by_tags("alivemaplink").list_set(self._idx, map_link)
+        self.set_env_later("alivemaplink", map_link)
 
         return
 
@@ -421,7 +448,7 @@ class AggStatus:
             # seems to currently only have one map link per IP, we save it
             # per microsite nonetheless in case this changes in the future
             if map_link:
-                self._d.env_by_tags("alivemaplink").list_set(self._idx, map_link)
+                self.set_env_later("alivemaplink", map_link)
 
     def adsbx_feeder_id(self):
         feeder_id = str(self._d.env_by_tags("adsbxfeederid").list_get(self._idx))
@@ -441,8 +468,8 @@ class AggStatus:
                     adsbx_id = match.group(1)
             if adsbx_id and len(adsbx_id) == 12:
                 print_err(f"adsbx feeder id for {self._idx}: {adsbx_id}")
-                self._d.env_by_tags("adsbxfeederid").list_set(self._idx, adsbx_id)
-                self._d.env_by_tags("adsbxfeederid_uuid").list_set(self._idx, uuid)
+                self.set_env_later("adsbxfeederid", adsbx_id)
+                self.set_env_later("adsbxfeederid_uuid", uuid)
             else:
                 print_err(f"failed to find adsbx ID in response {output}")
 
@@ -450,6 +477,43 @@ class AggStatus:
         return f"Aggregator({self._agg} last_check: {str(self._last_check)}, beast: {self._beast} mlat: {self._mlat})"
 
 
+class AggStatusPool:
+    """Run AggStatus checks on a fixed number of worker threads, at most one in flight per aggregator and site."""
+
+    def __init__(self, max_workers: int = 4, on_done: Optional[Callable[[AggStatus], None]] = None):
+        self._on_done = on_done
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agg-status")
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Future] = {}
+
+    def submit(self, status: AggStatus) -> bool:
+        """Queue a check unless one for the same aggregator and site is already queued or running."""
+        key = f"{status._agg}-{status._idx}"
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future and not future.done():
+                return False
+            future = self._executor.submit(self._run, status)
+            self._in_flight[key] = future
+        return True
+
+    def _run(self, status: AggStatus) -> None:
+        try:
+            status.check()
+            if self._on_done:
+                self._on_done(status)
+        except Exception:
+            print_err(f"status check for {status._agg}-{status._idx} failed: {traceback.format_exc()}")
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(not f.done() for f in self._in_flight.values())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 class ImStatus:
     def __init__(self, data: Data):
         self._d = data
@@ -610,53 +674,30 @@ class Healthcheck:
                 fail.append("readsb stats.json not found")
 
         if self._d.env_by_tags("1090serial").value != "":
-            try:
-                with open(f"{uf_path}/readsb/aircraft.json") as f:
-                    obj = json.load(f)
-                    ac = obj.get("aircraft")
-                    seen = False
-                    for a in ac:
-                        t = a.get("type")
-                        if t in ["adsb_icao", "mode_s", "mlat"]:
-                            seen = True
-                    if seen:
-                        self.last1090.update()
-                    now = obj.get("now")
-                    if not now or now < time.time() - 60:
-                        fail.append("readsb aircraft.json out of date")
-            except FileNotFoundError:
+            aircraft = AircraftSnapshot.get(f"{uf_path}/readsb/aircraft.json")
+            if aircraft is None:
                 print_err("readsb/aircarft.json missing - reporting 1090 error for healthcheck")
                 fail.append("readsb not running / 1090 SDR probably dead / unplugged")
-
-            except Exception:
-                print_err(traceback.format_exc())
-                fail.append("readsb not running / 1090 SDR probably dead / unplugged")
+            else:
+                if aircraft.seen("adsb_icao", "mode_s", "mlat"):
+                    self.last1090.update()
+                if not aircraft.now or aircraft.now < time.time() - 60:
+                    fail.append("readsb aircraft.json out of date")
 
             hours = self._d.env_by_tags("healthcheck_noplane_hours_1090").value
             if self.last1090.tooLong(hours):
                 fail.append(f"no planes 1090 for {hours}h")
 
         if self._d.env_by_tags("978serial").value != "":
-            try:
-                with open(f"/run/adsb-feeder-dump978/skyaware978/aircraft.json") as f:
-                    obj = json.load(f)
-                    ac = obj.get("aircraft")
-                    seen = False
-                    for a in ac:
-                        if a.get("lat") != None:
-                            seen = True
-                    if seen:
-                        self.last978.update()
-                    now = obj.get("now")
-                    if not now or now < time.time() - 60:
-                        fail.append("dump978 aircraft.json out of date")
-            except FileNotFoundError:
+            aircraft = AircraftSnapshot.get("/run/adsb-feeder-dump978/skyaware978/aircraft.json")
+            if aircraft is None:
                 print_err("skyaware978/aircarft.json missing - reporting 978 error for healthcheck")
                 fail.append("dump978 not running / 978 SDR probably dead / unplugged")
-
-            except Exception:
-                print_err(traceback.format_exc())
-                fail.append("dump978 not running / 978 SDR probably dead / unplugged")
+            else:
+                if aircraft.with_position:
+                    self.last978.update()
+                if not aircraft.now or aircraft.now < time.time() - 60:
+                    fail.append("dump978 aircraft.json out of date")
 
             hours = self._d.env_by_tags("healthcheck_noplane_hours_978").value
             if self.last978.tooLong(hours):
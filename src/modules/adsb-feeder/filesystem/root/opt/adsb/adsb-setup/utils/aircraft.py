@@ -0,0 +1,94 @@
+import json
+import os
+import re
+import threading
+from typing import Optional
+
+from .icao_set import IcaoSet
+from .util import print_err
+
+# readsb and dump978 write one aircraft object per line, always starting with the hex;
+# the fields we care about are then picked out of that line without building a dict
+_hex = re.compile(r'^\{\s*"hex"\s*:\s*"([^"]*)"')
+_type = re.compile(r',\s*"type"\s*:\s*"([^"]*)"')
+# only the top level position - lastPosition is a nested object, so it's preceded by a '{'
+_lat = re.compile(r',\s*"lat"\s*:\s*-?\d')
+_now = re.compile(r'"now"\s*:\s*([0-9.]+)')
+
+
+class AircraftSnapshot:
+    """The few fields we need from an aircraft.json, parsed once per change of the file."""
+
+    _cache: dict[str, tuple[tuple, "AircraftSnapshot"]] = {}
+    _cache_lock = threading.Lock()
+    parses = 0
+
+    def __init__(self, text: str) -> None:
+        self.now: Optional[float] = None
+        self.total = 0
+        self.with_position = 0
+        self.types: dict[str, int] = {}
+        hexes: list[str] = []
+        lines = text.splitlines()
+        matched = 0
+        for line in lines:
+            line = line.strip()
+            m = _hex.match(line)
+            if not m:
+                if self.now is None:
+                    n = _now.search(line)
+                    if n:
+                        self.now = float(n.group(1))
+                continue
+            matched += 1
+            t = _type.search(line)
+            self._add(m.group(1), t.group(1) if t else None, _lat.search(line) is not None, hexes)
+        if not matched or matched != text.count('"hex"'):
+            # not the one aircraft per line layout we expect (or no aircraft at all), so do it the slow way
+            self._parse_json(text, hexes)
+        self.icao = IcaoSet.from_hex(hexes)
+
+    def _add(self, hex: str, type: Optional[str], has_position: bool, hexes: list) -> None:
+        self.total += 1
+        hexes.append(hex)
+        if type:
+            self.types[type] = self.types.get(type, 0) + 1
+        if has_position:
+            self.with_position += 1
+
+    def _parse_json(self, text: str, hexes: list) -> None:
+        self.total = 0
+        self.with_position = 0
+        self.types = {}
+        hexes.clear()
+        obj = json.loads(text)
+        self.now = obj.get("now")
+        for a in obj.get("aircraft", []):
+            self._add(a.get("hex", ""), a.get("type"), a.get("lat") is not None, hexes)
+
+    @classmethod
+    def get(cls, path: str) -> Optional["AircraftSnapshot"]:
+        """Return the parsed file, or None if it doesn't exist or can't be parsed."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with cls._cache_lock:
+            cached = cls._cache.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+        try:
+            with open(path) as f:
+                snapshot = cls(f.read())
+        except (OSError, ValueError) as e:
+            print_err(f"failed to read {path}: {e}")
+            return None
+        with cls._cache_lock:
+            cls._cache[path] = (key, snapshot)
+            cls.parses += 1
+        return snapshot
+
+    def seen(self, *types: str) -> bool:
+        """Was at least one aircraft of any of these types in the file?"""
+        return any(self.types.get(t) for t in types)
@@ -0,0 +1,184 @@
+# this module only depends on the standard library, so it can be run on its own to create the airport file:
+# /opt/adsb/data/airports.csv comes with the feeder (and its updates) and was made with
+#   python3 utils/airports.py airports.csv ../data/airports.csv
+# from the public domain OurAirports data of 2022-10-11 (airports.csv, sha256
+# 99c6bb5414b573a8c790788de76f7a2dca5b6f406fb6539e934b2643236256dc)
+import csv
+import math
+import re
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 8
+
+# the OurAirports types that make sense as "the closest airport"; no heliports, seaplane bases or closed ones
+AIRPORT_TYPES = ("large_airport", "medium_airport", "small_airport")
+FIELDS = ["icao", "name", "lat", "lon", "isocountry"]
+# the icao is shown as the closest airport and its initials end up in the MLAT site name, so only real
+# ICAO codes - not the local identifiers like 00CA that OurAirports uses for many small airfields
+ICAO_CODE = re.compile(r"[A-Z]{4}")
+
+Airport = Tuple[str, str, float, float, str]
+
+
+def compact_csv(src: str, dst: str) -> int:
+    """Turn the OurAirports airports.csv into the much smaller file AirportIndex reads, returns the number of airports."""
+    count = 0
+    with open(src, newline="", encoding="utf-8") as fin, open(dst, "w", newline="", encoding="utf-8") as fout:
+        writer = csv.writer(fout)
+        writer.writerow(FIELDS)
+        for row in csv.DictReader(fin):
+            if row.get("type") not in AIRPORT_TYPES:
+                continue
+            icao = row.get("icao_code") or ""
+            if not ICAO_CODE.fullmatch(icao):
+                icao = row.get("gps_code") or ""
+            if not ICAO_CODE.fullmatch(icao):
+                continue
+            try:
+                lat, lon = float(row["latitude_deg"]), float(row["longitude_deg"])
+            except (KeyError, ValueError):
+                continue
+            writer.writerow([icao, row.get("name", ""), f"{lat:.5f}", f"{lon:.5f}", row.get("iso_country", "")])
+            count += 1
+    return count
+
+
+def _unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class AirportIndex:
+    """Nearest airport and airports-within-a-radius lookups, offline.
+
+    The airports are points on the unit sphere in a k-d tree: the coordinates are one packed
+    array in tree order, the tree itself is implicit (every range is split at its middle element,
+    along the axis stored for that element), so there are no node objects at all. The straight
+    line (chord) distance in 3d has the same order as the great circle distance, which makes the
+    usual k-d tree pruning exact.
+    """
+
+    def __init__(self, airports: Iterable[Airport]):
+        airports = list(airports)
+        points = [_unit_vector(lat, lon) for _, _, lat, lon, _ in airports]
+        order = list(range(len(airports)))
+        self._axes = array("b", [-1] * len(airports))
+        # one list per axis, so sorting can use the C level __getitem__ as key
+        self._build(order, [[p[a] for p in points] for a in range(3)], 0, len(order), 0)
+        self._xyz = array("d", (c for i in order for c in points[i]))
+        self._latlon = array("d", (c for i in order for c in airports[i][2:4]))
+        self._icao = [airports[i][0] for i in order]
+        self._name = [airports[i][1] for i in order]
+        self._country = [airports[i][4] for i in order]
+
+    @classmethod
+    def from_csv(cls, path) -> "AirportIndex":
+        """Read the file written by compact_csv."""
+        airports: List[Airport] = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    airports.append((row["icao"], row["name"], float(row["lat"]), float(row["lon"]), row["isocountry"]))
+                except (KeyError, ValueError):
+                    continue
+        return cls(airports)
+
+    def __len__(self) -> int:
+        return len(self._icao)
+
+    def _build(self, order: List[int], coords: List[List[float]], lo: int, hi: int, depth: int) -> None:
+        if hi - lo <= LEAF_SIZE:
+            return
+        # the points are spread over a sphere, so simply taking turns with the axes splits well enough
+        axis = depth % 3
+        order[lo:hi] = sorted(order[lo:hi], key=coords[axis].__getitem__)
+        mid = (lo + hi) // 2
+        self._axes[mid] = axis
+        self._build(order, coords, lo, mid, depth + 1)
+        self._build(order, coords, mid + 1, hi, depth + 1)
+
+    def _dist2(self, i: int, q: Tuple[float, float, float]) -> float:
+        xyz = self._xyz
+        dx, dy, dz = xyz[3 * i] - q[0], xyz[3 * i + 1] - q[1], xyz[3 * i + 2] - q[2]
+        return dx * dx + dy * dy + dz * dz
+
+    def _airport(self, i: int, chord2: float) -> Dict:
+        return {
+            "icao": self._icao[i],
+            "name": self._name[i],
+            "lat": self._latlon[2 * i],
+            "lon": self._latlon[2 * i + 1],
+            "isocountry": self._country[i],
+            "distance_km": round(_chord_to_km(math.sqrt(chord2)), 1),
+        }
+
+    def nearest(self, lat: float, lon: float) -> Optional[Dict]:
+        if not self._icao:
+            return None
+        q = _unit_vector(lat, lon)
+        best = [math.inf, -1]
+
+        def search(lo: int, hi: int) -> None:
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    d2 = self._dist2(i, q)
+                    if d2 < best[0]:
+                        best[0], best[1] = d2, i
+                return
+            mid = (lo + hi) // 2
+            axis = self._axes[mid]
+            diff = q[axis] - self._xyz[3 * mid + axis]
+            d2 = self._dist2(mid, q)
+            if d2 < best[0]:
+                best[0], best[1] = d2, mid
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            search(*near)
+            if diff * diff < best[0]:
+                search(*far)
+
+        search(0, len(self._icao))
+        return self._airport(int(best[1]), best[0])
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Dict]:
+        """All airports within radius_km, closest first."""
+        q = _unit_vector(lat, lon)
+        r2 = (2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)) ** 2
+        found: List[Tuple[float, int]] = []
+
+        def search(lo: int, hi: int) -> None:
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    d2 = self._dist2(i, q)
+                    if d2 <= r2:
+                        found.append((d2, i))
+                return
+            mid = (lo + hi) // 2
+            axis = self._axes[mid]
+            diff = q[axis] - self._xyz[3 * mid + axis]
+            d2 = self._dist2(mid, q)
+            if d2 <= r2:
+                found.append((d2, mid))
+            if diff < 0 or diff * diff <= r2:
+                search(lo, mid)
+            if diff >= 0 or diff * diff <= r2:
+                search(mid + 1, hi)
+
+        search(0, len(self._icao))
+        return [self._airport(i, d2) for d2, i in sorted(found)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"usage: {sys.argv[0]} <OurAirports airports.csv> <output file>", file=sys.stderr)
+        sys.exit(1)
+    count = compact_csv(sys.argv[1], sys.argv[2])
+    print(f"{count} airports written to {sys.argv[2]}")
+    if count == 0:
+        sys.exit(1)
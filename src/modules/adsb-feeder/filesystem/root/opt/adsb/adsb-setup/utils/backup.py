@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+import traceback
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from .util import print_err, report_issue
+
+MANIFEST_NAME = "backup-manifest.json"
+CHUNK_SIZE = 256 * 1024
+# files that are already compressed only cost CPU time when deflated again
+COMPRESSED_SUFFIXES = (".gz", ".tgz", ".zip", ".xz", ".bz2", ".zst")
+GZIP_MAGIC = b"\x1f\x8b"
+# the stream can't be rewritten afterwards, so larger files need their zip64 headers up front
+ZIP64_THRESHOLD = 1 << 30
+
+
+def graphs1090_writeback(uf_path: Path, micro_index: int) -> None:
+    # the rrd file will be updated via move after collectd is done writing it out
+    # so killing collectd and waiting for the mtime to change is enough
+
+    rrd_file = uf_path / "graphs1090/rrd/localhost.tar.gz"
+
+    def timeSinceWrite(rrd_file):
+        # because of the way the file gets updated, it will briefly not exist
+        # when the new copy is moved in place, which will make os.stat unhappy
+        try:
+            return time.time() - os.stat(rrd_file).st_mtime
+        except Exception:
+            return time.time() - 0  # fallback to long time since last write
+
+    context = f"graphs1090 writeback {micro_index}"
+
+    t = timeSinceWrite(rrd_file)
+    if t < 120:
+        print_err(f"{context}: not needed, timeSinceWrite: {round(t)}s")
+        return
+
+    print_err(f"{context}: requesting")
+    uf_container = "ultrafeeder" if micro_index == 0 else f"uf_{micro_index}"
+    try:
+        subprocess.run(
+            f"docker exec {uf_container} pkill collectd",
+            timeout=10.0,
+            shell=True,
+            check=True,
+        )
+    except Exception:
+        report_issue(f"{context}: docker exec failed - backed up graph data might miss up to 6h")
+        return
+
+    count = 0.0
+    increment = 0.1
+    # give up after 30 seconds
+    while count < 30:
+        count += increment
+        time.sleep(increment)
+        if timeSinceWrite(rrd_file) < 120:
+            print_err(f"{context}: success")
+            return
+
+    report_issue(f"{context}: writeback timed out - backed up graph data might miss up to 6h")
+
+
+def is_compressed(path: Path, head: bytes) -> bool:
+    # readsb writes gzip'ed heatmap and trace files without a .gz suffix, so check the magic as well
+    return path.name.endswith(COMPRESSED_SUFFIXES) or head.startswith(GZIP_MAGIC)
+
+
+def load_manifest(path: Path) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        print_err(f"can't read backup manifest {path}: {traceback.format_exc()}")
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        return None
+    return manifest
+
+
+class BackupEngine:
+    """Stream a backup zip into a file object and keep track of how far along it is.
+
+    Every file that goes into the zip is hashed on the way in and listed in a manifest that is
+    added as the last member. After a successful backup that includes the heatmap data the
+    manifest is also kept on disk; an incremental backup then skips the globe_history files
+    whose size and mtime still match it, i.e. the heatmap days that were already backed up.
+    """
+
+    def __init__(
+        self,
+        adsb_path: Path,
+        manifest_path: Path,
+        writeback: Callable[[Path, int], None] = graphs1090_writeback,
+        max_writebacks: int = 8,
+    ):
+        self._adsb_path = adsb_path
+        self._manifest_path = manifest_path
+        self._writeback = writeback
+        self._max_writebacks = max_writebacks
+        self._lock = threading.Lock()
+        self._writebacks: Dict[int, Future] = {}
+        self._progress: Dict = {
+            "state": "starting",
+            "files_done": 0,
+            "files_skipped": 0,
+            "files_total": 0,
+            "bytes_done": 0,
+            "bytes_total": 0,
+            "current": "",
+            "started": time.time(),
+            "finished": None,
+        }
+
+    def progress(self) -> Dict:
+        with self._lock:
+            progress = dict(self._progress)
+            progress["writebacks_pending"] = sum(not f.done() for f in self._writebacks.values())
+        progress["elapsed"] = round((progress["finished"] or time.time()) - progress["started"], 1)
+        return progress
+
+    def _update(self, **kwargs) -> None:
+        with self._lock:
+            self._progress.update(kwargs)
+
+    def _heatmap_files(self, uf_path: Path) -> List[Path]:
+        gh_path = uf_path / "globe_history"
+        files: List[Path] = []
+        if not gh_path.is_dir():
+            return files
+        for subpath in gh_path.iterdir():
+            if subpath.name in ("internal_state", "tar1090-update"):
+                continue
+            print_err(f"add: {subpath}")
+            files += sorted(f for f in subpath.rglob("*") if f.is_file())
+        return files
+
+    def _add(self, backup_zip: zipfile.ZipFile, path: Path, arcname: str) -> Dict:
+        zinfo = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+        sha256 = hashlib.sha256()
+        self._update(current=arcname)
+        with open(path, "rb") as src:
+            chunk = src.read(CHUNK_SIZE)
+            zinfo.compress_type = zipfile.ZIP_STORED if is_compressed(path, chunk) else zipfile.ZIP_DEFLATED
+            with backup_zip.open(zinfo, "w", force_zip64=zinfo.file_size > ZIP64_THRESHOLD) as dst:
+                while chunk:
+                    sha256.update(chunk)
+                    dst.write(chunk)
+                    with self._lock:
+                        self._progress["bytes_done"] += len(chunk)
+                    chunk = src.read(CHUNK_SIZE)
+        with self._lock:
+            self._progress["files_done"] += 1
+        return {"size": zinfo.file_size, "sha256": sha256.hexdigest()}
+
+    def write(
+        self,
+        fobj: BinaryIO,
+        sites: List[Tuple[int, Path]],
+        include_graphs: bool = False,
+        include_heatmap: bool = False,
+        incremental: bool = False,
+    ) -> bool:
+        """Write the backup for the (micro index, ultrafeeder path) sites to fobj, return True if it completed.
+
+        With include_heatmap the manifest is saved as the base for the next incremental backup once the
+        whole zip was written to fobj. For a download that only means it went into the pipe - whether
+        the browser kept the file isn't known here.
+        """
+        previous = load_manifest(self._manifest_path) if include_heatmap and incremental else None
+        previous_files = previous["files"] if previous else {}
+        manifest: Dict = {
+            "created": datetime.now().replace(microsecond=0).isoformat(),
+            "incremental": previous is not None,
+            "since": previous.get("created") if previous else None,
+            "files": {},
+        }
+
+        executor = None
+        if include_graphs and sites:
+            # killing collectd and waiting for the rrd tarball to be rewritten takes up to 30s per site,
+            # so get all of them going right away and only wait for them once the heatmap data is written
+            executor = ThreadPoolExecutor(max_workers=min(len(sites), self._max_writebacks), thread_name_prefix="writeback")
+            with self._lock:
+                for micro_index, uf_path in sites:
+                    self._writebacks[micro_index] = executor.submit(self._writeback, uf_path, micro_index)
+
+        todo: List[Tuple[Path, str]] = [(self._adsb_path / "config.json", "config.json")]
+        if include_heatmap:
+            for _, uf_path in sites:
+                for f in self._heatmap_files(uf_path):
+                    todo.append((f, str(f.relative_to(self._adsb_path))))
+        bytes_total = 0
+        for path, _ in todo:
+            try:
+                bytes_total += path.stat().st_size
+            except OSError:
+                pass
+        self._update(state="running", files_total=len(todo) + (len(sites) if include_graphs else 0), bytes_total=bytes_total)
+
+        try:
+            with fobj as file, zipfile.ZipFile(file, mode="w", compression=zipfile.ZIP_DEFLATED) as backup_zip:
+                for path, arcname in todo:
+                    try:
+                        st = path.stat()
+                    except OSError:
+                        # heatmap files get rotated out while we are at it
+                        continue
+                    old = previous_files.get(arcname) if arcname != "config.json" else None
+                    if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns:
+                        manifest["files"][arcname] = {**old, "included": False}
+                        with self._lock:
+                            self._progress["files_skipped"] += 1
+                            self._progress["bytes_done"] += st.st_size
+                        continue
+                    entry = self._add(backup_zip, path, arcname)
+                    manifest["files"][arcname] = {**entry, "mtime_ns": st.st_mtime_ns, "included": True}
+
+                # do graphs after heatmap data as this can pause a couple seconds in graphs1090_writeback
+                # due to buffers, the download won't be recognized by the browsers until some data is added to the zipfile
+                if include_graphs:
+                    for micro_index, uf_path in sites:
+                        self._update(current=f"graphs1090 writeback {micro_index}")
+                        self._writebacks[micro_index].result()
+                        graphs_path = uf_path / "graphs1090/rrd/localhost.tar.gz"
+                        if graphs_path.exists():
+                            arcname = str(graphs_path.relative_to(self._adsb_path))
+                            entry = self._add(backup_zip, graphs_path, arcname)
+                            manifest["files"][arcname] = {**entry, "mtime_ns": graphs_path.stat().st_mtime_ns, "included": True}
+                        else:
+                            report_issue(f"graphs1090 backup failed, file not found: {graphs_path}")
+
+                self._update(current=MANIFEST_NAME)
+                backup_zip.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1))
+        except BrokenPipeError:
+            report_issue("warning: backup download aborted mid-stream")
+            self._update(state="aborted", finished=time.time())
+            return False
+        except Exception:
+            print_err(f"backup failed: {traceback.format_exc()}")
+            self._update(state="failed", finished=time.time())
+            return False
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+        # only a complete backup with the heatmap data can be the base for the next incremental one
+        # (complete as far as we can tell, see the docstring)
+        if include_heatmap:
+            self._save_manifest(manifest)
+        self._update(state="done", current="", finished=time.time())
+        return True
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        try:
+            self._manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._manifest_path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self._manifest_path)
+        except Exception:
+            print_err(f"can't save backup manifest {self._manifest_path}: {traceback.format_exc()}")
@@ -0,0 +1,141 @@
+import re
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .paths import ADSB_CONFIG_DIR, DEFAULT_DOCKER_COMPOSE_FILE
+from .util import print_err
+
+# .env variables that decide which compose files are used (see default.docker-compose)
+# or that can affect any container - a change to one of these always needs a full
+# docker-compose-start; the ones used in default.docker-compose are added when it's parsed
+FULL_START_VARS = {
+    "AF_IS_BASE_CONFIG_FINISHED",
+    "AF_NUM_MICRO_SITES",
+    "AF_IS_STAGE2",
+    "_ADSBIM_AGGREGATORS_SELECTION",
+    "_ADSBIM_STATE_EXTRA_ENV",
+}
+
+_var_ref = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)")
+_selector = re.compile(r"grep\s+(?:-\S+\s+)*\"?(_?[A-Za-z0-9_]+?)(?:_\$\{i\})?=")
+_site_suffix = re.compile(r"_\d+$")
+
+
+def parse_compose_services(text: str) -> dict[str, tuple[str, set[str]]]:
+    """Find the services in a compose file.
+
+    This only understands the simple layout of our own yml files, not yaml in general.
+
+    Args:
+        text: content of the compose file
+
+    Returns:
+        dict of service name to (container name, set of variables the service references)
+    """
+    services: dict[str, tuple[str, set[str]]] = {}
+    in_services = False
+    service = ""
+    service_indent = -1
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(line) - len(line.lstrip())
+        if indent == 0:
+            in_services = stripped == "services:"
+            service = ""
+            continue
+        if not in_services:
+            continue
+        if service_indent < 0:
+            service_indent = indent
+        if indent == service_indent and stripped.endswith(":"):
+            service = stripped[:-1]
+            services[service] = (service, set())
+            continue
+        if not service:
+            continue
+        container_name, variables = services[service]
+        if stripped.startswith("container_name:"):
+            container_name = stripped.split(":", 1)[1].strip().strip("\"'")
+        variables.update(_var_ref.findall(stripped))
+        services[service] = (container_name, variables)
+    return services
+
+
+class ComposeImpact:
+    """Map .env variables to the compose services that use them."""
+
+    def __init__(self, config_dir: Optional[Path] = None, selector_file: Optional[Path] = None) -> None:
+        self._config_dir = config_dir or ADSB_CONFIG_DIR
+        self._selector_file = selector_file or DEFAULT_DOCKER_COMPOSE_FILE
+        self._lock = threading.Lock()
+        self._signature: Optional[tuple] = None
+        self._services: dict[str, tuple[str, set[str]]] = {}
+        self._var_to_services: dict[str, set[str]] = {}
+        self._full_start_vars: set[str] = set(FULL_START_VARS)
+
+    def _compose_files(self) -> list[Path]:
+        # the stage2 templates are only used to create the per site yml files
+        return sorted(
+            p for p in self._config_dir.glob("*.yml") if not p.name.endswith("_template.yml") and p.name != "stage2.yml"
+        )
+
+    def _refresh(self) -> None:
+        files = self._compose_files()
+        signature = []
+        for p in files + [self._selector_file]:
+            try:
+                st = p.stat()
+                signature.append((p.name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((p.name, 0, 0))
+        if tuple(signature) == self._signature:
+            return
+        services: dict[str, tuple[str, set[str]]] = {}
+        for p in files:
+            try:
+                services.update(parse_compose_services(p.read_text()))
+            except OSError as e:
+                print_err(f"failed to read {p}: {e}")
+        var_to_services: dict[str, set[str]] = {}
+        for service, (_, variables) in services.items():
+            for var in variables:
+                var_to_services.setdefault(var, set()).add(service)
+        full_start_vars = set(FULL_START_VARS)
+        try:
+            full_start_vars.update(_selector.findall(self._selector_file.read_text()))
+        except OSError as e:
+            print_err(f"failed to read {self._selector_file}: {e}")
+        self._services = services
+        self._var_to_services = var_to_services
+        self._full_start_vars = full_start_vars
+        self._signature = tuple(signature)
+        print_err(f"compose impact map: {len(services)} services, {len(var_to_services)} variables", level=8)
+
+    def needs_full_start(self, var: str) -> bool:
+        """Check if a change to this variable can change the set of compose files."""
+        return var in self._full_start_vars or _site_suffix.sub("", var) in self._full_start_vars
+
+    def services_for(self, changed: Iterable[str], running: Iterable[str]) -> Optional[set[str]]:
+        """Find the services that need to be recreated after the given .env variables changed.
+
+        Args:
+            changed: names of the .env variables that changed
+            running: names of the running containers
+
+        Returns:
+            set of service names (only those with a running container), or None if a full
+            docker-compose-start is needed
+        """
+        with self._lock:
+            self._refresh()
+            affected: set[str] = set()
+            for var in changed:
+                if self.needs_full_start(var):
+                    print_err(f"{var} changed, need to start all containers", level=2)
+                    return None
+                affected.update(self._var_to_services.get(var, set()))
+            running = set(running)
+            return {s for s in affected if self._services[s][0] in running}
@@ -4,23 +4,74 @@ import os.path
 import tempfile
 import threading
 import time
+from contextlib import contextmanager
+from typing import Optional
 
 from .paths import ADSB_CONFIG_DIR, CONFIG_JSON_FILE, ENV_FILE, USER_ENV_FILE
 from .util import print_err
 
 config_lock = threading.Lock()
 config_cache = None
-config_cache_updated = 0.0
+# (st_mtime_ns, st_size, st_ino) of config.json when config_cache was read or written
+# config.json is always replaced via rename, so any change by another writer changes at least the inode
+config_cache_stat: Optional[tuple] = None
+config_cache_counters = {"hits": 0, "misses": 0, "reparses": 0}
+config_stats_since = time.time()
+
+# transactions are per thread: while one is open, that thread's writes to config.json only
+# update its own copy of the values; the file is written once when the outermost transaction
+# commits, and only the keys the transaction changed are merged into what is on disk by then
+config_txn = threading.local()
+# number of threads with an open transaction
+config_txn_open = 0
+config_writes = 0
+config_writes_saved = 0
+
+
+def _config_json_stat() -> Optional[tuple]:
+    try:
+        st = os.stat(CONFIG_JSON_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _txn_depth() -> int:
+    return getattr(config_txn, "depth", 0)
+
+
+def _merge_changes(file_values: dict) -> dict:
+    """file_values with the keys this thread's transaction set or removed applied on top."""
+    values, base = config_txn.values, config_txn.base
+    merged = dict(file_values)
+    merged.update({k: v for k, v in values.items() if k not in base or base[k] != v})
+    for k in base:
+        if k not in values:
+            merged.pop(k, None)
+    return merged
+
+
+def _txn_values() -> dict:
+    """This thread's view of config.json inside a transaction: what is on disk plus its own pending changes."""
+    file_values = _read_config_json()
+    if config_cache_stat != config_txn.stat:
+        # someone else wrote config.json since we last looked, keep their changes
+        config_txn.values = _merge_changes(file_values)
+        config_txn.base = dict(file_values)
+        config_txn.stat = config_cache_stat
+    return config_txn.values
 
 
 def read_values_from_config_json(no_cache=False):
+    # inside a transaction this thread's pending changes haven't been written, yet
+    if _txn_depth() > 0:
+        return _txn_values()
+    return _read_config_json(no_cache)
+
+
+def _read_config_json(no_cache=False):
     global config_cache
-    global config_cache_updated
-    # the config cache means we don't need to do as much json parsing
-    # mostly this speeds up the startup of the app
-    if not no_cache and config_cache and time.time() - config_cache_updated < 1:
-        return config_cache
-    print_err("reading config.json file", level=8)
+    global config_cache_stat
     if not os.path.exists(CONFIG_JSON_FILE):
         # this must be either a first run after an install,
         # or the first run after an upgrade from a version that didn't use the config.json
@@ -28,6 +79,18 @@ def read_values_from_config_json(no_cache=False):
         values = read_values_from_env_file()
         write_values_to_config_json(values, reason="config.json didn't exist")
 
+    # the config cache means we don't need to do as much json parsing - it stays valid
+    # until the file on disk changes, no matter who changed it
+    stat = _config_json_stat()
+    if not no_cache and config_cache is not None and stat is not None and stat == config_cache_stat:
+        config_cache_counters["hits"] += 1
+        return config_cache
+    if config_cache is None or no_cache:
+        config_cache_counters["misses"] += 1
+    else:
+        config_cache_counters["reparses"] += 1
+    print_err("reading config.json file", level=8)
+
     ret = {}
     try:
         with open(CONFIG_JSON_FILE, "r") as f:
@@ -36,13 +99,21 @@ def read_values_from_config_json(no_cache=False):
         print_err("Failed to read .json file")
     else:
         config_cache = ret
-        config_cache_updated = time.time()
+        config_cache_stat = stat
     return ret
 
 
 def write_values_to_config_json(data: dict, reason="no reason provided"):
     global config_cache
-    global config_cache_updated
+    global config_cache_stat
+    global config_writes
+    if _txn_depth() > 0:
+        # defer the write until this thread's transaction commits
+        config_txn.pending += 1
+        config_txn.reasons.append(reason)
+        config_txn.values = data
+        return
+    config_writes += 1
     try:
         print_err(f"config.json write: {reason}")
         fd, tmp = tempfile.mkstemp(dir=str(ADSB_CONFIG_DIR))
@@ -53,7 +124,63 @@ def write_values_to_config_json(data: dict, reason="no reason provided"):
         print_err(f"Error writing config.json to {CONFIG_JSON_FILE}")
         return  # don't update cache if write failed
     config_cache = data
-    config_cache_updated = time.time()
+    config_cache_stat = _config_json_stat()
+
+
+@contextmanager
+def config_transaction(reason="transaction"):
+    """Batch all config.json writes of this thread inside the with block into one atomic write.
+
+    Transactions nest; only the outermost one writes the file. The write happens even
+    if the block raises, as the Env objects in memory have already been changed.
+    Other threads aren't affected: their writes go to the file right away (or into
+    their own transaction), and the commit only writes the keys this transaction changed.
+    """
+    global config_txn_open
+    global config_writes_saved
+    if _txn_depth() == 0:
+        with config_lock:
+            file_values = _read_config_json()
+            config_txn_open += 1
+            config_txn.stat = config_cache_stat
+            # copies, as other threads change the cached dict in place
+            config_txn.base = dict(file_values)
+            config_txn.values = dict(file_values)
+        config_txn.pending = 0
+        config_txn.reasons = []
+    config_txn.depth = _txn_depth() + 1
+    try:
+        yield
+    finally:
+        config_txn.depth -= 1
+        if config_txn.depth == 0:
+            with config_lock:
+                config_txn_open -= 1
+                pending = config_txn.pending
+                if pending > 0:
+                    values = _merge_changes(_read_config_json())
+                    config_writes_saved += pending - 1
+                    print_err(f"config.json transaction {reason}: {pending} changes in one write", level=8)
+                    for r in config_txn.reasons:
+                        print_err(f"  {r}", level=8)
+                    write_values_to_config_json(values, reason=f"{reason} ({pending} changes)")
+            config_txn.base = config_txn.values = None
+
+
+def config_write_stats():
+    return {"writes": config_writes, "writes_saved": config_writes_saved, "in_transaction": config_txn_open > 0}
+
+
+def config_cache_stats():
+    """Get the config.json cache counters, including parses per minute since startup."""
+    minutes = max((time.time() - config_stats_since) / 60, 1 / 60)
+    parses = config_cache_counters["misses"] + config_cache_counters["reparses"]
+    return {
+        **config_cache_counters,
+        "parses_per_minute": round(parses / minutes, 2),
+        "writes_per_minute": round(config_writes / minutes, 2),
+        "minutes": round(minutes, 1),
+    }
 
 
 def read_values_from_env_file():
@@ -1,9 +1,15 @@
 # dataclass
 import os
+import time
 from dataclasses import dataclass, field
-from typing import Any, Optional, Union
+from typing import Any, ClassVar, Iterable, Optional, Union
 
-from utils.config import read_values_from_env_file
+from utils.config import (
+    config_transaction,
+    config_write_stats,
+    read_values_from_config_json,
+    read_values_from_env_file,
+)
 
 from .environment import Env
 from .netconfig import NetConfig
@@ -17,7 +23,23 @@ from .paths import (
     SECURE_IMAGE_FILE,
     VERSION_FILE,
 )
-from .util import is_true, print_err
+from .util import get_verbose, is_true, print_err
+
+
+def _index_envs(envs: Iterable[Env]) -> tuple[dict[str, Env], dict[str, set[Env]]]:
+    """Build the name -> Env and the inverted tag -> set of Env indexes."""
+    by_name: dict[str, Env] = {}
+    by_tag: dict[str, set[Env]] = {}
+    for e in envs:
+        if e.name in by_name:
+            print_err(f"More than one Env with name {e.name}")
+        else:
+            by_name[e.name] = e
+        if not e.tags:
+            print_err(f"{e} has no tags")
+        for t in e.tags:
+            by_tag.setdefault(t, set()).add(e)
+    return by_name, by_tag
 
 
 @dataclass
@@ -51,13 +73,17 @@ class Data:
             if hasattr(cls.instance, "_env_by_tags_dict"):
                 cls.instance._env_by_tags_dict.clear()
             delattr(cls, "instance")
+        # force the indexes to be rebuilt on next use
+        cls._env_index_size = -1
 
         # Force all Env objects to re-read from config file
         # This allows tests to provide new config.json files
         if hasattr(cls, "_env"):
+            Env.preload(read_values_from_config_json(no_cache=True))
             for env_obj in cls._env:
                 if hasattr(env_obj, "_reconcile"):
                     env_obj._reconcile(value=None, pull=True)
+            Env.preload(None)
 
     data_path = ADSB_BASE_DIR
     config_path = ADSB_CONFIG_DIR
@@ -69,6 +95,8 @@ class Data:
     _env_by_tags_dict: dict[tuple[str, ...], Env] = field(default_factory=dict[tuple[str, ...], Env])
 
     ultrafeeder: list = field(default_factory=list)
+    # the values last written to the .env file, used to determine what changed
+    _last_envfile_values: Optional[dict[str, Union[str, int, bool]]] = None
     previous_version = ""
     adsbim_api_url = "https://adsb.im/api"
 
@@ -186,6 +214,15 @@ class Data:
             has_policy=True,
         ),
     }
+    # time spent in the different phases of starting up, in seconds
+    startup_timing: ClassVar[dict[str, float]] = {}
+
+    # parse config.json once and hand the values to all the Envs created below
+    _startup_t = time.perf_counter()
+    Env.preload(read_values_from_config_json(no_cache=True))
+    startup_timing["read config.json"] = time.perf_counter() - _startup_t
+    _startup_t = time.perf_counter()
+
     # we have four different types of "feeders":
     # 1. integrated feeders (single SBC where one Ultrafeeder collects from SDR and send to aggregator)
     # 2. micro feeders (SBC with SDR(s) attached, talking to a stage2 micro proxy)
@@ -844,6 +881,8 @@ class Data:
     }
     for i in range(16):
         _env.add(Env(f"FEEDER_UNUSED_SERIAL_{i}", tags=[f"other-{i}"]))
+    startup_timing["create Envs"] = time.perf_counter() - _startup_t
+    _startup_t = time.perf_counter()
 
     # Container images
     # -- these names are magic and are used in yaml files and the structure
@@ -867,7 +906,8 @@ class Data:
         "SKYSTATS_CONTAINER": "skystats",
     }
     try:
-        with open(DOCKER_IMAGE_VERSIONS_FILE, "r") as file:
+        # if the container versions changed, write them to config.json all at once
+        with config_transaction("container versions"), open(DOCKER_IMAGE_VERSIONS_FILE, "r") as file:
             for line in file:
                 if line.startswith("#"):
                     continue
@@ -898,12 +938,22 @@ class Data:
         # Unexpected errors should always be logged
         print_err(f"Error loading container versions from {DOCKER_IMAGE_VERSIONS_FILE}: {e}")
         # Don't raise - allow system to continue with degraded functionality
+    startup_timing["container versions"] = time.perf_counter() - _startup_t
+    _startup_t = time.perf_counter()
+    Env.preload(None)
+
+    # indexes for fast lookups by name and by tag - the Envs above are all created at import time,
+    # the index is rebuilt if the number of Envs changes (which only happens in tests)
+    _env_by_name: ClassVar[dict[str, Env]]
+    _env_by_tag: ClassVar[dict[str, set[Env]]]
+    _env_by_name, _env_by_tag = _index_envs(_env)
+    _env_index_size: ClassVar[int] = len(_env)
+    startup_timing["build indexes"] = time.perf_counter() - _startup_t
+    del _startup_t
 
     @property
     def envs_for_envfile(self) -> dict[str, Union[str, int, bool]]:
         """Generate environment variables dictionary for .env file."""
-        # read old values from env file so we can debug print only those that have changed
-        old_values = read_values_from_env_file()
 
         def adjust_bool_impl(e: Env, value: Any) -> Union[str, bool, int]:
             if "false_is_zero" in e.tags:
@@ -946,18 +996,6 @@ class Data:
 
         ret = {}
         for e in self._env:
-
-            def printChanged(descriptor: str, envKey: str, newValue: Any, oldValue: Any) -> None:
-                # omit state vars as they are never in the env file so we don't know if they changed
-                oldValue = str(oldValue)
-                newValue = str(newValue)
-                if oldValue != newValue and not envKey.startswith("_ADSBIM_STATE"):
-                    emptyStringPrint = "''"
-                    print_err(
-                        f"{descriptor}: {envKey} = {emptyStringPrint if newValue == '' else newValue}",
-                        level=2,
-                    )
-
             if type(e._value) == list:
                 if e._name == "FEEDER_HEYWHATSTHAT_ID":
                     actual_value = adjust_heywhatsthat(e._value)
@@ -966,19 +1004,9 @@ class Data:
 
                 for i in range(len(actual_value)):
                     suffix = "" if i == 0 else f"_{i}"
-                    value = actual_value[i]
-                    envKey = e._name + suffix
-
-                    ret[envKey] = value_for_env(e, value)
-
-                    printChanged("ENV_FILE LIST", envKey, ret[envKey], old_values.get(envKey))
-
+                    ret[e._name + suffix] = value_for_env(e, actual_value[i])
             else:
-                envKey = e._name
-
-                ret[envKey] = value_for_env(e, e._value)
-
-                printChanged("ENV_FILE OTHR", envKey, ret[envKey], old_values.get(envKey))
+                ret[e._name] = value_for_env(e, e._value)
 
         # add convenience values
         # fmt: off
@@ -996,6 +1024,60 @@ class Data:
         return ret
         # fmt: on
 
+    def transaction(self, reason: str = "transaction"):
+        """Context manager that collects all Env changes and writes config.json once at the end."""
+        return config_transaction(reason)
+
+    def startup_timing_str(self) -> str:
+        """Get the startup timing breakdown as a string for logging."""
+        total = sum(self.startup_timing.values())
+        phases = ", ".join(f"{k}: {v:.3f}s" for k, v in self.startup_timing.items())
+        return f"{phases} (total {total:.3f}s)"
+
+    @property
+    def config_write_stats(self) -> dict[str, Any]:
+        """Get number of config.json writes and how many were saved by transactions."""
+        return config_write_stats()
+
+    @staticmethod
+    def _in_envfile(name: str) -> bool:
+        # _ADSBIM_STATE variables aren't written to the .env file, except for the extra env vars
+        # that end up in .env.user
+        return not name.startswith("_ADSBIM_STATE") or name == "_ADSBIM_STATE_EXTRA_ENV"
+
+    def envfile_changes(self, force: bool = False) -> tuple[Optional[dict[str, Union[str, int, bool]]], set[str]]:
+        """Regenerate the .env values if an Env that is used in the .env file has changed.
+
+        Args:
+            force: regenerate even if no such Env was marked dirty and compare to the file on disk
+
+        Returns:
+            the values for the .env file (None if it doesn't need to be written) and the set of
+            variables whose value changed
+        """
+        dirty = Env.take_dirty()
+        if not force and self._last_envfile_values is not None and not any(self._in_envfile(n) for n in dirty):
+            print_err(f"no changes relevant for the .env file: {sorted(dirty)}", level=8)
+            return None, set()
+
+        old_values = self._last_envfile_values
+        if force or old_values is None:
+            # compare to what's on disk
+            old_values = read_values_from_env_file()
+        values = self.envs_for_envfile
+        changed = {
+            k for k in values.keys() | old_values.keys() if self._in_envfile(k) and str(values.get(k)) != str(old_values.get(k))
+        }
+        self._last_envfile_values = values
+        if get_verbose() & 2:
+            emptyStringPrint = "''"
+            for k in sorted(changed):
+                v = values.get(k, "")
+                print_err(f"ENV_FILE: {k} = {emptyStringPrint if v == '' else v}", level=2)
+        if not changed:
+            return None, set()
+        return values, changed
+
     @property
     def env_values(self) -> dict[str, Any]:
         """Get dictionary of environment variable names to values."""
@@ -1006,12 +1088,17 @@ class Data:
         """Get list of environment variables that are lists (for stage2)."""
         return [e for e in self._env if e.is_list]
 
+    def _check_env_index(self) -> None:
+        """Rebuild the name and tag indexes if Envs were added or removed."""
+        if Data._env_index_size != len(self._env):
+            Data._env_by_name, Data._env_by_tag = _index_envs(self._env)
+            Data._env_index_size = len(self._env)
+            self._env_by_tags_dict.clear()
+
     # helper function to find env by name
     def env(self, name: str) -> Optional[Env]:
-        for e in self._env:
-            if e.name == name:
-                return e
-        return None
+        self._check_env_index()
+        return self._env_by_name.get(name)
 
     # helper function to find env by tags
     # Return only if there is one env with all the tags,
@@ -1026,18 +1113,16 @@ class Data:
         if not tags:
             raise Exception(f"env_by_tags called with no tags")
 
+        self._check_env_index()
         # make the list a tuple so it's hashable
         tags_tuple = tuple(tags)
         cached = self._env_by_tags_dict.get(tags_tuple)
         if cached:
             return cached
 
-        matches: list[Env] = []
-        for e in self._env:
-            if not e.tags:
-                print_err(f"{e} has no tags")
-            if all(t in e.tags for t in tags):
-                matches.append(e)
+        # intersect the sets of Envs for each tag, starting with the smallest one
+        tag_sets = sorted((self._env_by_tag.get(t, set()) for t in set(tags)), key=len)
+        matches = tag_sets[0].intersection(*tag_sets[1:])
         if len(matches) == 0:
             raise Exception(f"No Env for tags {tags}")
         if len(matches) > 1:
@@ -1045,15 +1130,14 @@ class Data:
             for e in matches:
                 print_err(f"  {e}")
 
-        self._env_by_tags_dict[tags_tuple] = matches[0]
-        return matches[0]
+        match = next(iter(matches))
+        self._env_by_tags_dict[tags_tuple] = match
+        return match
 
     def _get_enabled_env_by_tags(self, tags: list[str]) -> Env:
         """Get environment variable with is_enabled tag appended."""
-        # we append is_enabled to tags
-        tags.append("is_enabled")
-        # stack_info(f"taglist {tags} gets us env {self.env_by_tags(tags)}")
-        return self.env_by_tags(tags)
+        # build a new list - the caller's list must not be modified
+        return self.env_by_tags(tags + ["is_enabled"])
 
     # helper function to see if something is enabled
     def is_enabled(self, tags: Union[str, list[str]]) -> bool:
@@ -0,0 +1,188 @@
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+from urllib.parse import quote
+
+from .paths import DOCKER_SOCKET
+from .util import print_err
+
+
+class ContainerState(NamedTuple):
+    state: str  # "running", "exited", "created", ...
+    started_at: float  # unix timestamp, 0 if unknown
+    health: str  # "healthy", "unhealthy", "starting" or "" if there's no healthcheck
+
+
+def parse_docker_time(value: str) -> float:
+    """Convert a docker timestamp like 2024-05-01T12:00:00.123456789Z to a unix timestamp."""
+    if not value or value.startswith("0001-"):
+        return 0.0
+    value = value.rstrip("Z")
+    if "." in value:
+        # python only handles microseconds
+        whole, fraction = value.split(".", 1)
+        value = f"{whole}.{fraction[:6]}"
+    try:
+        return datetime.fromisoformat(value + "+00:00").timestamp()
+    except ValueError:
+        print_err(f"can't parse docker timestamp {value}")
+        return 0.0
+
+
+class DockerWatcher:
+    """Keep track of the state of all containers by following the docker events.
+
+    A background thread talks to the Docker Engine API over the unix socket: one list of
+    all containers on (re)connect, then it follows /events. Readers only ever look at
+    the containers dict, which is replaced or updated one key at a time.
+    """
+
+    def __init__(self, socket_path: Optional[Path] = None, reconnect_delay: float = 5.0) -> None:
+        self._socket_path = str(socket_path or DOCKER_SOCKET)
+        self._reconnect_delay = reconnect_delay
+        self.containers: dict[str, ContainerState] = {}
+        self.connected = False
+        self._running = False
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="docker-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self.connected = False
+        sock = self._sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def get(self, name: str) -> Optional[ContainerState]:
+        return self.containers.get(name)
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                self._watch()
+            except (OSError, ValueError) as e:
+                if self._running:
+                    print_err(f"docker watcher: lost connection to {self._socket_path}: {e}", level=2)
+            self.connected = False
+            if self._running:
+                time.sleep(self._reconnect_delay)
+
+    def _request(self, path: str, timeout: Optional[float] = 10.0) -> tuple[socket.socket, bytes]:
+        # HTTP/1.0 so the daemon neither uses chunked encoding nor keeps the connection open
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self._socket_path)
+            sock.sendall(f"GET {path} HTTP/1.0\r\nHost: docker\r\n\r\n".encode())
+            data = b""
+            while b"\r\n\r\n" not in data:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise ValueError(f"incomplete response for {path}")
+                data += chunk
+        except Exception:
+            sock.close()
+            raise
+        header, body = data.split(b"\r\n\r\n", 1)
+        status = header.split(b"\r\n", 1)[0].split(b" ")
+        if len(status) < 2 or status[1] != b"200":
+            sock.close()
+            raise ValueError(f"{path} returned {header.splitlines()[0].decode(errors='replace')}")
+        return sock, body
+
+    def _get_json(self, path: str):
+        sock, body = self._request(path)
+        with sock:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                body += chunk
+        return json.loads(body)
+
+    def _inspect(self, container_id: str) -> tuple[str, ContainerState]:
+        info = self._get_json(f"/containers/{container_id}/json")
+        state = info.get("State", {})
+        health = (state.get("Health") or {}).get("Status", "")
+        return info.get("Name", "").lstrip("/"), ContainerState(
+            state.get("Status", ""), parse_docker_time(state.get("StartedAt", "")), health
+        )
+
+    def _lines(self, sock: socket.socket, buffer: bytes) -> Iterator[bytes]:
+        while self._running:
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                if line.strip():
+                    yield line
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ValueError("event stream closed")
+            buffer += chunk
+
+    def _watch(self) -> None:
+        # ask for the events from before the list so nothing that happens in between is lost
+        since = int(time.time())
+        containers: dict[str, ContainerState] = {}
+        for c in self._get_json("/containers/json?all=1"):
+            if c.get("State") == "running":
+                name, state = self._inspect(c["Id"])
+            else:
+                name = (c.get("Names") or ["/"])[0].lstrip("/")
+                state = ContainerState(c.get("State", ""), 0.0, "")
+            if name:
+                containers[name] = state
+        self.containers = containers
+
+        filters = quote(json.dumps({"type": ["container"]}))
+        sock, body = self._request(f"/events?since={since}&filters={filters}", timeout=None)
+        self._sock = sock
+        self.connected = True
+        print_err(f"docker watcher: following events, {len(containers)} containers", level=2)
+        try:
+            for line in self._lines(sock, body):
+                self._handle_event(json.loads(line))
+        finally:
+            self._sock = None
+            sock.close()
+
+    def _handle_event(self, event: dict) -> None:
+        action = event.get("Action") or event.get("status", "")
+        name = event.get("Actor", {}).get("Attributes", {}).get("name", "")
+        if not name:
+            return
+        when = event.get("timeNano", 0) / 1e9 or float(event.get("time", 0))
+        current = self.containers.get(name, ContainerState("", 0.0, ""))
+        if action == "start":
+            self.containers[name] = ContainerState("running", when, "starting" if current.health else "")
+        elif action == "die":
+            # stop, kill and oom are all followed by a die event
+            self.containers[name] = ContainerState("exited", 0.0, "")
+        elif action == "create":
+            self.containers[name] = ContainerState("created", 0.0, "")
+        elif action == "destroy":
+            self.containers.pop(name, None)
+        elif action == "rename":
+            old_name = event["Actor"]["Attributes"].get("oldName", "").lstrip("/")
+            self.containers[name] = self.containers.pop(old_name, current)
+        elif action.startswith("health_status"):
+            self.containers[name] = current._replace(health=action.split(":", 1)[-1].strip())
+        elif action == "pause":
+            self.containers[name] = current._replace(state="paused")
+        elif action == "unpause":
+            self.containers[name] = current._replace(state="running")
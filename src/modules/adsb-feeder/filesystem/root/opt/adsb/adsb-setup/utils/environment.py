@@ -1,4 +1,4 @@
-from typing import Callable, List, Optional, Union
+from typing import Callable, ClassVar, List, Optional, Union
 
 from utils.config import config_lock, read_values_from_config_json, write_values_to_config_json
 from utils.util import is_true, make_int, print_err, report_issue, stack_info
@@ -10,6 +10,13 @@ class Env:
     _is_mandatory: bool
     _value_call: Union[Callable, None]
     _tags: List[str]
+    # while set, Envs pull their values from this dict instead of reading config.json
+    # Data uses this to construct all of its Envs from a single read of the file
+    _preloaded_values: ClassVar[Optional[dict]] = None
+    # names of the Envs whose value was changed since the .env values were last generated
+    _dirty: ClassVar[set] = set()
+    # bumped whenever any Env is created or changes its value, so derived data knows when to recompute
+    _generation: ClassVar[int] = 0
 
     def __init__(
         self,
@@ -42,44 +49,40 @@ class Env:
 
         # Always reconcile from file
         self._reconcile(value=None, pull=True)
+        Env._generation += 1
+
+    @classmethod
+    def preload(cls, values: Optional[dict]):
+        """Set (or with None clear) the values Envs pull from instead of reading config.json."""
+        cls._preloaded_values = values
+
+    @classmethod
+    def take_dirty(cls) -> set:
+        """Get and reset the names of the Envs that changed since the last call."""
+        with config_lock:
+            dirty = cls._dirty
+            cls._dirty = set()
+        return dirty
+
+    @classmethod
+    def generation(cls) -> int:
+        """A counter that changes whenever any Env value changes."""
+        return cls._generation
 
     def _reconcile(self, value, pull: bool = False):
         with config_lock:
-            file_values = read_values_from_config_json()
+            if pull and Env._preloaded_values is not None:
+                file_values = Env._preloaded_values
+            else:
+                file_values = read_values_from_config_json()
             value_in_file = file_values.get(self._name, None)
 
             if pull and value_in_file != None:
-                if self._default != None and type(value_in_file) != type(self._default):
-                    if type(self._default) == bool:
-                        self._value = is_true(value_in_file)
-                        return
-                    if type(self._default) == list and len(self._default) > 0:
-                        if type(self._default[0]) == type(value_in_file):
-                            self._value = [value_in_file]
-                            stack_info(f"converting {self._name} to list {self._value}")
-                            return
-                        if type(self._default[0]) == bool and (value_in_file.lower() in ["true", "false", "0", "1"]):
-                            self._value = [is_true(value_in_file)]
-                            stack_info(f"converting {self._name} to list {self._value}")
-                            return
-                    if type(self._default) == float and type(value_in_file) == int:
-                        self._value = float(value_in_file)
-                        return
-                    if type(self._default) == int and type(value_in_file) == str:
-                        try:
-                            self._value = int(value_in_file)
-                            return
-                        except Exception as e:
-                            print_err(f"cannot convert {value_in_file} to int - {e}")
-                    print_err(
-                        f"got value {value_in_file} of type {type(value_in_file)} from file - discarding as type of {self._name} should be {type(self._default)}"
-                    )
-                else:
-                    if type(value_in_file) == list and self.is_bool:
-                        self._value = [is_true(v) for v in value_in_file]
-                        return
-                    self._value = value_in_file
-
+                before = self._value
+                self._pull(value_in_file)
+                # _pull always assigns a new object, so this also catches changed lists
+                if self._value != before:
+                    Env._generation += 1
                 return
 
             # When pull=True, we're only reading from file, not writing
@@ -92,9 +95,47 @@ class Env:
             if value == None or value == "None":
                 value = ""
 
-            file_values[self._name] = value
+            # store a copy of lists - otherwise the cached file values alias our _value and
+            # later list_set calls look like they are already in the file
+            file_values[self._name] = list(value) if type(value) == list else value
+            Env._dirty.add(self._name)
+            Env._generation += 1
             write_values_to_config_json(file_values, reason=f"{self._name} = {value}")
 
+    def _pull(self, value_in_file):
+        # take the value from the file, converting it to the type of the default if needed
+        if self._default != None and type(value_in_file) != type(self._default):
+            if type(self._default) == bool:
+                self._value = is_true(value_in_file)
+                return
+            if type(self._default) == list and len(self._default) > 0:
+                if type(self._default[0]) == type(value_in_file):
+                    self._value = [value_in_file]
+                    stack_info(f"converting {self._name} to list {self._value}")
+                    return
+                if type(self._default[0]) == bool and (value_in_file.lower() in ["true", "false", "0", "1"]):
+                    self._value = [is_true(value_in_file)]
+                    stack_info(f"converting {self._name} to list {self._value}")
+                    return
+            if type(self._default) == float and type(value_in_file) == int:
+                self._value = float(value_in_file)
+                return
+            if type(self._default) == int and type(value_in_file) == str:
+                try:
+                    self._value = int(value_in_file)
+                    return
+                except Exception as e:
+                    print_err(f"cannot convert {value_in_file} to int - {e}")
+            print_err(
+                f"got value {value_in_file} of type {type(value_in_file)} from file - discarding as type of {self._name} should be {type(self._default)}"
+            )
+        else:
+            if type(value_in_file) == list and self.is_bool:
+                self._value = [is_true(v) for v in value_in_file]
+                return
+            # don't alias lists in the (cached) file values
+            self._value = list(value_in_file) if type(value_in_file) == list else value_in_file
+
     def __str__(self):
         return f"Env({self._name}, {self._value})"
 
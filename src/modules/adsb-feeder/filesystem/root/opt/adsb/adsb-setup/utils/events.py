@@ -0,0 +1,84 @@
+import json
+import threading
+from typing import Any, Iterator, Optional
+
+
+class EventHub:
+    """Latest value per topic, streamed to any number of server-sent-events clients.
+
+    Producers call publish() whenever they have a value; only values that actually changed
+    bump the version, and each client is sent the topics that changed since it last looked.
+    """
+
+    def __init__(self, keepalive: float = 15.0) -> None:
+        self._cond = threading.Condition()
+        self._values: dict[str, Any] = {}
+        self._encoded: dict[str, str] = {}
+        self._versions: dict[str, int] = {}
+        self._version = 0
+        self._keepalive = keepalive
+        self._subscribers = 0
+        self._closed = False
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, topic: str) -> Any:
+        return self._values.get(topic)
+
+    def publish(self, topic: str, value: Any) -> bool:
+        """Set the value of a topic, returns True if it changed."""
+        encoded = json.dumps(value, sort_keys=True)
+        with self._cond:
+            if self._encoded.get(topic) == encoded:
+                return False
+            self._version += 1
+            self._values[topic] = value
+            self._encoded[topic] = encoded
+            self._versions[topic] = self._version
+            self._cond.notify_all()
+        return True
+
+    def changes_since(self, version: int) -> tuple[int, dict[str, Any]]:
+        """Return the current version and the topics that changed after the given version."""
+        with self._cond:
+            return self._version, {t: self._values[t] for t, v in self._versions.items() if v > version}
+
+    def wait(self, version: int, timeout: Optional[float] = None) -> bool:
+        """Wait until something was published after the given version."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._version > version or self._closed, timeout=timeout) and not self._closed
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stream(self) -> Iterator[str]:
+        """Generate the event stream for one client: everything first, then only the deltas."""
+        with self._cond:
+            self._subscribers += 1
+            self._cond.notify_all()
+        try:
+            version = 0
+            # tell the browser how long to wait before it reconnects
+            yield "retry: 5000\n\n"
+            while not self._closed:
+                version, changes = self.changes_since(version)
+                if changes:
+                    yield f"data: {json.dumps(changes)}\n\n"
+                if not self.wait(version, timeout=self._keepalive) and not self._closed:
+                    # a comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def wait_for_subscribers(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._subscribers > 0 or self._closed, timeout=timeout) and not self._closed
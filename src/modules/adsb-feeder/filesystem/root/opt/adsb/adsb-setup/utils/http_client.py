@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# nothing we talk to needs IPv6, and trying it first just adds connect delays on networks without it
+requests.packages.urllib3.util.connection.HAS_IPV6 = False  # type: ignore[attr-defined]
+
+DEFAULT_TIMEOUT = 10.0
+FAN_OUT_WORKERS = 8
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class HttpClient:
+    """One requests.Session for the whole app, so repeated requests to a host reuse its connection.
+
+    The session keeps a keep-alive pool per host (local tar1090, the microfeeders, the aggregator
+    APIs, ...), every request gets a timeout unless the caller passes one, and latency / error
+    counts are kept per host. Cookies are never stored, so requests don't influence each other,
+    just like the one-shot requests.request() calls this replaces.
+    """
+
+    def __init__(self, pool_connections: int = 16, pool_maxsize: int = FAN_OUT_WORKERS, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._stats: Dict[str, Dict] = {}
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                # the pool size per host matches the fan out, so concurrent requests don't throw away connections
+                adapter = HTTPAdapter(pool_connections=self._pool_connections, pool_maxsize=self._pool_maxsize)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        host = urlsplit(url).netloc
+        start = time.monotonic()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout if timeout is None else timeout, **kwargs)
+        except Exception as e:
+            self._record(host, time.monotonic() - start, None, e)
+            raise
+        self._record(host, time.monotonic() - start, response.status_code, None)
+        return response
+
+    def _record(self, host: str, elapsed: float, status: Optional[int], error: Optional[Exception]) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(
+                host, {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_status": None, "last_error": ""}
+            )
+            elapsed_ms = elapsed * 1000
+            entry["requests"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["last_status"] = status
+            if error is not None or (status is not None and status >= 500):
+                entry["errors"] += 1
+                entry["last_error"] = type(error).__name__ if error is not None else f"HTTP {status}"
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per host: number of requests, errors, average / max latency in ms and the last status."""
+        with self._lock:
+            stats = {host: dict(entry) for host, entry in self._stats.items()}
+        for entry in stats.values():
+            entry["avg_ms"] = round(entry["total_ms"] / entry["requests"], 1)
+            entry["max_ms"] = round(entry["max_ms"], 1)
+            del entry["total_ms"]
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+def fan_out(fn: Callable[[T], R], items: Iterable[T], max_workers: int = FAN_OUT_WORKERS) -> List[R]:
+    """fn(item) for all items at the same time, so it takes as long as the slowest, not the sum.
+
+    The results are in the order of items; fn is expected to handle its own errors.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="http-fan-out") as executor:
+        return list(executor.map(fn, items))
+
+
+http_client = HttpClient()
@@ -0,0 +1,124 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Union
+
+
+def _varint_encode(values: Iterable[int]) -> bytes:
+    out = bytearray()
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+    return bytes(out)
+
+
+def _varint_decode(data: bytes) -> Iterator[int]:
+    v = 0
+    shift = 0
+    for b in data:
+        v |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            yield v
+            v = 0
+            shift = 0
+
+
+class IcaoSet:
+    """A set of 24 bit ICAO addresses, kept as a sorted array of 4 byte integers.
+
+    Compared to a set of hex strings this needs ~4 bytes instead of ~110 bytes per
+    aircraft, and it serializes to delta-encoded varints (~2 bytes per aircraft).
+    """
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._a = array("I", sorted(set(values)))
+
+    @classmethod
+    def from_hex(cls, hexes: Iterable[str]) -> "IcaoSet":
+        """Build the set from readsb style hex strings, ignoring the non-ICAO ones (starting with ~)."""
+        values = set()
+        for h in hexes:
+            if h and not h.startswith("~"):
+                try:
+                    values.add(int(h, 16))
+                except ValueError:
+                    pass
+        return cls(values)
+
+    def add(self, value: int) -> None:
+        i = bisect_left(self._a, value)
+        if i == len(self._a) or self._a[i] != value:
+            self._a.insert(i, value)
+
+    def update(self, values: Iterable[int]) -> None:
+        """Merge-insert: a few hundred new values go in place, large batches get merged in one pass."""
+        if not isinstance(values, IcaoSet):
+            values = IcaoSet(values)
+        if len(values) < 1024:
+            for v in values:
+                self.add(v)
+        else:
+            self._a = IcaoSet.union(self, values)._a
+
+    def __ior__(self, other: Union["IcaoSet", Iterable[int]]) -> "IcaoSet":
+        self.update(other)
+        return self
+
+    def __len__(self) -> int:
+        return len(self._a)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._a)
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, int):
+            return False
+        i = bisect_left(self._a, value)
+        return i < len(self._a) and self._a[i] == value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, IcaoSet) and self._a == other._a
+
+    def __repr__(self) -> str:
+        return f"IcaoSet({len(self)} aircraft)"
+
+    def hex(self) -> list[str]:
+        return [f"{v:06x}" for v in self._a]
+
+    @property
+    def nbytes(self) -> int:
+        return self._a.itemsize * len(self._a)
+
+    @staticmethod
+    def union(*sets: "IcaoSet") -> "IcaoSet":
+        """Union of any number of sets in a single merge pass."""
+        result = IcaoSet()
+        out = result._a
+        last = -1
+        for v in heapq.merge(*(s._a for s in sets)):
+            if v != last:
+                out.append(v)
+                last = v
+        return result
+
+    def to_bytes(self) -> bytes:
+        """Delta-encode the sorted addresses as varints."""
+        prev = 0
+        deltas = []
+        for v in self._a:
+            deltas.append(v - prev)
+            prev = v
+        return _varint_encode(deltas)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IcaoSet":
+        result = cls()
+        total = 0
+        for delta in _varint_decode(data):
+            total += delta
+            result._a.append(total)
+        return result
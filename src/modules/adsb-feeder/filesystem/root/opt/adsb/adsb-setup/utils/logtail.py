@@ -0,0 +1,220 @@
+# this module is also used by waiting-app.py, so it only depends on the standard library
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterator, List, Optional, Tuple
+
+ANSI_ESCAPE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVE_SELF = 0x800
+IN_DELETE_SELF = 0x400
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class Inotify:
+    """Just enough of inotify to wait for changes to one file."""
+
+    def __init__(self, path: str) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout: float) -> Tuple[bool, bool]:
+        """Wait for events, returns (something happened, the file was moved or deleted)."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False, False
+        gone = False
+        try:
+            buf = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return False, False
+        offset = 0
+        while offset + 16 <= len(buf):
+            _, mask, _, name_len = struct.unpack_from("iIII", buf, offset)
+            gone = gone or bool(mask & (IN_MOVE_SELF | IN_DELETE_SELF))
+            offset += 16 + name_len
+        return True, gone
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class LogFollower:
+    """Follow a log file for any number of server-sent-events clients.
+
+    One thread reads what gets appended to the file (woken up by inotify, or polling if that isn't
+    available) and keeps the last max_lines lines, with the ANSI escapes stripped, in a ring buffer.
+    Every line gets an increasing id that is sent as the SSE event id, so a client that reconnects
+    with Last-Event-ID only gets what it missed. The thread only runs while somebody is listening.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_lines: int = 2000,
+        tail_bytes: int = 16 * 1024,
+        poll: float = 0.2,
+        keepalive: float = 15.0,
+    ) -> None:
+        self.path = path
+        self._tail_bytes = tail_bytes
+        self._poll = poll
+        self._keepalive = keepalive
+        self._cond = threading.Condition()
+        self._lines: deque = deque(maxlen=max_lines)
+        self._next_id = 1
+        self._subscribers = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        # where we are in which file, so a restarted follower thread continues where it left off
+        self._read_lock = threading.Lock()
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._partial = b""
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def lines_since(self, last_id: Optional[int]) -> List[Tuple[int, str]]:
+        """The buffered lines after last_id."""
+        with self._cond:
+            # unknown ids (too old, or from before a restart) get everything we have
+            if last_id is None or not self._lines or not self._lines[0][0] - 1 <= last_id < self._next_id:
+                return list(self._lines)
+            return [entry for entry in self._lines if entry[0] > last_id]
+
+    def read(self) -> int:
+        """Read whatever was added to the file since the last call, returns the number of new lines."""
+        with self._read_lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return 0
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # first time, new file or truncated: only look at the tail, not the whole file
+                start = max(0, st.st_size - self._tail_bytes) if self._inode is None else 0
+                self._inode = st.st_ino
+                self._offset = start
+                self._partial = b""
+                skip_partial_line = start > 0
+            else:
+                skip_partial_line = False
+            if st.st_size == self._offset:
+                return 0
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(st.st_size - self._offset)
+            self._offset += len(data)
+            data = self._partial + data
+            if skip_partial_line:
+                data = data.partition(b"\n")[2]
+            if b"\n" not in data:
+                self._partial = data
+                return 0
+            block, _, self._partial = data.rpartition(b"\n")
+            lines = ANSI_ESCAPE.sub("", block.decode(errors="replace")).split("\n")
+        with self._cond:
+            for line in lines:
+                self._lines.append((self._next_id, line))
+                self._next_id += 1
+            self._cond.notify_all()
+        return len(lines)
+
+    def _follow(self) -> None:
+        inotify: Optional[Inotify] = None
+        while True:
+            with self._cond:
+                if self._subscribers == 0:
+                    self._thread = None
+                    break
+            if inotify is None:
+                try:
+                    inotify = Inotify(self.path)
+                except (OSError, AttributeError):
+                    inotify = None
+            self.read()
+            if inotify:
+                _, gone = inotify.wait(1.0)
+                if gone:
+                    # log rotated - watch the new file once it's there
+                    inotify.close()
+                    inotify = None
+                    self.read()
+            else:
+                with self._cond:
+                    self._cond.wait(self._poll)
+        if inotify:
+            inotify.close()
+
+    def _subscribe(self) -> None:
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._follow, name="log-follower", daemon=True)
+                self._thread.start()
+
+    def _unsubscribe(self) -> None:
+        with self._cond:
+            self._subscribers -= 1
+
+    def close(self) -> None:
+        """End all the streams, e.g. when shutting down."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stream(self, last_id: Optional[int] = None, keep_going: Callable[[], bool] = lambda: True) -> Iterator[str]:
+        """Generate the event stream for one client, for as long as keep_going() says so."""
+        self._subscribe()
+        try:
+            # make sure a new client gets what's in the file right now, not just the next change
+            self.read()
+            yield "retry: 2000\n\n"
+            last_sent = time.monotonic()
+            while True:
+                lines = self.lines_since(last_id)
+                if lines:
+                    last_id = lines[-1][0]
+                    data = "".join(f"data: {line}\n" for _, line in lines)
+                    yield f"id: {last_id}\n{data}\n"
+                    last_sent = time.monotonic()
+                if not keep_going() or self._closed:
+                    return
+                with self._cond:
+                    if self.last_id == (last_id or 0) and not self._closed:
+                        self._cond.wait(1.0)
+                if time.monotonic() - last_sent > self._keepalive:
+                    # a comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            self._unsubscribe()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
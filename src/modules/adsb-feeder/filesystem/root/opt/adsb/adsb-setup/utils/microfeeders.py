@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .http_client import fan_out
+from .util import conditional_get_json, print_err
+
+# older images serve the webinterface on 1099 when port 80 is taken
+FALLBACK_PORT = "1099"
+
+
+class MicroPoller:
+    """Get /api/base_info from all the microfeeders of a stage2 at the same time.
+
+    A full pass takes about as long as the slowest microfeeder instead of the sum of all of them.
+    The port a microfeeder answered on is tried first next time, and a microfeeder that doesn't
+    answer is skipped for exponentially longer (up to max_backoff seconds) until it comes back.
+    The last base_info of every microfeeder is kept with its ETag, so as long as nothing changed
+    a poll is answered with an empty 304 and there is nothing to parse or compare.
+    """
+
+    def __init__(self, timeout: float = 2.0, base_backoff: float = 30.0, max_backoff: float = 1800.0):
+        self.timeout = timeout
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._ports: Dict[str, str] = {}
+        self._failures: Dict[str, int] = {}
+        self._next_try: Dict[str, float] = {}
+        # "ip:port" -> (ETag, base_info)
+        self._cache: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+
+    def candidate_ports(self, ip: str, port: str) -> List[str]:
+        # same fallback as before: only a microfeeder configured for port 80 may be on 1099 instead
+        ports = [port, FALLBACK_PORT] if port == "80" else [port]
+        with self._lock:
+            known = self._ports.get(ip)
+        if known in ports:
+            ports.remove(known)
+            ports.insert(0, known)
+        return ports
+
+    def backing_off(self, ip: str) -> bool:
+        with self._lock:
+            return time.monotonic() < self._next_try.get(ip, 0.0)
+
+    def fetch(self, ip: str, port: str, force: bool = False) -> Tuple[Optional[Dict[str, Any]], str, bool]:
+        """The base_info of one microfeeder (None if it didn't answer), the port it answered on and
+        whether the base_info changed since the last time.
+
+        Without force, a microfeeder that is in its back off period isn't contacted at all.
+        """
+        if not force and self.backing_off(ip):
+            print_err(f"skipping base_info from {ip}, it hasn't answered recently", level=8)
+            return None, port, False
+        for candidate in self.candidate_ports(ip, port):
+            key = f"{ip}:{candidate}"
+            with self._lock:
+                etag, cached = self._cache.get(key, (None, None))
+            base_info, status, new_etag = conditional_get_json(
+                f"http://{key}/api/base_info", etag=etag if cached else None, timeout=self.timeout
+            )
+            if status == 304 and cached is not None:
+                base_info = cached
+            elif status != 200 or base_info is None:
+                continue
+            changed = base_info != cached
+            with self._lock:
+                self._cache[key] = (new_etag, base_info)
+                self._ports[ip] = candidate
+                self._failures.pop(ip, None)
+                self._next_try.pop(ip, None)
+            return base_info, candidate, changed
+        with self._lock:
+            failures = self._failures.get(ip, 0) + 1
+            self._failures[ip] = failures
+            delay = min(self._base_backoff * 2 ** (failures - 1), self._max_backoff)
+            self._next_try[ip] = time.monotonic() + delay
+        print_err(f"no base_info from {ip} ({failures} failures in a row), next try in {delay:.0f}s")
+        return None, port, False
+
+    def poll(self, targets: List[Tuple[int, str, str]]) -> Dict[int, Tuple[Optional[Dict[str, Any]], str, bool]]:
+        """Fetch the base_info for (index, ip, port) targets concurrently, returns {index: (base_info, port, changed)}."""
+        results = fan_out(lambda target: self.fetch(target[1], target[2]), targets)
+        return {target[0]: result for target, result in zip(targets, results)}
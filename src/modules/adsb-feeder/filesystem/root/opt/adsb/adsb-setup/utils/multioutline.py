@@ -1,13 +1,18 @@
 import hashlib
 import json
-import re
+import multiprocessing
+import os
 import traceback
-from typing import Dict, List
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Dict, List, Optional
 
 from shapely.geometry import LinearRing, Polygon
 from shapely.ops import unary_union
 
-from utils.paths import ENV_FILE
+from utils.config import read_values_from_env_file
+from utils.http_client import fan_out
 from utils.util import get_plain_url, make_int, print_err
 
 old_shapely = False
@@ -39,7 +44,18 @@ def check_valid(p):
         return False, "see backtrace above"
 
 
+MULTIOUTLINE_JSON = "/run/adsb-feeder-ultrafeeder/readsb/multiOutline.json"
+
+
+def _create_ring(data, alt):
+    # runs in a worker process - needs to be a module level function so it can be pickled
+    return alt, MultiOutline().create(data, hwt_alt=alt, with_hash=False).get("multiRange", [])
+
+
 class MultiOutline:
+    def __init__(self):
+        self._env: Optional[Dict[str, str]] = None
+
     def _get_outlines(self, num):
         data = []
         for i in range(1, num + 1):
@@ -51,40 +67,68 @@ class MultiOutline:
                 data.append(outline)
         return data
 
+    def _read_env(self) -> Dict[str, str]:
+        # parse the .env file once per instance instead of regex scanning it for every value we need
+        if self._env is None:
+            self._env = read_values_from_env_file()
+        return self._env
+
     def _tar1090port(self):
-        tar1090port = "8080"
-        with open(ENV_FILE, "r") as env:
-            for line in env:
-                match = re.search(r"AF_TAR1090_PORT=(\d+)", line)
-                if match:
-                    tar1090port = match.group(1)
-                    break
-        return tar1090port
+        port = self._read_env().get("AF_TAR1090_PORT", "")
+        return port if port.isdigit() else "8080"
+
+    def _fetch(self, url):
+        response, status = get_plain_url(url)
+        if status != 200:
+            print_err(f"_get_heywhatsthat: http status {status} for {url}")
+            return None
+        if not response:
+            print_err(f"_get_heywhatsthat: no response for {url}")
+            return None
+        return response
 
     def _get_heywhatsthat(self, num):
-        responses = []
-        hwt_feeders = []
-        with open("/opt/adsb/config/.env", "r") as env:
-            for line in env:
-                match = re.search(r"_ADSBIM_HEYWHATSTHAT_ENABLED_(\d+)=True", line)
-                if match:
-                    hwt_feeders.append(make_int(match.group(1)))
-
-        for i in hwt_feeders:
-            hwt_url = f"http://127.0.0.1:{self._tar1090port()}/{i}/upintheair.json"
-            response, status = get_plain_url(hwt_url)
-            if status != 200:
-                print_err(f"_get_heywhatsthat: http status {status} for {hwt_url}")
-                continue
-            if not response:
-                print_err(f"_get_heywhatsthat: no response for {hwt_url}")
-                continue
-            responses.append(response)
-
-        return responses
+        env = self._read_env()
+        prefix = "_ADSBIM_HEYWHATSTHAT_ENABLED_"
+        hwt_feeders = [make_int(key[len(prefix) :]) for key, value in env.items() if key.startswith(prefix) and value == "True"]
+        if not hwt_feeders:
+            return []
+
+        port = self._tar1090port()
+        urls = [f"http://127.0.0.1:{port}/{i}/upintheair.json" for i in hwt_feeders]
+        # all sites are served by the same local tar1090, so the shared client's keep-alive pool covers them all;
+        # fan_out keeps the site order, which the combined hash depends on
+        responses = fan_out(self._fetch, urls)
+
+        return [r for r in responses if r]
+
+    def _create_rings(self, data, alts):
+        # each altitude ring is independent, so on multi core boxes they are merged in parallel;
+        # use fork explicitly so the workers don't re-import the calling script
+        workers = min(len(alts), os.cpu_count() or 1)
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+                    return dict(executor.map(_create_ring, [data] * len(alts), alts))
+            except Exception:
+                print_err(f"multioutline: parallel ring merge failed, falling back to serial: {traceback.format_exc()}")
+        return dict(_create_ring(data, alt) for alt in alts)
 
     def create_outline(self, num):
         data = self._get_outlines(num)
+
+        # the outlines only change every now and then - skip building and merging the polygons
+        # if the inputs are the same
+        newHash = self.outline_hash(data)
+        oldHash = ""
+        try:
+            with open(MULTIOUTLINE_JSON) as f:
+                oldHash = json.load(f).get("multioutline_hash", "")
+        except Exception:
+            pass
+        if oldHash == newHash:
+            print_err("no need to regenerate multioutline, already current", level=8)
+            return None
         return self.create(data)
 
     def create_heywhatsthat(self, num):
@@ -137,84 +181,96 @@ class MultiOutline:
             "multioutline_hash": newHash,
         }
         if len(data) > 0:
-            for idx in range(len(data[0]["rings"])):
-                alt = data[0]["rings"][idx]["alt"]
-                multi_range = self.create(data, hwt_alt=alt).get("multiRange")
-                for i in range(len(multi_range)):
-                    result["rings"].append({"points": multi_range[i], "alt": alt})
+            alts = [ring["alt"] for ring in data[0]["rings"]]
+            multi_ranges = self._create_rings(data, alts)
+            for alt in alts:
+                for points in multi_ranges[alt]:
+                    result["rings"].append({"points": points, "alt": alt})
         return result
 
-    def create(self, data, hwt_alt=0):
+    def _points(self, d, i, hwt_alt):
+        if hwt_alt == 0:
+            if d.get("actualRange"):
+                return d["actualRange"]["last24h"]["points"]
+            print_err(f"multioutline: can't get points from outline #{i}: {d}")
+            return []
+        matching_rings = [r["points"] for r in d["rings"] if r["alt"] == hwt_alt]  # was [..][0]; IndexError if no match
+        if not matching_rings:
+            print_err(f"multioutline: no ring matching alt {hwt_alt} in outline #{i}")
+            return []
+        return matching_rings[0]
+
+    @staticmethod
+    def _points_key(points) -> str:
+        try:
+            return hashlib.md5(array("d", chain.from_iterable(points)).tobytes()).hexdigest()
+        except TypeError:
+            return hashlib.md5(json.dumps(points).encode()).hexdigest()
+
+    def outline_hash(self, data, hwt_alt=0) -> str:
+        """The multioutline_hash of the outlines, from the raw points - without building any polygons."""
+        keys = [self._points_key(self._points(data[i], i, hwt_alt)) for i in range(len(data))]
+        return hashlib.md5("".join(keys).encode()).hexdigest()
+
+    def _polygon(self, points, i):
+        # push_multioutline.py is a new process every time, so there's nothing to cache the polygons in;
+        # outline_hash lets unchanged inputs skip building them at all
+        polygon = None
+        if len(points) > 2:
+            try:
+                p = Polygon(shell=LinearRing(points))
+                valid, reason = check_valid(p)
+                if valid:
+                    polygon = p
+                else:
+                    print_err(f"multioutline: can't create polygon from outline #{i} - {reason}")
+            except Exception:
+                print_err(traceback.format_exc())
+                print_err(f"multioutline: can't create linear ring from outline #{i} - maybe there is no data, yet?")
+        return polygon
+
+    def _merge(self, polygons: List[Polygon], hwt_alt) -> List[Polygon]:
+        # cheap bounding box prefilter: outlines that don't even come close to any other one pass through as is
+        bounds = [p.bounds for p in polygons]
+        overlapping: set[int] = set()
+        for i in range(len(polygons)):
+            for j in range(i + 1, len(polygons)):
+                a, b = bounds[i], bounds[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    overlapping.update((i, j))
+        merged = [polygons[i] for i in range(len(polygons)) if i not in overlapping]
+        if not overlapping:
+            return merged
+        to_union = [polygons[i] for i in sorted(overlapping)]
+        try:
+            union = unary_union(to_union)
+        except Exception as e:
+            print_err(traceback.format_exc())
+            print_err(f"multioutline: exception {e} while combining {len(to_union)} polygons for hwt_alt={hwt_alt}, retrying")
+            try:
+                union = unary_union([p.buffer(0.0001) for p in to_union])
+            except Exception:
+                print_err(traceback.format_exc())
+                return merged + to_union
+        # overlapping outlines become one polygon, the rest stay separate
+        merged += [g for g in getattr(union, "geoms", [union]) if isinstance(g, Polygon)]
+        return merged
+
+    def create(self, data, hwt_alt=0, with_hash=True):
         # print_err(f"multioutline: called create with for data with len {len(data)}")
         result: Dict = {"multiRange": []}
         polygons: List[Polygon] = []
         for i in range(len(data)):
-            d = data[i]
-            if hwt_alt == 0:
-                if d.get("actualRange"):
-                    points = d["actualRange"]["last24h"]["points"]
-                else:
-                    print_err(f"multioutline: can't get points from outline #{i}: {d}")
-                    points = []
-            else:
-                matching_rings = [r["points"] for r in d["rings"] if r["alt"] == hwt_alt]  # was [..][0]; IndexError if no match
-                if not matching_rings:
-                    print_err(f"multioutline: no ring matching alt {hwt_alt} in outline #{i}")
-                    points = []
-                else:
-                    points = matching_rings[0]
-            if len(points) > 2:
-                try:
-                    p = Polygon(shell=LinearRing(points))
-                    valid, reason = check_valid(p)
-                    if valid:
-                        polygons.append(p)
-                    else:
-                        print_err(f"multioutline: can't create polygon from outline #{i} - {reason}")
-                except Exception:
-                    print_err(traceback.format_exc())
-                    print_err(f"multioutline: can't create linear ring from outline #{i} - maybe there is no data, yet?")
-
-        if len(polygons) == 0:
-            return result
-        made_change = True
-        look_at: List[int] = list(range(1, len(polygons)))
-        to_consider = [0]
-        while made_change:
-            made_change = False
-            to_consider = [0]
-            for i in look_at:
-                combined = False
-                if not polygons[i].is_valid:
-                    polygons[i] = polygons[i].buffer(0.0001)
-                    valid, reason = check_valid(polygons[i])
-                    print_err(f"multioutline: polygons[{i}]: {reason}")
-                for j in to_consider:
-                    if not polygons[j].is_valid:
-                        polygons[j] = polygons[j].buffer(0.0001)
-                        valid, reason = check_valid(polygons[j])
-                        print_err(f"multioutline: polygons[{j}]: {reason}")
-                    try:
-                        if not polygons[j].disjoint(polygons[i]):
-                            poly_union = unary_union([polygons[j], polygons[i]])
-                            if isinstance(poly_union, Polygon):
-                                polygons[j] = poly_union
-                            else:
-                                print_err(
-                                    f"unary_union of {[polygons[j], polygons[i]]} which we know to not be disjoint isn't a Polygon {poly_union}"
-                                )
-                            made_change = True
-                            combined = True
-                    except Exception as e:
-                        print_err(traceback.format_exc())
-                        print_err(f"multioutline: exception {e} while combining polygons #{j} and #{i} for hwt_alt={hwt_alt}")
-                        pass
-                if not combined:
-                    to_consider.append(i)
-            look_at = to_consider[1:]
-        for i in to_consider:
+            p = self._polygon(self._points(data[i], i, hwt_alt), i)
+            if p is not None:
+                polygons.append(p)
+        # the heywhatsthat rings are hashed as a whole by create_heywhatsthat, nothing reads a per ring hash
+        if with_hash:
+            result["multioutline_hash"] = self.outline_hash(data, hwt_alt)
+
+        for i, polygon in enumerate(self._merge(polygons, hwt_alt) if polygons else []):
             try:
-                coords = polygons[i].exterior.coords
+                coords = polygon.exterior.coords
                 if len(coords[0]) == 3:
                     points = [[round(x, 4), round(y, 4)] for x, y, a in coords]
                 else:
@@ -87,6 +87,11 @@ class PathConfig:
         """System file, not configurable."""
         return Path("/etc/machine-id")
 
+    @property
+    def DOCKER_SOCKET(self) -> Path:
+        """System file, not configurable."""
+        return Path("/var/run/docker.sock")
+
     @property
     def SECURE_IMAGE_FILE(self) -> Path:
         return self.ADSB_BASE_DIR / "adsb.im.secure_image"
@@ -167,6 +172,10 @@ class PathConfig:
     def DOCKER_COMPOSE_START_SCRIPT(self) -> Path:
         return self.ADSB_BASE_DIR / "docker-compose-start"
 
+    @property
+    def DEFAULT_DOCKER_COMPOSE_FILE(self) -> Path:
+        return self.ADSB_BASE_DIR / "default.docker-compose"
+
     # Log files
     @property
     def NETDOG_LOG_FILE(self) -> Path:
@@ -221,11 +230,23 @@ class PathConfig:
     def COMPOSE_UP_FAILED_STATE(self) -> Path:
         return self.ADSB_BASE_DIR / "state" / "compose_up_failed"
 
+    @property
+    def BACKUP_MANIFEST_FILE(self) -> Path:
+        return self.ADSB_BASE_DIR / "state" / "backup_manifest.json"
+
     # Data files
     @property
     def PLANES_SEEN_PER_DAY_FILE(self) -> Path:
         return self.ADSB_BASE_DIR / "adsb_planes_seen_per_day.json.gz"
 
+    @property
+    def STATS_DB_FILE(self) -> Path:
+        return self.ADSB_CONFIG_DIR / "stats.db"
+
+    @property
+    def AIRPORTS_FILE(self) -> Path:
+        return self.ADSB_DATA_DIR / "airports.csv"
+
     # Fake files for testing/simulation
     @property
     def FAKE_CPUINFO_DIR(self) -> Path:
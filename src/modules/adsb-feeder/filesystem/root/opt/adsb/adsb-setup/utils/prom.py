@@ -0,0 +1,76 @@
+import os
+import re
+import threading
+from typing import Optional
+
+from .util import print_err
+
+_label = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class PromSnapshot:
+    """The metrics in a Prometheus text file (like readsb's stats.prom), parsed once per change of the file."""
+
+    _cache: dict[str, tuple[tuple, "PromSnapshot"]] = {}
+    _cache_lock = threading.Lock()
+    parses = 0
+
+    def __init__(self, text: str) -> None:
+        # metric name -> list of (labels, value), in the order they appear in the file
+        self.metrics: dict[str, list[tuple[dict[str, str], float]]] = {}
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            labels: dict[str, str] = {}
+            if "{" in line:
+                name, rest = line.split("{", 1)
+                label_str, _, rest = rest.rpartition("}")
+                labels = dict(_label.findall(label_str))
+            else:
+                name, _, rest = line.partition(" ")
+            fields = rest.split()
+            if not fields:
+                continue
+            try:
+                value = float(fields[0])
+            except ValueError:
+                continue
+            self.metrics.setdefault(name.strip(), []).append((labels, value))
+
+    @classmethod
+    def get(cls, path: str) -> Optional["PromSnapshot"]:
+        """Return the parsed file, or None if it doesn't exist."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with cls._cache_lock:
+            cached = cls._cache.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+        try:
+            with open(path) as f:
+                snapshot = cls(f.read())
+        except OSError as e:
+            print_err(f"failed to read {path}: {e}")
+            return None
+        with cls._cache_lock:
+            cls._cache[path] = (key, snapshot)
+            cls.parses += 1
+        return snapshot
+
+    def value(self, name: str, **labels: str) -> Optional[float]:
+        """Value of the first sample of this metric that has (at least) the given labels."""
+        for sample_labels, value in self.metrics.get(name, []):
+            if all(sample_labels.get(k) == v for k, v in labels.items()):
+                return value
+        return None
+
+    def find(self, fragment: str) -> Optional[float]:
+        """Value of the first metric whose name contains the fragment."""
+        for name, samples in self.metrics.items():
+            if fragment in name and samples:
+                return samples[0][1]
+        return None
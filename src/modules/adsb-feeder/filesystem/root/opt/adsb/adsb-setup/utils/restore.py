@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from pathlib import Path
+from typing import IO, BinaryIO, Dict, List, Optional
+
+from .backup import MANIFEST_NAME
+from .util import print_err
+
+CHUNK_SIZE = 256 * 1024
+
+# the zip local file header: signature, versions, flags, compression, time, date, crc, sizes,
+# file name length and extra field length, followed by the name, the extra field and the data
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_NAME_LENGTH = 10
+LOCAL_HEADER_EXTRA_LENGTH = 11
+
+
+def allowed_member(name: str) -> bool:
+    # only accept the .env file and config.json and files for ultrafeeder
+    return name in (".env", "config.json") or name.startswith("ultrafeeder/")
+
+
+class RestoreError(Exception):
+    pass
+
+
+class RestoreEngine:
+    """Receive a backup upload and restore members from it without an intermediate extracted copy.
+
+    The upload is written to disk once and hashed on the way in. After that the member index comes
+    from the zip's central directory, and selected members are copied straight to their final place;
+    stored members (which is what our backups use for the big, already compressed files) are copied
+    by the kernel with copy_file_range / sendfile, deflated ones are inflated. Either way the
+    result is checked against the CRC from the zip and the sha256 from the backup manifest, if
+    there is one.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._members: Optional[Dict[str, zipfile.ZipInfo]] = None
+        self._manifest: Optional[Dict] = None
+        self._progress: Dict = {
+            "state": "idle",
+            "phase": "",
+            "bytes_done": 0,
+            "bytes_total": 0,
+            "current": "",
+            "sha256": "",
+            "started": time.time(),
+            "finished": None,
+        }
+
+    def progress(self) -> Dict:
+        with self._lock:
+            progress = dict(self._progress)
+        progress["elapsed"] = round((progress["finished"] or time.time()) - progress["started"], 1)
+        return progress
+
+    def _update(self, **kwargs) -> None:
+        with self._lock:
+            self._progress.update(kwargs)
+
+    def _advance(self, n: int) -> None:
+        with self._lock:
+            self._progress["bytes_done"] += n
+
+    def receive(self, stream: IO[bytes], chunk: bytes, boundary: bytes, content_length: int = 0) -> str:
+        """Write the file part of a multipart upload to self.path, return its sha256.
+
+        chunk is whatever of the file data was read together with the part header; the closing
+        boundary is held back and not written to the file.
+        """
+        self._update(state="running", phase="upload", bytes_done=len(chunk), bytes_total=content_length, started=time.time())
+        trailer = b"\r\n--" + boundary
+        sha256 = hashlib.sha256()
+        size = 0
+        pending = chunk
+        with open(self.path, "wb") as f:
+            while True:
+                data = stream.read(CHUNK_SIZE)
+                if not data:
+                    break
+                self._advance(len(data))
+                pending += data
+                # keep enough back that the closing boundary can't be split between two writes
+                keep = len(trailer) + 8
+                if len(pending) > keep:
+                    out, pending = pending[:-keep], pending[-keep:]
+                    sha256.update(out)
+                    f.write(out)
+                    size += len(out)
+            end = pending.rfind(trailer)
+            if end != -1:
+                pending = pending[:end]
+            sha256.update(pending)
+            f.write(pending)
+            size += len(pending)
+        digest = sha256.hexdigest()
+        self._update(state="received", phase="", sha256=digest, finished=time.time())
+        print_err(f"Restore: received {size} bytes, sha256 {digest}")
+        return digest
+
+    def members(self) -> Dict[str, zipfile.ZipInfo]:
+        """The acceptable members of the archive, from its central directory."""
+        if self._members is None:
+            members: Dict[str, zipfile.ZipInfo] = {}
+            with zipfile.ZipFile(self.path) as restore_zip:
+                for info in restore_zip.infolist():
+                    name = info.filename
+                    # remove files with a name that results in a path that doesn't leave the config directory
+                    if name.startswith("/") or ".." in Path(name).parts:
+                        print_err(f"restore skipped for path breakout name: {name}")
+                        continue
+                    if name == MANIFEST_NAME:
+                        try:
+                            self._manifest = json.loads(restore_zip.read(info))
+                        except Exception as e:
+                            print_err(f"restore: ignoring unreadable backup manifest: {e}")
+                        continue
+                    if not allowed_member(name) or info.is_dir():
+                        continue
+                    members[name] = info
+            self._members = members
+        return self._members
+
+    @property
+    def manifest(self) -> Optional[Dict]:
+        self.members()
+        return self._manifest
+
+    @property
+    def incremental(self) -> bool:
+        return bool(self.manifest and self.manifest.get("incremental"))
+
+    def check_manifest(self) -> List[str]:
+        """Names of files the manifest says were backed up but are missing or have the wrong size."""
+        if not self.manifest:
+            return []
+        members = self.members()
+        problems = []
+        for name, entry in self.manifest.get("files", {}).items():
+            if not entry.get("included", True) or not allowed_member(name):
+                continue
+            info = members.get(name)
+            if info is None or info.file_size != entry.get("size"):
+                problems.append(name)
+        return problems
+
+    def read(self, name: str) -> bytes:
+        with zipfile.ZipFile(self.path) as restore_zip:
+            return restore_zip.read(self.members()[name])
+
+    def differs(self, name: str, path: Path) -> bool:
+        """Is the member different from the file at path? Doesn't extract anything."""
+        info = self.members()[name]
+        try:
+            if path.stat().st_size != info.file_size:
+                return True
+            return path.read_bytes() != self.read(name)
+        except OSError:
+            return True
+
+    def names(self, prefix: str) -> List[str]:
+        return [name for name in self.members() if name.startswith(prefix)]
+
+    def restore_dir(self, prefix: str, dest_root: Path) -> None:
+        """Replace the directory prefix under dest_root with the members below it.
+
+        An incremental backup leaves out the files that didn't change since its base, those only
+        exist on disk - so for one of those the directory is kept and only the included files are
+        overwritten.
+        """
+        if not self.incremental:
+            shutil.rmtree(dest_root / prefix, ignore_errors=True)
+        self.extract(self.names(prefix), dest_root)
+
+    def extract(self, names: List[str], dest_root: Path) -> None:
+        """Extract the members to their place under dest_root."""
+        members = self.members()
+        expected = (self.manifest or {}).get("files", {})
+        self._update(
+            state="running",
+            phase="extract",
+            bytes_done=0,
+            bytes_total=sum(members[n].file_size for n in names),
+            started=time.time(),
+            finished=None,
+        )
+        try:
+            with open(self.path, "rb") as src:
+                with zipfile.ZipFile(src) as restore_zip:
+                    for name in names:
+                        self._update(current=name)
+                        dest = dest_root / name
+                        dest.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+                        info = members[name]
+                        if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+                            self._copy_stored(src, info, dest, expected.get(name, {}).get("sha256"))
+                        else:
+                            self._copy_inflated(restore_zip, info, dest, expected.get(name, {}).get("sha256"))
+                        mtime = time.mktime(info.date_time + (0, 0, -1))
+                        os.utime(dest, (mtime, mtime))
+        except Exception:
+            self._update(state="failed", finished=time.time())
+            raise
+        self._update(state="done", current="", finished=time.time())
+
+    def _data_offset(self, src: BinaryIO, info: zipfile.ZipInfo) -> int:
+        src.seek(info.header_offset)
+        raw = src.read(LOCAL_HEADER.size)
+        if len(raw) != LOCAL_HEADER.size:
+            raise RestoreError(f"bad local header for {info.filename}")
+        header = LOCAL_HEADER.unpack(raw)
+        if header[0] != LOCAL_HEADER_SIGNATURE:
+            raise RestoreError(f"bad local header for {info.filename}")
+        return info.header_offset + LOCAL_HEADER.size + header[LOCAL_HEADER_NAME_LENGTH] + header[LOCAL_HEADER_EXTRA_LENGTH]
+
+    def _copy_stored(self, src: BinaryIO, info: zipfile.ZipInfo, dest: Path, sha256: Optional[str]) -> None:
+        # the member is a plain byte range of the archive - let the kernel copy it
+        offset = self._data_offset(src, info)
+        remaining = info.file_size
+        with open(dest, "wb") as dst:
+            in_fd, out_fd = src.fileno(), dst.fileno()
+            for copy in (self._copy_file_range, self._sendfile, self._pread_write):
+                try:
+                    while remaining > 0:
+                        n = copy(in_fd, out_fd, offset, remaining)
+                        if n == 0:
+                            break
+                        offset += n
+                        remaining -= n
+                        self._advance(n)
+                    break
+                except OSError:
+                    # not supported for this combination of file systems, try the next way
+                    continue
+        if remaining != 0:
+            raise RestoreError(f"{info.filename} is truncated in the archive")
+        # the kernel copy never went through our hands, so read the result back (from the page cache) to check it
+        crc = 0
+        digest = hashlib.sha256()
+        with open(dest, "rb") as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                crc = zlib.crc32(data, crc)
+                if sha256:
+                    digest.update(data)
+        if crc != info.CRC:
+            raise RestoreError(f"{info.filename} doesn't match its CRC in the archive")
+        if sha256 and digest.hexdigest() != sha256:
+            raise RestoreError(f"{info.filename} doesn't match the sha256 in the backup manifest")
+
+    @staticmethod
+    def _copy_file_range(in_fd: int, out_fd: int, offset: int, count: int) -> int:
+        return os.copy_file_range(in_fd, out_fd, min(count, 1 << 30), offset)
+
+    @staticmethod
+    def _sendfile(in_fd: int, out_fd: int, offset: int, count: int) -> int:
+        return os.sendfile(out_fd, in_fd, offset, min(count, 1 << 30))
+
+    @staticmethod
+    def _pread_write(in_fd: int, out_fd: int, offset: int, count: int) -> int:
+        data = os.pread(in_fd, min(count, CHUNK_SIZE), offset)
+        os.write(out_fd, data)
+        return len(data)
+
+    def _copy_inflated(self, restore_zip: zipfile.ZipFile, info: zipfile.ZipInfo, dest: Path, sha256: Optional[str]) -> None:
+        # zipfile checks the CRC when the member has been read completely, the manifest hash comes on top
+        digest = hashlib.sha256()
+        with restore_zip.open(info) as member, open(dest, "wb") as dst:
+            while True:
+                data = member.read(CHUNK_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                dst.write(data)
+                self._advance(len(data))
+        if sha256 and digest.hexdigest() != sha256:
+            raise RestoreError(f"{info.filename} doesn't match the sha256 in the backup manifest")
@@ -0,0 +1,195 @@
+import json
+import re
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+# config.json values that must not show up in the diagnostics, replaced by their name
+SANITIZE_VARS = [
+    "FEEDER_LAT",
+    "FEEDER_LONG",
+    "MLAT_SITE_NAME",
+    "MLAT_SITE_NAME_SANITIZED",
+    "ADSBLOL_UUID",
+    "AF_MICRO_IP",
+    "ULTRAFEEDER_UUID",
+    "FEEDER_1090UK_API_KEY",
+    "ADSBLOL_LINK",
+    "_ADSBIM_STATE_ALIVE_MAP_LINK",
+    "_ADSBIM_STATE_ADSBX_FEEDER_ID",
+    "FEEDER_ADSBHUB_STATION_KEY",
+    "FEEDER_FR24_SHARING_KEY",
+    "FEEDER_FR24_UAT_SHARING_KEY",
+    "FEEDER_PLANEWATCH_API_KEY",
+    "FEEDER_RADARBOX_SHARING_KEY",
+    "FEEDER_RV_FEEDER_KEY",
+    "FEEDER_PIAWARE_FEEDER_ID",
+    "FEEDER_RADARBOX_SN",
+    "_ADSBIM_STATE_FEEDER_RADARBOX_SN_KEY",
+    "FEEDER_PLANEFINDER_SHARECODE",
+    "FEEDER_OPENSKY_USERNAME",
+    "FEEDER_OPENSKY_SERIAL",
+    "FEEDER_HEYWHATSTHAT_ID",
+    "_ADSBIM_STATE_ZEROTIER_KEY",
+    "_ADSBIM_STATE_TAILSCALE_LOGIN_LINK",
+    "_ADSBIM_STATE_TAILSCALE_NAME",
+    "FEEDER_SM_USERNAME",
+    "FEEDER_SM_PASSWORD",
+    "SKYSTATS_DB_PASSWORD",
+]
+
+# patterns that are replaced before the secrets, in this order (these used to be perl -pe expressions)
+RULES: List[Tuple[bytes, bytes]] = [
+    # replace --lat --lon arguments mainly from piaware log
+    (rb"--lat.[^ \n]*", b"--lat <redacted>"),
+    (rb"--lon.[^ \n]*", b"--lon <redacted>"),
+    # remove FA name from piaware log
+    (rb"flightaware\.com/adsb/stats/user.*", b"flightaware.com/adsb/stats/user/<redacted>"),
+    (rb"FlightAware as user .*", b"FlightAware as user <redacted>"),
+    # 'handling ssh_pub' messages, old messages of saving the ssh key to config, sshd and dropbear pubkey messages
+    (rb"handling ssh_pub.*", b"handling ssh_pub <redacted>"),
+    (rb"_ADSB_STATE_SSH_KEY.*", b"_ADSB_STATE_SSH_KEY <redacted>"),
+    (rb"Accepted publickey.*", b"Accepted publickey <redacted>"),
+    (rb"Pubkey auth.*", b"Pubkey auth <redacted>"),
+    # now get rid of anything that looks like an IP address
+    (rb"((1?[0-9][0-9]?|2[0-4][0-9]|25[0-5])\.){3}(1?[0-9][0-9]?|2[0-4][0-9]|25[0-5])", b"<hidden-ip-address>"),
+    # finally, replace everything that looks like a uuid
+    (rb"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", b"<hidden-uuid>"),
+]
+
+# the log-sanitizer.sh separator line, followed by the title of the next section
+SEPARATOR = re.compile(rb"^-{40,}$", re.M)
+TITLE = re.compile(rb"[^\n]+")
+
+
+class SanitizerError(Exception):
+    pass
+
+
+def secrets_from_config(config: Dict) -> List[Tuple[str, str]]:
+    pairs: List[Tuple[str, str]] = []
+    for name in SANITIZE_VARS:
+        item = config.get(name)
+        if type(item) == list:
+            candidates = [(entry, f"{name}_{count}") for count, entry in enumerate(item)]
+        else:
+            candidates = [(item, name)]
+        for search, replace in candidates:
+            search = str(search).strip() if search else ""
+            if search in ("", "True", "False"):
+                continue
+            pairs.append((search, replace))
+            # in the .env file, $ is escaped with $$, in the json $ is not escaped
+            # thus in addition to the above replacement, we also need to replace
+            # the escaped version if there is a $ in the string
+            if "$" in search:
+                pairs.append((search.replace("$", "$$"), replace))
+    return pairs
+
+
+class Sanitizer:
+    """Replace everything that should stay private in a (large) log, in one pass per rule.
+
+    All the secrets are compiled into a single alternation, longest first, so each chunk of the
+    log is scanned for them once instead of once per secret. The log is processed in chunks
+    that end at a line break, so nothing (secrets, IPs, ...) can get split between two chunks.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]]):
+        self._replacements: Dict[bytes, bytes] = {}
+        for search, replace in pairs:
+            # the first one wins, like it did with the sequential replacements
+            self._replacements.setdefault(search.encode(), replace.encode())
+        self._rules = [(re.compile(pattern), replace) for pattern, replace in RULES]
+        self._secrets: Optional[re.Pattern] = None
+        if self._replacements:
+            alternatives = sorted(self._replacements, key=len, reverse=True)
+            self._secrets = re.compile(b"|".join(re.escape(s) for s in alternatives))
+
+    @classmethod
+    def from_config_file(cls, path, extra: Iterable[Tuple[str, str]] = ()) -> "Sanitizer":
+        # without the config we don't know the secrets, so don't pretend we could remove them
+        try:
+            with open(path) as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            raise SanitizerError(f"can't read {path}: {e}")
+        if type(config) != dict:
+            raise SanitizerError(f"{path} doesn't contain a json object")
+        return cls(list(extra) + secrets_from_config(config))
+
+    def sanitize(self, data: bytes) -> bytes:
+        for pattern, replace in self._rules:
+            data = pattern.sub(replace, data)
+        if self._secrets:
+            data = self._secrets.sub(lambda m: self._replacements[m.group(0)], data)
+        return data
+
+    def chunks(self, src: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterable[bytes]:
+        """Sanitized chunks of src, each one ending with a complete line (except possibly the last)."""
+        rest = b""
+        while True:
+            data = src.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                rest = data
+                continue
+            rest = data[end:]
+            yield self.sanitize(data[:end])
+        if rest:
+            yield self.sanitize(rest)
+
+
+class SectionIndex:
+    """Line numbers of the sections in the log-sanitizer.sh output, for the index of the bundle."""
+
+    def __init__(self) -> None:
+        self.sections: List[Tuple[int, str]] = []
+        self._lines = 0
+        # the first line is a section title as well
+        self._want_title = True
+
+    def feed(self, chunk: bytes) -> None:
+        pos = 0
+        while True:
+            if self._want_title:
+                title = TITLE.search(chunk, pos)
+                if not title:
+                    break
+                line = self._lines + chunk.count(b"\n", 0, title.start()) + 1
+                self.sections.append((line, title.group(0).decode(errors="replace").rstrip(":")))
+                self._want_title = False
+                pos = title.end()
+            separator = SEPARATOR.search(chunk, pos)
+            if not separator:
+                break
+            self._want_title = True
+            pos = separator.end()
+        self._lines += chunk.count(b"\n")
+
+    def text(self) -> str:
+        return "".join(f"{line:>8}  {title}\n" for line, title in self.sections)
+
+
+def write_bundle(sanitizer: Sanitizer, src: BinaryIO, dst: BinaryIO) -> None:
+    """Write a zip with the sanitized log and an index of its sections to dst (which can be a pipe)."""
+    index = SectionIndex()
+    with zipfile.ZipFile(dst, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as bundle:
+        info = zipfile.ZipInfo("diagnostics.txt", time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with bundle.open(info, "w", force_zip64=True) as out:
+            for chunk in sanitizer.chunks(src):
+                index.feed(chunk)
+                out.write(chunk)
+        bundle.writestr("index.txt", "line      section\n" + index.text())
+
+
+def write_text(sanitizer: Sanitizer, src: BinaryIO, dst: BinaryIO) -> None:
+    for chunk in sanitizer.chunks(src):
+        dst.write(chunk)
+        dst.flush()
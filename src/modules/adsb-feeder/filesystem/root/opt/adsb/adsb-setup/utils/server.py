@@ -0,0 +1,257 @@
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from .util import print_err
+
+DEFAULT_THREADS = 16
+DEFAULT_BACKLOG = 32
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_STREAMS = 32
+DEFAULT_GRACE = 10.0
+
+REJECT_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 12\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"server busy\n"
+)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """The werkzeug server, but with a fixed pool of worker threads instead of one new thread per connection.
+
+    Every accepted connection is handed to one of `threads` workers; up to `backlog` more wait for
+    a free worker, anything beyond that gets an immediate 503 instead of piling up threads (and RAM)
+    on a small board. A client that sends or reads nothing for `timeout` seconds is dropped, so it
+    can't hold on to a worker. Responses are HTTP/1.1, so streams without a length are chunked;
+    werkzeug still closes the connection after every response (it drains the socket assuming
+    exactly that), browsers simply open a new one. shutdown() stops accepting, drain() then waits
+    for the connections in flight.
+
+    Requests for one of the `stream_paths` (event streams, downloads fed by a pipe) can stay open
+    for as long as the client wants, so they don't run in the pool: the worker only peeks at the
+    request line and hands the connection to a thread of its own, up to `streams` of them.
+    """
+
+    multithread = True
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        app,
+        threads: int = DEFAULT_THREADS,
+        backlog: int = DEFAULT_BACKLOG,
+        timeout: float = DEFAULT_TIMEOUT,
+        streams: int = DEFAULT_STREAMS,
+        stream_paths: Iterable[str] = (),
+        handler=None,
+    ):
+        # a per server subclass, as WSGIRequestHandler / socketserver read these as class attributes
+        handler = type(
+            "PooledRequestHandler", (handler or WSGIRequestHandler,), {"protocol_version": "HTTP/1.1", "timeout": timeout}
+        )
+        super().__init__(host, port, app, handler=handler)
+        self.threads = threads
+        self.backlog = backlog
+        self.streams = streams
+        self._timeout = timeout
+        self._stream_paths = frozenset(path.encode() for path in stream_paths)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(threads + backlog)
+        self._stream_slots = threading.BoundedSemaphore(streams)
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._open_streams = 0
+        self._served = 0
+        self._rejected = 0
+
+    def process_request(self, request, client_address) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._idle:
+                self._rejected += 1
+            self._reject(request)
+            return
+        with self._idle:
+            self._in_flight += 1
+        try:
+            self._executor.submit(self._process, request, client_address)
+        except RuntimeError:
+            # the pool is already shut down
+            self._done()
+            self._reject(request)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            if self._is_stream(request):
+                self._hand_off(request, client_address)
+            else:
+                self._serve(request, client_address)
+        finally:
+            self._done()
+
+    def _serve(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def _is_stream(self, request) -> bool:
+        if not self._stream_paths:
+            return False
+        # the request line normally arrives in the first segment; if it doesn't, the pool serves it
+        try:
+            request.settimeout(self._timeout)
+            head = request.recv(1024, socket.MSG_PEEK)
+        except OSError:
+            return False
+        parts = head.split(b" ", 2)
+        return len(parts) == 3 and parts[1].split(b"?", 1)[0] in self._stream_paths
+
+    def _hand_off(self, request, client_address) -> None:
+        if not self._stream_slots.acquire(blocking=False):
+            with self._idle:
+                self._rejected += 1
+            self._reject(request)
+            return
+        with self._idle:
+            self._open_streams += 1
+        thread = threading.Thread(target=self._stream, args=(request, client_address), name="http-stream", daemon=True)
+        thread.start()
+
+    def _stream(self, request, client_address) -> None:
+        try:
+            self._serve(request, client_address)
+        finally:
+            self._stream_slots.release()
+            with self._idle:
+                self._open_streams -= 1
+                self._served += 1
+                self._idle.notify_all()
+
+    def _done(self) -> None:
+        self._slots.release()
+        with self._idle:
+            self._in_flight -= 1
+            self._served += 1
+            self._idle.notify_all()
+
+    def _reject(self, request) -> None:
+        try:
+            request.settimeout(1.0)
+            request.sendall(REJECT_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def drain(self, timeout: float = DEFAULT_GRACE) -> bool:
+        """Wait (up to timeout seconds) for the connections in flight, returns False if some are still open."""
+        self._executor.shutdown(wait=False)
+        with self._idle:
+            done = self._idle.wait_for(lambda: self._in_flight == 0 and self._open_streams == 0, timeout=timeout)
+        return done
+
+    def stats(self) -> Dict:
+        with self._idle:
+            return {
+                "threads": self.threads,
+                "backlog": self.backlog,
+                "open_connections": self._in_flight,
+                "streams": self.streams,
+                "open_streams": self._open_streams,
+                "connections": self._served,
+                "rejected": self._rejected,
+            }
+
+
+class Server:
+    """Runs the flask app with the server selected in the environment of adsb-setup.service.
+
+    ADSBIM_SERVER=werkzeug (or ADSBIM_DEBUG) is the werkzeug development server as before, otherwise
+    it's the PooledWSGIServer, sized by ADSBIM_SERVER_THREADS, ADSBIM_SERVER_BACKLOG,
+    ADSBIM_SERVER_TIMEOUT and ADSBIM_SERVER_STREAMS.
+    """
+
+    def __init__(self, app, host: str, port: int, debug: bool = False, stream_paths: Iterable[str] = (), environ=os.environ):
+        self._app = app
+        self._host = host
+        self._port = port
+        self._debug = debug
+        self.mode = "werkzeug" if debug else environ.get("ADSBIM_SERVER", "pooled")
+        if self.mode not in ("pooled", "werkzeug"):
+            print_err(f"unknown ADSBIM_SERVER {self.mode}, using the pooled server")
+            self.mode = "pooled"
+        self.threads = _env_number(environ, "ADSBIM_SERVER_THREADS", DEFAULT_THREADS, int)
+        self.backlog = _env_number(environ, "ADSBIM_SERVER_BACKLOG", DEFAULT_BACKLOG, int)
+        self.timeout = _env_number(environ, "ADSBIM_SERVER_TIMEOUT", DEFAULT_TIMEOUT, float)
+        self.streams = _env_number(environ, "ADSBIM_SERVER_STREAMS", DEFAULT_STREAMS, int)
+        self._stream_paths = list(stream_paths)
+        self._server: Optional[PooledWSGIServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def serve(self) -> None:
+        """Serve until shutdown() is called (or the process ends)."""
+        if self.mode == "werkzeug":
+            print_err("starting up the werkzeug development server")
+            self._app.run(host=self._host, port=self._port, debug=self._debug)
+            return
+        self._server = PooledWSGIServer(
+            self._host,
+            self._port,
+            self._app,
+            threads=self.threads,
+            backlog=self.backlog,
+            timeout=self.timeout,
+            streams=self.streams,
+            stream_paths=self._stream_paths,
+        )
+        print_err(
+            f"serving on port {self._port} with {self.threads} threads, backlog {self.backlog}, "
+            f"timeout {self.timeout}s, up to {self.streams} streams"
+        )
+        # the accept loop gets its own thread, so a signal handler in the main thread can call shutdown()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="http-accept")
+        self._thread.start()
+        self._thread.join()
+
+    def shutdown(self, grace: float = DEFAULT_GRACE) -> None:
+        """Stop accepting connections and give the requests in flight up to grace seconds to finish."""
+        server = self._server
+        if server is None or self._thread is None or not self._thread.is_alive():
+            return
+        server.shutdown()
+        if not server.drain(grace):
+            stats = server.stats()
+            print_err(
+                f"shutdown: {stats['open_connections']} connections and {stats['open_streams']} streams "
+                f"still open after {grace}s"
+            )
+
+    def stats(self) -> Dict:
+        if self._server is None:
+            return {"mode": self.mode}
+        return dict(self._server.stats(), mode=self.mode, timeout=self.timeout)
+
+
+def _env_number(environ, name: str, default, kind):
+    value = environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = kind(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        print_err(f"ignoring {name}={value}, using {default}")
+        return default
+    return number
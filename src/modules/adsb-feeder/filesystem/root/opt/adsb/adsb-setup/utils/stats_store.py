@@ -0,0 +1,181 @@
+import sqlite3
+import threading
+from typing import Optional
+
+from .icao_set import IcaoSet
+from .util import print_err
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+# hourly rows are kept for a year, the daily rollup for five
+HOURLY_RETENTION = 366 * DAY
+DAILY_RETENTION = 5 * 366 * DAY
+RESOLUTIONS = ("hour", "day")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hourly (
+    site INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    planes INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    positions INTEGER NOT NULL,
+    PRIMARY KEY (site, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily (
+    site INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    planes INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    positions INTEGER NOT NULL,
+    PRIMARY KEY (site, ts)
+) WITHOUT ROWID;
+-- range queries over all sites (and the retention cleanup) go by time
+CREATE INDEX IF NOT EXISTS hourly_ts ON hourly (ts);
+CREATE INDEX IF NOT EXISTS daily_ts ON daily (ts);
+"""
+
+
+class _Hour:
+    def __init__(self, ts: int) -> None:
+        self.ts = ts
+        self.planes = IcaoSet()
+        self.messages = 0
+        self.positions = 0
+
+    def row(self) -> tuple[int, int, int, int]:
+        return (self.ts, len(self.planes), self.messages, self.positions)
+
+
+class StatsStore:
+    """Hourly unique aircraft / message / position counts per site, with a daily rollup, in SQLite.
+
+    The current hour is accumulated in memory and written out once it's over (or on flush()),
+    which keeps the writes to the SD card down to one small transaction per hour.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._current: dict[int, _Hour] = {}
+        self._day_planes: dict[int, int] = {}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def add_minute(self, site: int, now: float, planes: IcaoSet, messages: int, positions: int, day_planes: int) -> None:
+        """Account one minute worth of data for a site.
+
+        Args:
+            site: 0 for the local feeder, otherwise the micro site index
+            now: the current time
+            planes: the aircraft currently seen
+            messages, positions: the counts for the last minute
+            day_planes: the unique aircraft seen today (what the daily rollup reports)
+        """
+        hour_ts = int(now) // HOUR * HOUR
+        with self._lock:
+            current = self._current.get(site)
+            if current and current.ts != hour_ts:
+                self._write_hour(site, current)
+                current = None
+            if current is None:
+                current = self._current[site] = _Hour(hour_ts)
+            current.planes |= planes
+            current.messages += int(messages)
+            current.positions += int(positions)
+            self._day_planes[site] = day_planes
+
+    def flush(self) -> None:
+        """Write the (partial) current hours - they will be updated once the hour is over."""
+        with self._lock:
+            for site, current in self._current.items():
+                self._write_hour(site, current)
+
+    def _write_hour(self, site: int, hour: _Hour) -> None:
+        day_ts = hour.ts // DAY * DAY
+        try:
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO hourly VALUES (?, ?, ?, ?, ?)", (site,) + hour.row())
+                # the unique aircraft of a day can't be added up from the hours, so that's passed in
+                self._db.execute(
+                    "INSERT OR REPLACE INTO daily SELECT ?, ?, ?, COALESCE(SUM(messages), 0), COALESCE(SUM(positions), 0) "
+                    "FROM hourly WHERE site = ? AND ts >= ? AND ts < ?",
+                    (site, day_ts, self._day_planes.get(site, len(hour.planes)), site, day_ts, day_ts + DAY),
+                )
+                self._db.execute("DELETE FROM hourly WHERE ts < ?", (hour.ts - HOURLY_RETENTION,))
+                self._db.execute("DELETE FROM daily WHERE ts < ?", (day_ts - DAILY_RETENTION,))
+        except sqlite3.Error as e:
+            print_err(f"stats store: failed to write hour {hour.ts} for site {site}: {e}")
+
+    def import_days(self, site: int, days: list[tuple[int, int]]) -> None:
+        """Seed the daily rollup with (day start, unique aircraft) from the old per-day stats, keeping existing rows."""
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO daily VALUES (?, ?, ?, 0, 0)",
+                        [(site, ts // DAY * DAY, planes) for ts, planes in days],
+                    )
+            except sqlite3.Error as e:
+                print_err(f"stats store: failed to import daily stats for site {site}: {e}")
+
+    def query(self, start: float, end: float, resolution: str = "hour", site: Optional[int] = None) -> dict[int, list]:
+        """Rows with start <= ts < end as {site: [[ts, planes, messages, positions], ...]}, oldest first."""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"unknown resolution {resolution}")
+        table = "hourly" if resolution == "hour" else "daily"
+        sql = f"SELECT site, ts, planes, messages, positions FROM {table} WHERE ts >= ? AND ts < ?"
+        args: list = [int(start), int(end)]
+        if site is not None:
+            sql += " AND site = ?"
+            args.append(site)
+        result: dict[int, list] = {}
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY site, ts", args).fetchall()
+            if resolution == "hour":
+                # the hour in progress isn't in the database yet
+                for s, current in self._current.items():
+                    if (site is None or s == site) and start <= current.ts < end:
+                        rows = [r for r in rows if r[0] != s or r[1] != current.ts] + [(s,) + current.row()]
+        for s, ts, planes, messages, positions in sorted(rows):
+            result.setdefault(s, []).append([ts, planes, messages, positions])
+        return result
+
+    def remove_site(self, site: int) -> None:
+        """Drop a micro site's data and shift the sites above it down by one."""
+        with self._lock:
+            with self._db:
+                for table in ("hourly", "daily"):
+                    self._db.execute(f"DELETE FROM {table} WHERE site = ?", (site,))
+                    # shift via negative numbers so the primary key never collides
+                    self._db.execute(f"UPDATE {table} SET site = -site WHERE site > ?", (site,))
+                    self._db.execute(f"UPDATE {table} SET site = -site - 1 WHERE site < 0")
+            self._current = {(s - 1 if s > site else s): h for s, h in self._current.items() if s != site}
+            self._day_planes = {(s - 1 if s > site else s): n for s, n in self._day_planes.items() if s != site}
+
+    def move_site(self, old: int, new: int) -> None:
+        """Same semantics as list.insert(new, list.pop(old)) on the site indices."""
+        if old == new:
+            return
+
+        def moved(s: int) -> int:
+            if s == old:
+                return new
+            if old < s <= new:
+                return s - 1
+            if new <= s < old:
+                return s + 1
+            return s
+
+        lo, hi = min(old, new), max(old, new)
+        with self._lock:
+            with self._db:
+                for table in ("hourly", "daily"):
+                    for s in range(lo, hi + 1):
+                        self._db.execute(f"UPDATE {table} SET site = ? WHERE site = ?", (-moved(s) - 1, s))
+                    self._db.execute(f"UPDATE {table} SET site = -site - 1 WHERE site < 0")
+            self._current = {moved(s): h for s, h in self._current.items()}
+            self._day_planes = {moved(s): n for s, n in self._day_planes.items()}
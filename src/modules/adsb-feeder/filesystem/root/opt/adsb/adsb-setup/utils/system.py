@@ -10,6 +10,7 @@ from typing import Callable, Optional
 import requests
 
 from .data import Data
+from .docker_watcher import DockerWatcher
 from .paths import ADSB_SCRIPTS_DIR, DOCKER_COMPOSE_ADSB_SCRIPT, DOCKER_COMPOSE_START_SCRIPT
 from .util import print_err, run_shell_captured
 
@@ -123,6 +124,8 @@ class System:
         self.containerCheckLock = threading.RLock()
         self.lastContainerCheck: float = 0.0
         self.dockerPsCache: dict[str, str] = dict()
+        # follows the docker events once started, docker ps is only used while it isn't connected
+        self.docker_watcher = DockerWatcher()
 
         self.external_ip: Optional[str] = None
         self.external_ip_timestamp: float = 0.0
@@ -283,6 +286,8 @@ class System:
         Returns:
             List of container names
         """
+        if self.docker_watcher.connected:
+            return [name for name, state in list(self.docker_watcher.containers.items()) if state.state == "running"]
         containers = []
         try:
             result = subprocess.run(
@@ -332,8 +337,14 @@ class System:
         except Exception:
             print_err("docker compose start failed")
 
+    def start_docker_watcher(self) -> None:
+        """Start following the docker events in the background."""
+        self.docker_watcher.start()
+
     def refreshDockerPs(self) -> None:
         """Refresh the Docker container status cache."""
+        if self.docker_watcher.connected:
+            return
         with self.containerCheckLock:
             now = time.time()
             if now - self.lastContainerCheck < 10:
@@ -363,6 +374,14 @@ class System:
         Returns:
             Status string: 'down', 'up', or 'up for N' (seconds)
         """
+        if self.docker_watcher.connected:
+            state = self.docker_watcher.get(name)
+            if not state or state.state != "running":
+                return "down"
+            if not state.started_at:
+                return "up"
+            return f"up for {max(0, int(time.time() - state.started_at))}"
+
         with self.containerCheckLock:
 
             self.refreshDockerPs()
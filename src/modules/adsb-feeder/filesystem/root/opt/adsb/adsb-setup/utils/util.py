@@ -17,6 +17,8 @@ from uuid import UUID
 import requests
 from flask import flash
 
+from .http_client import DEFAULT_TIMEOUT, http_client
+
 # Import paths after they might be configured
 try:
     from .paths import FAKE_CPUINFO_DIR, FAKE_THERMAL_TEMP_FILE, FAKE_THERMAL_ZONE_DIR, MACHINE_ID_FILE, VERBOSE_FILE
@@ -149,6 +151,18 @@ def make_float(value: Any) -> float:
         return 0.0
 
 
+def image_user_agent() -> str:
+    # use image specific but random value for user agent to distinguish
+    # between requests from the same IP but different feeders
+    return f"ADS-B Image-{get_idhash()[:8]}"
+
+
+def host_url(url: str) -> str:
+    # local microfeeders are configured as host.docker.internal for the containers,
+    # adsb-setup itself runs on the host and reaches them on localhost
+    return url.replace("host.docker.internal", "localhost")
+
+
 def generic_get_json(url: str, data: Optional[Any] = None, timeout: float = 5.0) -> tuple[Optional[Any], int]:
     """
     Make JSON GET/POST request with custom user agent.
@@ -161,17 +175,13 @@ def generic_get_json(url: str, data: Optional[Any] = None, timeout: float = 5.0)
     Returns:
         Tuple of (json_response or None, status_code or error_number)
     """
-    requests.packages.urllib3.util.connection.HAS_IPV6 = False  # type: ignore[attr-defined]
-    if "host.docker.internal" in url:
-        url = url.replace("host.docker.internal", "localhost")
-    # use image specific but random value for user agent to distinguish
-    # between requests from the same IP but different feeders
-    agent = f"ADS-B Image-{get_idhash()[:8]}"
+    url = host_url(url)
+    agent = image_user_agent()
     status = -1
     try:
-        response = requests.request(
-            method="GET" if data == None else "POST",
-            url=url,
+        response = http_client.request(
+            "GET" if data == None else "POST",
+            url,
             timeout=timeout,
             data=data,
             headers={
@@ -190,13 +200,45 @@ def generic_get_json(url: str, data: Optional[Any] = None, timeout: float = 5.0)
         status = err.errno if err.errno else -1
     except Exception:
         # for some reason this didn't work
-        print_err("checking {url} failed:")
+        print_err(f"checking {url} failed:")
         print_err(traceback.format_exc())
     else:
         return json_response, response.status_code
     return None, status
 
 
+def conditional_get_json(url: str, etag: Optional[str] = None, timeout: float = 5.0) -> tuple[Optional[Any], int, Optional[str]]:
+    """
+    Make JSON GET request that only transfers the body if it changed since etag.
+
+    Args:
+        url: URL to fetch
+        etag: ETag of the copy the caller already has (None = unconditional request)
+        timeout: Request timeout in seconds
+
+    Returns:
+        Tuple of (json_response or None, status_code or error_number, ETag of the response or None);
+        for a 304 the json_response is None and the caller's copy is still current
+    """
+    url = host_url(url)
+    headers = {"User-Agent": image_user_agent()}
+    if etag:
+        headers["If-None-Match"] = etag
+    try:
+        response = http_client.request("GET", url, timeout=timeout, headers=headers)
+        if response.status_code == 304:
+            return None, 304, response.headers.get("ETag", etag)
+        json_response = response.json()
+    except requests.RequestException as err:
+        print_err(f"checking {url} failed: {err}")
+        return None, err.errno if err.errno else -1, None
+    except Exception:
+        print_err(f"checking {url} failed:")
+        print_err(traceback.format_exc())
+        return None, -1, None
+    return json_response, response.status_code, response.headers.get("ETag")
+
+
 def create_fake_info(indices: Sequence[Optional[int]]) -> bool:
     # instead of trying to figure out if we need this and creating it only in that case,
     # let's just make sure the fake files are there and move on
@@ -344,7 +386,12 @@ def string2file(path: str = "", string: str = "", verbose: bool = False) -> None
             print_err(f'wrote "{string}" to {path}')
 
 
-def get_plain_url(plain_url: str, method: str = "GET", data: Optional[str] = None) -> tuple[Optional[str], int]:
+def get_plain_url(
+    plain_url: str,
+    method: str = "GET",
+    data: Optional[str] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> tuple[Optional[str], int]:
     """
     Fetch URL with browser-like headers.
 
@@ -352,11 +399,11 @@ def get_plain_url(plain_url: str, method: str = "GET", data: Optional[str] = Non
         plain_url: URL to fetch
         method: HTTP method (GET or POST)
         data: Optional request body
+        timeout: Request timeout in seconds
 
     Returns:
         Tuple of (response_text or None, status_code or error_number)
     """
-    requests.packages.urllib3.util.connection.HAS_IPV6 = False  # type: ignore[attr-defined]
     status = -1
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/117.0",
@@ -373,7 +420,7 @@ def get_plain_url(plain_url: str, method: str = "GET", data: Optional[str] = Non
         # sending plain text for custom bodies
         headers["Content-Type"] = "text/plain; charset=utf-8"
     try:
-        response = requests.request(method=method, url=plain_url, headers=headers, data=data)
+        response = http_client.request(method, plain_url, headers=headers, data=data, timeout=timeout)
     except (
         requests.HTTPError,
         requests.ConnectionError,
@@ -383,7 +430,7 @@ def get_plain_url(plain_url: str, method: str = "GET", data: Optional[str] = Non
         print_err(f"checking {plain_url} failed: {err}")
         status = err.errno if err.errno else -1
     except Exception:
-        print_err("checking {plain_url} failed: {traceback.format_exc()}")
+        print_err(f"checking {plain_url} failed: {traceback.format_exc()}")
     else:
         return response.text, response.status_code
     return None, status
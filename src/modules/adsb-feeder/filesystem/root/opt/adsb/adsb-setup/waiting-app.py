@@ -1,18 +1,20 @@
 import json
 import math
 import os
-import re
 import sys
 import time
 from sys import argv
+from typing import Optional
 
-from flask import Flask, Response, render_template
+from flask import Flask, Response, render_template, request
+from utils.logtail import LogFollower, parse_last_event_id
 
 app = Flask(__name__)
 logfile = "/run/adsb-feeder-image.log"
 title = "Restarting the ADS-B Feeder System"
 theme = "auto"
 verbose: int = 0
+follower: Optional[LogFollower] = None
 
 
 # we need to fake having env_value_by_tag so that the waiting.html can be
@@ -32,24 +34,15 @@ def print_err(*args, **kwargs):
 
 @app.route("/stream-log")
 def stream_log():
-
-    def tail():
-        with open(logfile, "r") as file:
-            ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-            tmp = file.read()[-16 * 1024 :]
-            # discard anything but the last 16 kB
-            while True:
-                tmp += file.read(16 * 1024)
-                if tmp and tmp.find("\n") != -1:
-                    block, tmp = tmp.rsplit("\n", 1)
-                    block = ansi_escape.sub("", block)
-                    lines = block.split("\n")
-                    data = "".join(["data: " + line + "\n" for line in lines])
-                    yield data + "\n\n"
-                else:
-                    time.sleep(0.2)
-
-    return Response(tail(), mimetype="text/event-stream")
+    global follower
+    if follower is None:
+        follower = LogFollower(logfile)
+    last_id = parse_last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+    return Response(
+        follower.stream(last_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/restart")
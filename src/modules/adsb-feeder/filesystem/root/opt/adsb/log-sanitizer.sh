@@ -115,30 +115,12 @@ echo "${SEPARATOR}"
 
 }
 
-# config variable replacement now done in search-replace.py
-# search-replace also accepts argument pairs for search replace
-
-# regex replacements using perl, this is more consistent than sed due to always different sed versions
-replace_args=()
-
-# replace --lat --lon arguments mainly from piaware log
-replace_args+='s/--lat.[^ ]*/--lat <redacted>/g;'
-replace_args+='s/--lon.[^ ]*/--lon <redacted>/g;'
-# remove FA name from piaware log
-replace_args+='s#flightaware.com/adsb/stats/user.*#flightaware.com/adsb/stats/user/<redacted>#g;'
-replace_args+='s/FlightAware as user .*/FlightAware as user <redacted>/g;'
-# replace 'handling ssh_pub' messages
-replace_args+='s/handling ssh_pub.*/handling ssh_pub <redacted>/;'
-# replace old messages of saing the ssh key to config
-replace_args+='s/_ADSB_STATE_SSH_KEY.*/_ADSB_STATE_SSH_KEY <redacted>/;'
-# replace sshd pubkey messages
-replace_args+='s/Accepted publickey.*/Accepted publickey <redacted>/;'
-# replace dropbear pubkey messages
-replace_args+='s/Pubkey auth.*/Pubkey auth <redacted>/;'
-# now get rid of anything that looks like an IP address
-replace_args+='s/((1?[0-9][0-9]?|2[0-4][0-9]|25[0-5])\.){3}(1?[0-9][0-9]?|2[0-4][0-9]|25[0-5])/<hidden-ip-address>/g;'
-# finally, replace everything that looks like a uuid
-replace_args+='s/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/<hidden-uuid>/g;'
+# the sanitizing (config secrets, IP addresses, uuids, ...) is done in one pass by sanitize_logs.py
+# it also accepts argument pairs for search replace
+# with --bundle the output is a zip file with the sanitized log and an index of its sections
+bundle_arg=()
+if [[ "$1" == "--bundle" ]]; then
+    bundle_arg=(--bundle)
+fi
 
-# sanitize log by replacing all the stuff that should stay private
-generate_log | perl -pe "${replace_args}" | /opt/adsb/scripts/search-replace.py "$(hostname)" HOSTNAME
+generate_log | python3 /opt/adsb/adsb-setup/sanitize_logs.py "${bundle_arg[@]}" "$(hostname)" HOSTNAME
@@ -40,6 +40,40 @@ else:
             sys.path.insert(0, str(path))
             break
 
+
+def pytest_configure(config):
+    """Register the markers used by the tests"""
+    config.addinivalue_line("markers", "benchmark: wall-clock micro-benchmarks, only run with -m benchmark")
+
+
+class _Markers(dict):
+    """Marker names for evaluating a -m expression, the ones not given are False"""
+
+    def __missing__(self, name):
+        return False
+
+
+def _selects_benchmarks(markexpr):
+    """Does the -m expression pick the benchmarks because of their marker (like "benchmark" but not "not slow")?"""
+    if not markexpr:
+        return False
+    try:
+        with_marker = eval(markexpr, {"__builtins__": {}}, _Markers(benchmark=True))
+        without_marker = eval(markexpr, {"__builtins__": {}}, _Markers())
+    except Exception:
+        return False
+    return bool(with_marker) and not without_marker
+
+
+def pytest_collection_modifyitems(config, items):
+    """Leave the benchmarks out unless they are asked for, their timings depend on how busy the machine is"""
+    if _selects_benchmarks(config.getoption("markexpr")):
+        return
+    benchmarks = [item for item in items if item.get_closest_marker("benchmark")]
+    if benchmarks:
+        config.hook.pytest_deselected(items=benchmarks)
+        items[:] = [item for item in items if not item.get_closest_marker("benchmark")]
+
 # Mock system paths and files that the app expects to exist
 @pytest.fixture
 def mock_system_paths():
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Load test: N concurrent pollers hitting /api/stage2_stats on a running feeder, reports latency percentiles
+
+    python3 tests/load_stage2_stats.py http://adsb-feeder.local --pollers 20 --duration 30
+
+Run it once with the default pooled server and once with ADSBIM_SERVER=werkzeug set for
+adsb-setup.service to compare the two.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def poller(url, interval, deadline, timeout, latencies, errors, lock):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except urllib.error.HTTPError as e:
+            with lock:
+                errors[str(e.code)] = errors.get(str(e.code), 0) + 1
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        if interval:
+            time.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="latency of /api/stage2_stats under concurrent pollers")
+    parser.add_argument("base_url", help="e.g. http://adsb-feeder.local")
+    parser.add_argument("--path", default="/api/stage2_stats")
+    parser.add_argument("--pollers", type=int, default=20, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--interval", type=float, default=0, help="seconds between requests of one poller (0: back to back)")
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    url = args.base_url.rstrip("/") + args.path
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=poller, args=(url, args.interval, deadline, args.timeout, latencies, errors, lock))
+        for _ in range(args.pollers)
+    ]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{url}: {args.pollers} pollers for {elapsed:.1f}s")
+    print(f"  ok: {len(ms)} ({len(ms) / elapsed:.1f}/s), errors: {errors or 'none'}")
+    if ms:
+        print(
+            f"  latency ms: p50 {percentile(ms, 50):.1f}  p90 {percentile(ms, 90):.1f}  "
+            f"p99 {percentile(ms, 99):.1f}  max {max(ms):.1f}  mean {statistics.mean(ms):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Tests for utils.agg_status module
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from utils.agg_status import AggStatus, AggStatusPool, T
+
+
+class SlowStatus:
+    """Stand-in for AggStatus whose check blocks until released."""
+
+    def __init__(self, agg, idx, release, counter):
+        self._agg = agg
+        self._idx = idx
+        self._release = release
+        self._counter = counter
+
+    def check(self):
+        with self._counter["lock"]:
+            self._counter["running"] += 1
+            self._counter["max"] = max(self._counter["max"], self._counter["running"])
+            self._counter["calls"] += 1
+        self._release.wait(5)
+        with self._counter["lock"]:
+            self._counter["running"] -= 1
+        return True
+
+
+def make_counter():
+    return {"lock": threading.Lock(), "running": 0, "max": 0, "calls": 0}
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestAggStatusPool:
+    """Test the bounded AggStatusPool"""
+
+    def test_pool_coalesces_checks_per_key(self):
+        """Test that concurrent checks for the same aggregator and site run once"""
+        release = threading.Event()
+        counter = make_counter()
+        pool = AggStatusPool(max_workers=2)
+        status = SlowStatus("flightaware", 1, release, counter)
+        try:
+            assert pool.submit(status)
+            # the first check is still running, so these are skipped
+            assert not pool.submit(status)
+            assert not pool.submit(SlowStatus("flightaware", 1, release, counter))
+            # a different site is a different key
+            assert pool.submit(SlowStatus("flightaware", 2, release, counter))
+            release.set()
+            assert wait_for(lambda: pool.in_flight == 0)
+            assert counter["calls"] == 2
+            assert pool.submit(status)
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_pool_is_bounded(self):
+        """Test that no more than max_workers checks run at the same time"""
+        release = threading.Event()
+        counter = make_counter()
+        pool = AggStatusPool(max_workers=3)
+        try:
+            for idx in range(15):
+                assert pool.submit(SlowStatus("radarbox", idx, release, counter))
+            assert wait_for(lambda: counter["running"] == 3)
+            time.sleep(0.05)
+            assert counter["max"] == 3
+            release.set()
+            assert wait_for(lambda: counter["calls"] == 15)
+            assert counter["max"] == 3
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_pool_survives_failing_check(self):
+        """Test that an exception in a check doesn't kill the pool"""
+        pool = AggStatusPool(max_workers=1)
+        status = MagicMock(_agg="planewatch", _idx=0)
+        status.check.side_effect = RuntimeError("boom")
+        try:
+            assert pool.submit(status)
+            assert wait_for(lambda: pool.in_flight == 0)
+            assert pool.submit(status)
+            assert wait_for(lambda: status.check.call_count == 2)
+        finally:
+            pool.shutdown()
+
+
+class TestAggStatus:
+    """Test AggStatus"""
+
+    def test_last_status_does_not_check(self):
+        """Test that last_status returns the last result without a new check"""
+        status = AggStatus("flightaware", 0, MagicMock(), "http://127.0.0.1:1099", MagicMock())
+        status.check_impl = MagicMock()
+
+        assert status.last_status() == {"beast": ".", "mlat": ".", "age": None}
+
+        status._beast = T.Good
+        status._mlat = T.Starting
+        status._last_check = datetime.now() - timedelta(seconds=30)
+        result = status.last_status()
+        assert result["beast"] == "good"
+        assert result["mlat"] == "starting"
+        assert 29 <= result["age"] <= 31
+        status.check_impl.assert_not_called()
+
+    def test_env_updates_are_applied_after_the_check(self):
+        """Test that Env changes found by a check are applied after it, in one transaction"""
+        data = MagicMock()
+        status = AggStatus("adsbx", 1, data, "http://127.0.0.1:1099", MagicMock())
+
+        def check_impl():
+            status.set_env_later("adsbxfeederid", "abcdef123456")
+            status.set_env_later("adsbxfeederid_uuid", "uuid")
+            # nothing is written while the check is still talking to the network
+            data.transaction.assert_not_called()
+            data.env_by_tags.return_value.list_set.assert_not_called()
+
+        status.check_impl = check_impl
+        status.check()
+        data.transaction.assert_called_once()
+        assert [c.args[0] for c in data.env_by_tags.call_args_list] == ["adsbxfeederid", "adsbxfeederid_uuid"]
+        assert [c.args for c in data.env_by_tags.return_value.list_set.call_args_list] == [(1, "abcdef123456"), (1, "uuid")]
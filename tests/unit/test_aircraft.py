@@ -0,0 +1,98 @@
+"""
+Tests for utils.aircraft module
+"""
+import json
+import os
+
+import pytest
+
+from utils.aircraft import AircraftSnapshot
+
+# the layout readsb writes: one aircraft per line
+AIRCRAFT_JSON = """{ "now" : 1700000000.5,
+  "messages" : 123456,
+  "aircraft" : [
+{"hex":"a1b2c3","type":"adsb_icao","flight":"UAL123  ","alt_baro":35000,"lat":37.1,"lon":-122.2,"mlat":[],"tisb":[],"seen":0.1},
+{"hex":"~2a0001","type":"tisb_trackfile","lat":-37.5,"lon":122.0,"seen":1.2},
+{"hex":"00abcd","type":"mode_s","alt_baro":12000,"lastPosition":{"lat":37.0,"lon":-122.0,"seen_pos":120.0},"seen":3.0},
+{"hex":"c0ffee","type":"mlat","nav_modes":["autopilot","tcas"],"lat":38.0,"lon":-121.0,"seen":0.5}
+  ]
+}
+"""
+
+
+def check(snapshot):
+    assert snapshot.now == 1700000000.5
+    assert snapshot.total == 4
+    assert snapshot.with_position == 3
+    assert snapshot.types == {"adsb_icao": 1, "tisb_trackfile": 1, "mode_s": 1, "mlat": 1}
+    assert snapshot.icao.hex() == ["00abcd", "a1b2c3", "c0ffee"]
+    assert snapshot.seen("mlat", "adsb_icao")
+    assert not snapshot.seen("uat")
+
+
+class TestAircraftSnapshot:
+    """Test AircraftSnapshot parsing and caching"""
+
+    def test_line_parser(self):
+        """Test the one aircraft per line parser"""
+        check(AircraftSnapshot(AIRCRAFT_JSON))
+
+    def test_falls_back_to_json_for_other_layouts(self):
+        """Test that other layouts of the file are parsed as JSON"""
+        check(AircraftSnapshot(json.dumps(json.loads(AIRCRAFT_JSON))))
+        check(AircraftSnapshot(json.dumps(json.loads(AIRCRAFT_JSON), indent=2)))
+
+    def test_get_caches_until_the_file_changes(self, tmp_path):
+        """Test that get() reuses the snapshot until the file changes"""
+        path = tmp_path / "aircraft.json"
+        path.write_text(AIRCRAFT_JSON)
+        parses = AircraftSnapshot.parses
+
+        first = AircraftSnapshot.get(str(path))
+        assert first is not None
+        assert AircraftSnapshot.get(str(path)) is first
+        assert AircraftSnapshot.parses == parses + 1
+
+        path.write_text(AIRCRAFT_JSON.replace('"hex":"c0ffee","type":"mlat"', '"hex":"c0ffee","type":"adsb_icao"'))
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = AircraftSnapshot.get(str(path))
+        assert second is not first
+        assert second.types["adsb_icao"] == 2
+        assert AircraftSnapshot.parses == parses + 2
+
+    def test_get_missing_or_broken_file(self, tmp_path):
+        """Test that get() returns None for a missing or broken file"""
+        assert AircraftSnapshot.get(str(tmp_path / "nope.json")) is None
+        path = tmp_path / "aircraft.json"
+        path.write_text('{"now": 1, "aircraft": [')
+        assert AircraftSnapshot.get(str(path)) is None
+
+    @pytest.mark.benchmark
+    def test_line_parser_benchmark(self):
+        """Micro-benchmark: a busy site with 600 aircraft, json.load vs. the line parser"""
+        import time
+
+        lines = [
+            f'{{"hex":"{i:06x}","type":"adsb_icao","flight":"TEST{i:04d}","alt_baro":{i * 50},"alt_geom":{i * 50},'
+            f'"gs":420.1,"track":123.4,"baro_rate":0,"squawk":"1234","category":"A3","nav_qnh":1013.2,"lat":37.{i},'
+            f'"lon":-122.{i},"nic":8,"rc":186,"seen_pos":0.3,"version":2,"mlat":[],"tisb":[],"messages":1234,"seen":0.1,"rssi":-20.5}}'
+            for i in range(600)
+        ]
+        text = '{ "now" : 1700000000.5,\n  "aircraft" : [\n' + ",\n".join(lines) + "\n  ]\n}\n"
+
+        start = time.perf_counter()
+        for _ in range(20):
+            obj = json.loads(text)
+            hexes = {a["hex"] for a in obj["aircraft"] if not a["hex"].startswith("~")}
+            seen = any(a.get("type") in ["adsb_icao", "mode_s", "mlat"] for a in obj["aircraft"])
+        json_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(20):
+            snapshot = AircraftSnapshot(text)
+        line_time = time.perf_counter() - start
+
+        assert seen and len(hexes) == len(snapshot.icao) == 600
+        print(f"600 aircraft: json.load {json_time / 20 * 1000:.2f}ms, line parser {line_time / 20 * 1000:.2f}ms per parse")
@@ -0,0 +1,118 @@
+"""
+Tests for utils.airports module
+"""
+import math
+import random
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+import utils.airports
+from utils.airports import EARTH_RADIUS_KM, AirportIndex, compact_csv
+
+# the airport file that comes with the feeder, next to adsb-setup
+BUNDLED = Path(utils.airports.__file__).resolve().parents[2] / "data" / "airports.csv"
+
+OURAIRPORTS = """\
+"id","ident","type","name","latitude_deg","longitude_deg","elevation_ft","continent","iso_country","iso_region","municipality","scheduled_service","icao_code","iata_code","gps_code","local_code","home_link","wikipedia_link","keywords"
+3682,"KSFO","large_airport","San Francisco International Airport",37.618999,-122.375,13,"NA","US","US-CA","San Francisco","yes","KSFO","SFO","KSFO","SFO",,,
+3453,"KOAK","large_airport","Metropolitan Oakland International Airport",37.721298,-122.221001,9,"NA","US","US-CA","Oakland","yes","KOAK","OAK","KOAK","OAK",,,
+1,"00CA","small_airport","Goldstone (GTS) Airport",35.35474,-116.885329,3038,"NA","US","US-CA","Barstow","no",,,"00CA","00CA",,,
+20880,"KLSN","small_airport","Los Banos Municipal Airport",37.0629,-120.869003,121,"NA","US","US-CA","Los Banos","no",,"LSN","KLSN","LSN",,,
+2,"US-0001","heliport","Some Heliport",37.62,-122.38,10,"NA","US","US-CA","San Francisco","no",,,,,,,
+2434,"EDDF","large_airport","Frankfurt am Main Airport",50.036249,8.559294,364,"EU","DE","DE-HE","Frankfurt am Main","yes","EDDF","FRA","EDDF",,,,
+"""
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def random_airports(n, seed=1):
+    rnd = random.Random(seed)
+    # uniform on the sphere, so the poles get their fair (small) share
+    return [
+        (f"A{i}", f"airport {i}", math.degrees(math.asin(rnd.uniform(-1, 1))), rnd.uniform(-180, 180), "XX") for i in range(n)
+    ]
+
+
+class TestAirportIndex:
+    """Test compact_csv and the AirportIndex lookups"""
+
+    def test_compact_csv_and_lookup(self, tmp_path):
+        """Test compacting the OurAirports file and looking up airports in it"""
+        src = tmp_path / "airports.csv"
+        src.write_text(OURAIRPORTS)
+        dst = tmp_path / "compact.csv"
+        assert compact_csv(str(src), str(dst)) == 4
+        index = AirportIndex.from_csv(dst)
+        assert len(index) == 4
+
+        # the heliport right next to it isn't an airport
+        airport = index.nearest(37.62, -122.38)
+        assert airport["icao"] == "KSFO"
+        assert airport["name"] == "San Francisco International Airport"
+        assert airport["isocountry"] == "US"
+        assert airport["distance_km"] < 1
+        # no icao_code: the gps_code is used, but only if it is a real ICAO code
+        assert index.nearest(37.0, -120.9)["icao"] == "KLSN"
+        assert index.nearest(35.3, -116.9)["icao"] != "00CA"
+        assert index.nearest(50.0, 8.5)["icao"] == "EDDF"
+
+        assert [a["icao"] for a in index.within(37.7, -122.3, 20)] == ["KOAK", "KSFO"]
+        assert index.within(37.7, -122.3, 1) == []
+
+    def test_bundled_airport_file(self):
+        """Test that the airport file that comes with the feeder loads and only has real ICAO codes"""
+        index = AirportIndex.from_csv(BUNDLED)
+        assert len(index) > 10000
+        assert all(re.fullmatch("[A-Z]{4}", icao) for icao in index._icao)
+        assert index.nearest(37.62, -122.38)["icao"] == "KSFO"
+        assert index.nearest(50.03, 8.56)["icao"] == "EDDF"
+
+    def test_matches_brute_force(self):
+        """Test nearest() and within() against a linear scan"""
+        airports = random_airports(3000)
+        index = AirportIndex(airports)
+        rnd = random.Random(2)
+        queries = [(rnd.uniform(-90, 90), rnd.uniform(-180, 180)) for _ in range(100)] + [(90, 0), (-90, 0), (0, 180), (0, -180)]
+        for lat, lon in queries:
+            distances = sorted((haversine(lat, lon, a[2], a[3]), a[0]) for a in airports)
+            nearest = index.nearest(lat, lon)
+            assert nearest["icao"] == distances[0][1]
+            assert abs(nearest["distance_km"] - distances[0][0]) < 0.1
+            within = index.within(lat, lon, 500)
+            assert [a["icao"] for a in within] == [icao for d, icao in distances if d <= 500]
+
+    def test_empty_index(self):
+        """Test lookups in an empty index"""
+        index = AirportIndex([])
+        assert index.nearest(1, 2) is None
+        assert index.within(1, 2, 100) == []
+
+    @pytest.mark.benchmark
+    def test_lookup_benchmark(self):
+        """Micro-benchmark: k-d tree lookups vs. a linear scan over about as many airports as OurAirports has"""
+        airports = random_airports(45000)
+        start = time.perf_counter()
+        index = AirportIndex(airports)
+        build = time.perf_counter() - start
+
+        rnd = random.Random(3)
+        queries = [(rnd.uniform(-60, 70), rnd.uniform(-180, 180)) for _ in range(1000)]
+        start = time.perf_counter()
+        for lat, lon in queries:
+            index.nearest(lat, lon)
+        per_lookup = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        for lat, lon in queries[:5]:
+            min(airports, key=lambda a: haversine(lat, lon, a[2], a[3]))
+        per_scan = (time.perf_counter() - start) / 5
+
+        print(f"\nbuild {build * 1000:.0f} ms, lookup {per_lookup * 1e6:.0f} us, linear scan {per_scan * 1e6:.0f} us")
+        assert per_lookup * 20 < per_scan
@@ -342,6 +342,45 @@ class TestAdsbImApiRoutes:
         # API should return JSON or error
         assert response.status_code in [200, 500]
 
+    def test_agg_structure_is_cached(self):
+        """Test that the aggregator structure is only rebuilt after an Env changed"""
+        from utils.environment import Env
+
+        self.adsb_im._d.is_enabled.return_value = False
+        self.adsb_im._d.list_is_enabled.side_effect = lambda agg, idx: agg in ["adsblol", "radarbox"]
+        self.adsb_im._d.env.return_value = MagicMock(value=["uuid"], list_get=MagicMock(return_value="uuid"))
+        self.adsb_im.generate_agg_structure()
+        assert [entry[0] for entry in self.adsb_im.agg_structure] == ["adsblol", "radarbox"]
+        assert self.adsb_im.agg_structure[1][3][0] == "https://www.airnavradar.com/stations/uuid"
+        calls = self.adsb_im._d.list_is_enabled.call_count
+        assert calls > 0
+
+        self.adsb_im.generate_agg_structure()
+        assert self.adsb_im._d.list_is_enabled.call_count == calls
+
+        with patch.object(Env, '_generation', Env.generation() + 1):
+            self.adsb_im.generate_agg_structure()
+        assert self.adsb_im._d.list_is_enabled.call_count == 2 * calls
+
+    def test_base_info_etag(self):
+        """Test base_info answers If-None-Match with 304"""
+        self.adsb_im._d.env_by_tags.return_value = MagicMock(value="1", list_get=MagicMock(return_value="site"))
+        self.adsb_im._d.is_enabled.return_value = False
+        self.adsb_im._d.list_is_enabled.return_value = False
+        with patch.object(self.adsb_im, 'get_lat_lon_alt', return_value=(1.0, 2.0, 3)):
+            response = self.client.get('/api/base_info')
+            assert response.status_code == 200
+            etag = response.headers.get('ETag')
+            assert etag
+            response = self.client.get('/api/base_info', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+            # a different site name means a different ETag
+            self.adsb_im._d.env_by_tags.return_value.list_get.return_value = "renamed"
+            response = self.client.get('/api/base_info', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert json.loads(response.data)["name"] == "renamed"
+
     def test_stage2_info_api(self):
         """Test stage2_info API endpoint"""
         response = self.client.get('/api/stage2_info')
@@ -396,6 +435,115 @@ class TestAdsbImApiRoutes:
         # API should return JSON or error
         assert response.status_code in [200, 500]
 
+    def test_config_stats_api(self):
+        """Test config_stats debug API endpoint"""
+        self.adsb_im._d.config_write_stats = {"writes": 1, "writes_saved": 2, "in_transaction": False}
+        response = self.client.get('/api/debug/config_stats')
+        assert response.status_code == 200
+        assert response.json["writes"]["writes_saved"] == 2
+        assert {"hits", "misses", "reparses", "parses_per_minute"} <= set(response.json["cache"])
+
+    def test_publish_agg_status(self):
+        """Test that finished status checks are pushed to the event stream without their age"""
+        self.adsb_im.get_agg_status = MagicMock(return_value={"beast": "good", "mlat": "warning", "age": 3.2})
+
+        self.adsb_im.publish_agg_status(MagicMock(_agg="adsblol", _idx=2))
+
+        assert self.adsb_im._events.get("status/adsblol/2") == {"beast": "good", "mlat": "warning"}
+
+    def test_events_feeder(self):
+        """Test that the feeder pushes the temperatures without their age and nothing no page listens for"""
+        self.adsb_im.cache_agg_status = MagicMock()
+        self.adsb_im.stage2_stats_data = MagicMock(return_value=[])
+        self.adsb_im.temperatures = MagicMock(return_value={"cpu": "45", "now": 1000, "age": 7})
+        self.adsb_im._events.wait_for_subscribers = MagicMock(side_effect=[True, False])
+
+        with patch('app.sleep'):
+            self.adsb_im.events_feeder()
+
+        assert self.adsb_im._events.get("temperatures") == {"cpu": "45", "now": 1000}
+        assert self.adsb_im._events.get("restart") is None
+
+    def test_planes_seen_per_day_migration(self, tmp_path):
+        """Test that the old hex list file still loads and is written back in the compact format"""
+        import gzip
+        import time
+
+        self.adsb_im.micro_indices = MagicMock(return_value=[1])
+        legacy = {"timestamp": int(time.time()), "planes": [["a1b2c3", "~000001"], ["00abcd"]], "stats": [[5], [6]]}
+        with gzip.open(tmp_path / "adsb_planes_seen_per_day.json.gz", "w") as f:
+            f.write(json.dumps(legacy).encode())
+
+        with patch('app.get_adsb_base_dir', return_value=str(tmp_path)):
+            self.adsb_im.load_planes_seen_per_day()
+            assert self.adsb_im.planes_seen_per_day[0].hex() == ["a1b2c3"]
+            assert self.adsb_im.planes_seen_per_day[1].hex() == ["00abcd"]
+            assert self.adsb_im.plane_stats == [[5], [6]]
+
+            self.adsb_im.planes_seen_per_day[0] |= self.adsb_im.planes_seen_per_day[1]
+            self.adsb_im.write_planes_seen_per_day()
+            with gzip.open(tmp_path / "adsb_planes_seen_per_day.json.gz", "r") as f:
+                written = json.load(f)
+            assert "planes_v2" in written and written["planes"] == [[], []]
+
+            self.adsb_im.load_planes_seen_per_day()
+            assert self.adsb_im.planes_seen_per_day[0].hex() == ["00abcd", "a1b2c3"]
+            assert self.adsb_im.plane_stats == [[5], [6]]
+
+    def test_stats_history_api(self, tmp_path):
+        """Test the /api/stats range queries against the stats store"""
+        from utils.icao_set import IcaoSet
+        from utils.stats_store import StatsStore
+
+        self.adsb_im.micro_indices = MagicMock(return_value=[1])
+        self.adsb_im._stats_store = StatsStore(str(tmp_path / "stats.db"))
+        self.adsb_im._stats_store.add_minute(1, 1700006460, IcaoSet([1, 2]), 600, 60, 2)
+
+        response = self.client.get('/api/stats?from=1700000000&to=1700010000&resolution=hour')
+        assert response.status_code == 200
+        assert response.json["sites"] == {"0": [], "1": [[1700006400, 2, 600, 60]]}
+
+        response = self.client.get('/api/stats?from=1700010000&to=1700000000')
+        assert response.status_code == 400
+        response = self.client.get('/api/stats?resolution=fortnight')
+        assert response.status_code == 400
+
+    def test_start_affected_containers(self):
+        """Test that only the services affected by a settings change get recreated"""
+        self.adsb_im._system._restart.bg_run.side_effect = lambda func: func() or True
+        self.adsb_im._system.list_containers.return_value = ["ultrafeeder", "piaware"]
+        self.adsb_im._compose_impact = MagicMock()
+        self.adsb_im._compose_impact.services_for.return_value = {"piaware"}
+        self.adsb_im._pending_env_changes = {"FEEDER_PIAWARE_FEEDER_ID"}
+
+        self.adsb_im.start_affected_containers()
+
+        self.adsb_im._compose_impact.services_for.assert_called_once_with({"FEEDER_PIAWARE_FEEDER_ID"}, ["ultrafeeder", "piaware"])
+        self.adsb_im._system.recreate_containers.assert_called_once_with(["piaware"])
+        self.adsb_im._system.start_containers.assert_not_called()
+        assert self.adsb_im._pending_env_changes == set()
+
+    def test_start_affected_containers_full_start(self):
+        """Test the fallback to starting all containers"""
+        self.adsb_im._system._restart.bg_run.side_effect = lambda func: func() or True
+        self.adsb_im._compose_impact = MagicMock()
+        self.adsb_im._compose_impact.services_for.return_value = None
+        self.adsb_im._pending_env_changes = {"AF_IS_FLIGHTAWARE_ENABLED"}
+
+        self.adsb_im.start_affected_containers()
+
+        self.adsb_im._system.recreate_containers.assert_not_called()
+        self.adsb_im._system.start_containers.assert_called_once()
+
+    def test_start_affected_containers_locked(self):
+        """Test that the changes are kept if the restart lock is held"""
+        self.adsb_im._system._restart.bg_run.return_value = False
+        self.adsb_im._pending_env_changes = {"FEEDER_LAT"}
+
+        self.adsb_im.start_affected_containers()
+
+        assert self.adsb_im._pending_env_changes == {"FEEDER_LAT"}
+
     def test_check_changelog_status_api(self):
         """Test check_changelog_status API endpoint"""
         response = self.client.get('/api/check_changelog_status')
@@ -414,6 +562,22 @@ class TestAdsbImApiRoutes:
         # API should return JSON or error
         assert response.status_code in [200, 404, 500]
 
+    def test_closest_airport_offline(self, tmp_path):
+        """Test closest_airport API answered from the local airport file"""
+        airports = tmp_path / "airports.csv"
+        airports.write_text(
+            "icao,name,lat,lon,isocountry\n"
+            "KJFK,John F Kennedy International Airport,40.63980,-73.77890,US\n"
+            "KLGA,La Guardia Airport,40.77720,-73.87260,US\n"
+        )
+        with patch('app.AIRPORTS_FILE', airports), patch('app.generic_get_json') as mock_get:
+            response = self.client.get('/api/closest_airport/40.7128/-74.0060')
+            assert response.status_code == 200
+            assert json.loads(response.data)["icao"] == "KLGA"
+            response = self.client.get('/api/closest_airport/invalid/coords')
+            assert json.loads(response.data) == {"error": "Invalid position"}
+        mock_get.assert_not_called()
+
 
 class TestAdsbImIntegration:
     """Integration tests for AdsbIm using real Flask app"""
@@ -0,0 +1,150 @@
+"""
+Tests for utils.backup module
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+
+from utils.backup import MANIFEST_NAME, BackupEngine
+
+
+class KeepOpen(io.BytesIO):
+    """BytesIO that survives the engine closing it, so the zip can be read back."""
+
+    def close(self):
+        pass
+
+
+def make_tree(tmp_path, num_micro=1):
+    adsb_path = tmp_path / "config"
+    (adsb_path / "ultrafeeder").mkdir(parents=True)
+    (adsb_path / "config.json").write_text(json.dumps({"_ADSBIM_STATE_SITE_NAME": "test"}))
+    sites = [(0, adsb_path / "ultrafeeder")] + [(i, adsb_path / "ultrafeeder" / f"10.0.0.{i}") for i in range(1, num_micro + 1)]
+    for idx, uf_path in sites:
+        day = uf_path / "globe_history" / "2026" / "10" / "01"
+        (day / "heatmap").mkdir(parents=True)
+        (day / "heatmap" / "00.bin.ttf").write_bytes(gzip.compress(b"heat" * 1000))
+        (day / "acas.csv").write_text("a,b,c\n" * 1000)
+        (uf_path / "globe_history" / "internal_state").mkdir()
+        (uf_path / "globe_history" / "internal_state" / "blob").write_bytes(b"x")
+        rrd = uf_path / "graphs1090" / "rrd"
+        rrd.mkdir(parents=True)
+        (rrd / "localhost.tar.gz").write_bytes(gzip.compress(b"rrd" * 100))
+    return adsb_path, sites
+
+
+def run_backup(engine, sites, **kwargs):
+    out = KeepOpen()
+    assert engine.write(out, sites, **kwargs)
+    return zipfile.ZipFile(io.BytesIO(out.getvalue()))
+
+
+class TestBackupEngine:
+    """Test BackupEngine"""
+
+    def test_full_backup_content_and_manifest(self, tmp_path):
+        """Test the content of a full backup and the manifest it writes"""
+        adsb_path, sites = make_tree(tmp_path)
+        engine = BackupEngine(adsb_path, tmp_path / "state" / "manifest.json", writeback=lambda p, i: None)
+        zf = run_backup(engine, sites, include_graphs=True, include_heatmap=True)
+
+        names = zf.namelist()
+        assert names[0] == "config.json"
+        assert names[-1] == MANIFEST_NAME
+        assert "ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf" in names
+        assert "ultrafeeder/10.0.0.1/graphs1090/rrd/localhost.tar.gz" in names
+        assert not any("internal_state" in n for n in names)
+
+        # gzip'ed files are stored as is, everything else gets deflated
+        assert zf.getinfo("ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("ultrafeeder/graphs1090/rrd/localhost.tar.gz").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("ultrafeeder/globe_history/2026/10/01/acas.csv").compress_type == zipfile.ZIP_DEFLATED
+
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+        assert not manifest["incremental"]
+        assert set(manifest["files"]) == set(names[:-1])
+        for name, entry in manifest["files"].items():
+            assert entry["sha256"] == hashlib.sha256(zf.read(name)).hexdigest()
+        assert (tmp_path / "state" / "manifest.json").exists()
+
+        progress = engine.progress()
+        assert progress["state"] == "done"
+        assert progress["files_done"] == progress["files_total"] == len(names) - 1
+        assert progress["writebacks_pending"] == 0
+
+    def test_incremental_skips_unchanged_heatmap_days(self, tmp_path):
+        """Test that an incremental backup leaves out unchanged heatmap days"""
+        adsb_path, sites = make_tree(tmp_path)
+        manifest_path = tmp_path / "manifest.json"
+        run_backup(BackupEngine(adsb_path, manifest_path), sites, include_heatmap=True)
+
+        new_day = sites[1][1] / "globe_history" / "2026" / "10" / "02"
+        new_day.mkdir(parents=True)
+        (new_day / "acas.csv").write_text("new")
+        changed = sites[0][1] / "globe_history" / "2026" / "10" / "01" / "acas.csv"
+        changed.write_text("changed")
+        os.utime(changed, ns=(0, time.time_ns() + 10**9))
+
+        engine = BackupEngine(adsb_path, manifest_path)
+        zf = run_backup(engine, sites, include_heatmap=True, incremental=True)
+        assert sorted(zf.namelist()) == sorted(
+            [
+                "config.json",
+                "ultrafeeder/globe_history/2026/10/01/acas.csv",
+                "ultrafeeder/10.0.0.1/globe_history/2026/10/02/acas.csv",
+                MANIFEST_NAME,
+            ]
+        )
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+        assert manifest["incremental"] and manifest["since"]
+        assert not manifest["files"]["ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf"]["included"]
+        assert engine.progress()["files_skipped"] == 3
+
+        # the skipped files stay in the manifest, so the next incremental backup has nothing to add
+        zf = run_backup(BackupEngine(adsb_path, manifest_path), sites, include_heatmap=True, incremental=True)
+        assert zf.namelist() == ["config.json", MANIFEST_NAME]
+
+    def test_config_only_backup_leaves_manifest_alone(self, tmp_path):
+        """Test that a config only backup doesn't touch the manifest"""
+        adsb_path, sites = make_tree(tmp_path)
+        manifest_path = tmp_path / "manifest.json"
+        zf = run_backup(BackupEngine(adsb_path, manifest_path), sites)
+        assert zf.namelist() == ["config.json", MANIFEST_NAME]
+        assert not manifest_path.exists()
+
+    def test_writebacks_run_concurrently(self, tmp_path):
+        """Test that the per site writebacks run concurrently"""
+        adsb_path, sites = make_tree(tmp_path, num_micro=5)
+        lock = threading.Lock()
+        counter = {"running": 0, "max": 0}
+
+        def slow_writeback(uf_path, idx):
+            with lock:
+                counter["running"] += 1
+                counter["max"] = max(counter["max"], counter["running"])
+            time.sleep(0.2)
+            with lock:
+                counter["running"] -= 1
+
+        start = time.monotonic()
+        run_backup(BackupEngine(adsb_path, tmp_path / "manifest.json", writeback=slow_writeback), sites, include_graphs=True)
+        assert time.monotonic() - start < 0.2 * len(sites) / 2
+        assert counter["max"] > 1
+
+    def test_aborted_download(self, tmp_path):
+        """Test that an aborted download is reported and doesn't write the manifest"""
+        adsb_path, sites = make_tree(tmp_path)
+
+        class Broken(io.BytesIO):
+            def write(self, b):
+                raise BrokenPipeError()
+
+        engine = BackupEngine(adsb_path, tmp_path / "manifest.json")
+        assert not engine.write(Broken(), sites, include_heatmap=True)
+        assert engine.progress()["state"] == "aborted"
+        assert not (tmp_path / "manifest.json").exists()
@@ -0,0 +1,126 @@
+"""
+Tests for utils.compose module
+"""
+from pathlib import Path
+
+import pytest
+
+from utils.compose import ComposeImpact, parse_compose_services
+
+REPO_ADSB_DIR = Path(__file__).parents[2] / "src/modules/adsb-feeder/filesystem/root/opt/adsb"
+
+FA_YML = """services:
+  piaware:
+    image: ${FA_CONTAINER}
+    container_name: piaware
+    ports:
+      - ${AF_PIAWAREMAP_PORT:-8081}:8080
+    environment:
+      - BEASTHOST=ultrafeeder
+      - FEEDER_ID=${FEEDER_PIAWARE_FEEDER_ID}
+      - LAT=${FEEDER_LAT}
+      # USER_PROVIDED_ENV_START
+      # USER_PROVIDED_ENV_END
+"""
+
+FA_1_YML = """services:
+  piaware_1:
+    image: ${FA_CONTAINER}
+    container_name: piaware_1
+    environment:
+      - FEEDER_ID=${FEEDER_PIAWARE_FEEDER_ID_1}
+      - LAT=${FEEDER_LAT_1}
+"""
+
+UF_YML = """services:
+  ultrafeeder:
+    image: ${ULTRAFEEDER_CONTAINER}
+    container_name: ultrafeeder
+    environment:
+      - LAT=${FEEDER_LAT}
+      - ULTRAFEEDER_CONFIG=${FEEDER_ULTRAFEEDER_CONFIG}
+networks:
+  adsb_im_bridge:
+    name: ${AF_NETWORK}
+"""
+
+SELECTORS = """COMPOSE_FILES=( "-f" "/opt/adsb/config/dozzle.yml" )
+if grep "AF_IS_FLIGHTAWARE_ENABLED=True" /opt/adsb/config/.env > /dev/null 2>&1 ; then
+    COMPOSE_FILES+=( "-f" "/opt/adsb/config/fa.yml" )
+fi
+NUM=$(grep AF_NUM_MICRO_SITES= /opt/adsb/config/.env | sed -n 's/.*=\\([0-9]\\+\\).*/\\1/p')
+for ((i = 1; i <= NUM; i++)); do
+    if grep "AF_IS_FLIGHTAWARE_ENABLED_${i}=True" /opt/adsb/config/.env > /dev/null 2>&1 ; then
+        COMPOSE_FILES+=( "-f" "/opt/adsb/config/fa_${i}.yml" )
+    fi
+done
+"""
+
+
+@pytest.fixture
+def impact(tmp_path):
+    config = tmp_path / "config"
+    config.mkdir()
+    (config / "fa.yml").write_text(FA_YML)
+    (config / "fa_1.yml").write_text(FA_1_YML)
+    (config / "docker-compose.yml").write_text(UF_YML)
+    # templates are never used directly
+    (config / "fa_stage2_template.yml").write_text(FA_1_YML.replace("_1", "_STAGE2NUM"))
+    selector_file = tmp_path / "default.docker-compose"
+    selector_file.write_text(SELECTORS)
+    return ComposeImpact(config_dir=config, selector_file=selector_file)
+
+
+class TestParseComposeServices:
+    """Test parse_compose_services"""
+
+    def test_parse_compose_services(self):
+        """Test the services and variables found in a compose file"""
+        services = parse_compose_services(FA_YML + UF_YML.replace("services:\n", ""))
+        assert set(services) == {"ultrafeeder", "piaware"}
+        container, variables = services["piaware"]
+        assert container == "piaware"
+        assert variables == {"FA_CONTAINER", "AF_PIAWAREMAP_PORT", "FEEDER_PIAWARE_FEEDER_ID", "FEEDER_LAT"}
+        # top level sections other than services are ignored
+        assert "AF_NETWORK" not in services["ultrafeeder"][1]
+
+    def test_parse_shipped_compose_files(self):
+        """Test that the compose files we ship can be parsed"""
+        # make sure the simple parser copes with the yml files we actually ship
+        for yml in REPO_ADSB_DIR.glob("*.yml"):
+            services = parse_compose_services(yml.read_text())
+            assert services, yml.name
+            for service, (container, variables) in services.items():
+                assert container and " " not in service, yml.name
+
+
+class TestComposeImpact:
+    """Test ComposeImpact.services_for"""
+
+    def test_services_for_single_aggregator(self, impact):
+        """Test that changing one aggregator's variables only affects its containers"""
+        running = ["ultrafeeder", "piaware", "piaware_1"]
+        assert impact.services_for({"FEEDER_PIAWARE_FEEDER_ID"}, running) == {"piaware"}
+        assert impact.services_for({"FEEDER_PIAWARE_FEEDER_ID_1"}, running) == {"piaware_1"}
+        assert impact.services_for({"FEEDER_LAT"}, running) == {"piaware", "ultrafeeder"}
+        # not used by any service
+        assert impact.services_for({"AF_SOMETHING_ELSE"}, running) == set()
+
+    def test_services_for_only_running(self, impact):
+        """Test that only running containers are returned"""
+        assert impact.services_for({"FEEDER_LAT"}, ["ultrafeeder"]) == {"ultrafeeder"}
+
+    def test_services_for_selector_needs_full_start(self, impact):
+        """Test that variables selecting services need a full start"""
+        running = ["ultrafeeder", "piaware", "piaware_1"]
+        assert impact.services_for({"FEEDER_LAT", "AF_IS_FLIGHTAWARE_ENABLED"}, running) is None
+        assert impact.services_for({"AF_IS_FLIGHTAWARE_ENABLED_3"}, running) is None
+        assert impact.services_for({"AF_NUM_MICRO_SITES"}, running) is None
+        assert impact.services_for({"_ADSBIM_STATE_EXTRA_ENV"}, running) is None
+
+    def test_services_for_picks_up_new_files(self, impact, tmp_path):
+        """Test that new compose files are picked up"""
+        running = ["ultrafeeder", "piaware", "piaware_1", "piaware_2"]
+        assert impact.services_for({"FEEDER_LAT_2"}, running) == set()
+        (tmp_path / "config" / "fa_2.yml").write_text(FA_1_YML.replace("_1", "_2"))
+        assert impact.services_for({"FEEDER_LAT_2"}, running) == {"piaware_2"}
@@ -12,7 +12,10 @@ import pytest
 
 from utils.paths import ADSB_CONFIG_DIR, ENV_FILE, USER_ENV_FILE, CONFIG_JSON_FILE
 from utils.config import (
+    config_cache_stats,
     config_lock,
+    config_transaction,
+    config_write_stats,
     read_values_from_config_json,
     read_values_from_env_file,
     write_values_to_config_json,
@@ -118,6 +121,150 @@ class TestWriteValuesToConfigJson:
         # Should not raise exception, just log error
 
 
+class TestConfigCache:
+    """Test the stat validated config.json cache"""
+
+    def test_cache_hit_without_reparse(self, adsb_test_env):
+        """Test that unchanged files are not parsed again, no matter how much time passed"""
+        write_values_to_config_json({"CACHE_TEST": "one"}, reason="test")
+        before = config_cache_stats()
+
+        with patch('json.load') as mock_json_load, patch('utils.config.time.time', return_value=1e12):
+            for _ in range(5):
+                assert read_values_from_config_json()["CACHE_TEST"] == "one"
+            mock_json_load.assert_not_called()
+
+        after = config_cache_stats()
+        assert after["hits"] == before["hits"] + 5
+        assert after["reparses"] == before["reparses"]
+
+    def test_external_change_is_detected(self, adsb_test_env):
+        """Test that a file replaced by another writer is parsed again right away"""
+        write_values_to_config_json({"CACHE_TEST": "one"}, reason="test")
+        assert read_values_from_config_json()["CACHE_TEST"] == "one"
+        before = config_cache_stats()
+
+        # same size, replaced via rename like our scripts do
+        tmp = Path(str(CONFIG_JSON_FILE) + ".tmp")
+        tmp.write_text(json.dumps({"CACHE_TEST": "two"}))
+        os.rename(tmp, CONFIG_JSON_FILE)
+
+        assert read_values_from_config_json()["CACHE_TEST"] == "two"
+        assert config_cache_stats()["reparses"] == before["reparses"] + 1
+
+    def test_no_cache_forces_parse(self, adsb_test_env):
+        """Test that no_cache=True always parses the file"""
+        write_values_to_config_json({"CACHE_TEST": "one"}, reason="test")
+        before = config_cache_stats()
+        read_values_from_config_json(no_cache=True)
+        assert config_cache_stats()["misses"] == before["misses"] + 1
+
+
+class TestConfigTransaction:
+    """Test config_transaction batching of config.json writes"""
+
+    def test_transaction_single_write(self, adsb_test_env):
+        """Test that all writes inside a transaction end up in one file write"""
+        values = read_values_from_config_json(no_cache=True)
+        saved_before = config_write_stats()["writes_saved"]
+
+        with patch('os.rename', wraps=os.rename) as mock_rename:
+            with config_transaction("test"):
+                for i in range(5):
+                    values = read_values_from_config_json()
+                    values[f"TXN_TEST_{i}"] = i
+                    write_values_to_config_json(values, reason=f"TXN_TEST_{i}")
+                # nothing was written yet, but reads see the pending values
+                assert mock_rename.call_count == 0
+                assert read_values_from_config_json(no_cache=True)["TXN_TEST_4"] == 4
+
+            assert mock_rename.call_count == 1
+
+        assert config_write_stats()["writes_saved"] == saved_before + 4
+        with open(CONFIG_JSON_FILE) as f:
+            on_disk = json.load(f)
+        assert all(on_disk[f"TXN_TEST_{i}"] == i for i in range(5))
+
+    def test_nested_transaction(self, adsb_test_env):
+        """Test that only the outermost transaction writes the file"""
+        with patch('os.rename', wraps=os.rename) as mock_rename:
+            with config_transaction("outer"):
+                with config_transaction("inner"):
+                    values = read_values_from_config_json()
+                    values["TXN_NESTED"] = "inner"
+                    write_values_to_config_json(values, reason="inner")
+                assert mock_rename.call_count == 0
+                assert config_write_stats()["in_transaction"]
+            assert mock_rename.call_count == 1
+        assert not config_write_stats()["in_transaction"]
+
+    def test_transaction_without_changes(self, adsb_test_env):
+        """Test that an empty transaction doesn't write the file"""
+        with patch('os.rename', wraps=os.rename) as mock_rename:
+            with config_transaction("empty"):
+                read_values_from_config_json()
+            mock_rename.assert_not_called()
+
+    def test_transaction_flushes_on_exception(self, adsb_test_env):
+        """Test that changes are still written if the block raises"""
+        with pytest.raises(ValueError):
+            with config_transaction("exception"):
+                values = read_values_from_config_json()
+                values["TXN_EXCEPTION"] = "written"
+                write_values_to_config_json(values, reason="exception")
+                raise ValueError("boom")
+        with open(CONFIG_JSON_FILE) as f:
+            assert json.load(f)["TXN_EXCEPTION"] == "written"
+
+
+    def test_transactions_are_per_thread(self, adsb_test_env):
+        """Test that a transaction in one thread doesn't hold back the writes of other threads"""
+        write_values_to_config_json({"TXN_A": "old", "TXN_B": "old"}, reason="test")
+        opened = threading.Event()
+        release = threading.Event()
+
+        def other_thread():
+            with config_transaction("other"):
+                values = read_values_from_config_json()
+                values["TXN_A"] = "other"
+                write_values_to_config_json(values, reason="TXN_A")
+                opened.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        assert opened.wait(5)
+        # not in a transaction here: written right away, without the other thread's pending change
+        values = read_values_from_config_json()
+        assert values["TXN_A"] == "old"
+        values["TXN_B"] = "main"
+        write_values_to_config_json(values, reason="TXN_B")
+        with open(CONFIG_JSON_FILE) as f:
+            assert json.load(f) == {"TXN_A": "old", "TXN_B": "main"}
+        release.set()
+        thread.join()
+        # and the commit of the other thread keeps our change
+        with open(CONFIG_JSON_FILE) as f:
+            assert json.load(f) == {"TXN_A": "other", "TXN_B": "main"}
+
+    def test_commit_keeps_changes_made_on_disk(self, adsb_test_env):
+        """Test that a commit only writes the keys the transaction changed (e.g. config.json was restored meanwhile)"""
+        write_values_to_config_json({"TXN_MINE": "old", "TXN_RESTORED": "old"}, reason="test")
+        with config_transaction("test"):
+            values = read_values_from_config_json()
+            values["TXN_MINE"] = "new"
+            write_values_to_config_json(values, reason="TXN_MINE")
+            # config.json gets replaced behind our back
+            fd, tmp = tempfile.mkstemp(dir=str(ADSB_CONFIG_DIR))
+            with os.fdopen(fd, "w") as f:
+                json.dump({"TXN_MINE": "old", "TXN_RESTORED": "restored", "TXN_EXTRA": 1}, f)
+            os.rename(tmp, CONFIG_JSON_FILE)
+            # reads inside the transaction see both
+            assert read_values_from_config_json() == {"TXN_MINE": "new", "TXN_RESTORED": "restored", "TXN_EXTRA": 1}
+        with open(CONFIG_JSON_FILE) as f:
+            assert json.load(f) == {"TXN_MINE": "new", "TXN_RESTORED": "restored", "TXN_EXTRA": 1}
+
+
 class TestReadValuesFromEnvFile:
     """Test read_values_from_env_file function"""
 
@@ -136,6 +136,59 @@ class TestDataClass:
         assert env_values1 == env_values2
         assert env_values1["TEST_VAR"] == env_values2["TEST_VAR"]
 
+    def test_transaction_batches_env_writes(self, adsb_test_env):
+        """Test that Env changes inside Data.transaction() result in a single config.json write"""
+        import json
+        import os
+
+        reset_data_singleton()
+        write_values_to_config_json({"TXN_LIST": ["a"], "TXN_VALUE": "old"}, reason="test")
+
+        list_env = Env("TXN_LIST", default=[""], tags=["txn_list"])
+        value_env = Env("TXN_VALUE", tags=["txn_value"])
+        data = Data()
+        saved_before = data.config_write_stats["writes_saved"]
+
+        with patch("os.rename", wraps=os.rename) as mock_rename:
+            with data.transaction("test"):
+                for i in range(4):
+                    list_env.list_set(i, f"site{i}")
+                value_env.value = "new"
+                assert mock_rename.call_count == 0
+            assert mock_rename.call_count == 1
+
+        assert data.config_write_stats["writes_saved"] == saved_before + 4
+        with open(data.config_path / "config.json") as f:
+            on_disk = json.load(f)
+        assert on_disk["TXN_LIST"] == ["site0", "site1", "site2", "site3"]
+        assert on_disk["TXN_VALUE"] == "new"
+
+    def test_envfile_changes(self, adsb_test_env):
+        """Test that the .env values are only regenerated for relevant changes"""
+        reset_data_singleton()
+        data = Data()
+        values, changed = data.envfile_changes(force=True)
+        assert data.envfile_changes() == (None, set())
+
+        # a change to an Env that ends up in the .env file
+        lat = data.env_by_tags("lat")
+        lat.list_set(0, "12.345" if lat.list_get(0) != "12.345" else "23.456")
+        values, changed = data.envfile_changes()
+        assert changed == {"FEEDER_LAT"}
+        assert values is not None and values["FEEDER_LAT"] == lat.list_get(0)
+
+        # _ADSBIM_STATE variables are not in the .env file
+        state_env = Env("_ADSBIM_STATE_ENVFILE_TEST", default="", tags=["envfile_test"])
+        data._env.add(state_env)
+        state_env.value = "changed"
+        assert data.envfile_changes() == (None, set())
+
+        # but the extra env vars are, as they are written to .env.user
+        extra_env = data.env_by_tags("ultrafeeder_extra_env")
+        extra_env.value = "FOO=bar" if extra_env.value != "FOO=bar" else "FOO=baz"
+        values, changed = data.envfile_changes()
+        assert changed == {"_ADSBIM_STATE_EXTRA_ENV"}
+
     def test_env_by_tags(self, adsb_test_env):
         """Test env_by_tags method with real Env instances"""
         reset_data_singleton()
@@ -258,6 +311,67 @@ class TestDataClass:
         with pytest.raises(Exception, match="No Env for tags"):
             data.list_is_enabled("nonexistent", idx=0)
 
+    def test_is_enabled_does_not_modify_tags(self, adsb_test_env):
+        """Test that is_enabled / list_is_enabled leave the caller's tag list alone"""
+        reset_data_singleton()
+        data = Data()
+        data._env.add(Env("UNMODIFIED_TAGS", default=[False], tags=["unmodified_tags", "is_enabled"]))
+
+        tags = ["unmodified_tags"]
+        data.is_enabled(tags)
+        data.list_is_enabled(tags, 1)
+        assert tags == ["unmodified_tags"]
+
+    def test_env_index(self, adsb_test_env):
+        """Test name and tag lookups, including Envs added after the index was built"""
+        reset_data_singleton()
+        data = Data()
+        assert data.env("FEEDER_LAT") is data.env_by_tags("lat")
+        assert data.env("DOES_NOT_EXIST") is None
+
+        late_env = Env("LATE_ADDED_ENV", tags=["late_added", "index_test"])
+        data._env.add(late_env)
+        assert data.env("LATE_ADDED_ENV") is late_env
+        assert data.env_by_tags(["index_test", "late_added"]) is late_env
+        with pytest.raises(Exception, match="No Env for tags"):
+            data.env_by_tags(["late_added", "not_a_tag"])
+
+    @pytest.mark.benchmark
+    def test_index_benchmark_stage2(self, adsb_test_env):
+        """Micro-benchmark: lookups for a stage2 with 20 microsites vs. a linear scan"""
+        import time
+
+        reset_data_singleton()
+        data = Data()
+        enabled_tags = sorted({t for e in data._env if e.is_list and e.is_bool for t in e.tags if t != "is_enabled"})
+        names = sorted(e.name for e in data._env)
+
+        def linear_env_by_tags(tags):
+            return [e for e in data._env if all(t in e.tags for t in tags)][0]
+
+        def linear_env(name):
+            return [e for e in data._env if e.name == name][0]
+
+        start = time.perf_counter()
+        for idx in range(21):
+            for tag in enabled_tags:
+                linear_env_by_tags([tag, "is_enabled"])
+            for name in names:
+                linear_env(name)
+        linear_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for idx in range(21):
+            data._env_by_tags_dict.clear()  # measure the index, not the cache
+            for tag in enabled_tags:
+                data.env_by_tags([tag, "is_enabled"])
+            for name in names:
+                data.env(name)
+        index_time = time.perf_counter() - start
+
+        print(f"20 microsites, {len(enabled_tags)} tags, {len(names)} names: linear {linear_time:.4f}s index {index_time:.4f}s")
+        assert index_time < linear_time
+
     def test_list_get(self, adsb_test_env):
         """Test list_get method on Env instance"""
         reset_data_singleton()
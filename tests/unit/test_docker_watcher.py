@@ -0,0 +1,173 @@
+"""
+Tests for utils.docker_watcher module, using a fake Docker Engine API on a unix socket
+"""
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from utils.docker_watcher import ContainerState, DockerWatcher, parse_docker_time
+
+CONTAINERS = [
+    {"Id": "aaa", "Names": ["/ultrafeeder"], "State": "running", "Status": "Up 2 hours (healthy)"},
+    {"Id": "bbb", "Names": ["/piaware"], "State": "exited", "Status": "Exited (0) 5 minutes ago"},
+]
+
+INSPECT = {
+    "aaa": {
+        "Name": "/ultrafeeder",
+        "State": {"Status": "running", "StartedAt": "2024-05-01T12:00:00.123456789Z", "Health": {"Status": "healthy"}},
+    },
+}
+
+
+class FakeDocker:
+    """Minimal Docker Engine API: container list, inspect and an event stream fed by the test."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.requests: list[str] = []
+        self.event_conns: list[socket.socket] = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(5)
+        self.running = True
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = conn.recv(4096)
+            if not chunk:
+                conn.close()
+                return
+            data += chunk
+        path = data.split(b" ")[1].decode()
+        self.requests.append(path)
+        if path.startswith("/events"):
+            conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n")
+            self.event_conns.append(conn)
+            return
+        if path.startswith("/containers/json"):
+            body = CONTAINERS
+        else:
+            body = INSPECT.get(path.split("/")[2])
+        if body is None:
+            conn.sendall(b"HTTP/1.0 404 Not Found\r\n\r\n")
+        else:
+            conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n" + json.dumps(body).encode())
+        conn.close()
+
+    def event(self, action, name, time_nano=0, **attributes):
+        event = {"Type": "container", "Action": action, "Actor": {"ID": "x", "Attributes": {"name": name, **attributes}}}
+        if time_nano:
+            event["timeNano"] = time_nano
+        for conn in self.event_conns:
+            conn.sendall(json.dumps(event).encode() + b"\n")
+
+    def close(self):
+        self.running = False
+        for conn in self.event_conns:
+            conn.close()
+        self.server.close()
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def fake_docker():
+    # unix socket paths are limited to ~100 characters, so don't use pytest's tmp_path
+    tmpdir = tempfile.mkdtemp(prefix="dw")
+    docker = FakeDocker(str(Path(tmpdir) / "docker.sock"))
+    yield docker
+    docker.close()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@pytest.fixture
+def watcher(fake_docker):
+    w = DockerWatcher(socket_path=Path(fake_docker.path), reconnect_delay=0.05)
+    w.start()
+    assert wait_for(lambda: w.connected)
+    yield w
+    w.stop()
+
+
+class TestDockerWatcher:
+    """Test DockerWatcher"""
+
+    def test_parse_docker_time(self):
+        """Test parsing the timestamps docker returns"""
+        assert parse_docker_time("2024-05-01T12:00:00Z") == 1714564800.0
+        assert parse_docker_time("2024-05-01T12:00:00.5Z") == 1714564800.5
+        assert parse_docker_time("2024-05-01T12:00:00.123456789Z") == pytest.approx(1714564800.123456)
+        assert parse_docker_time("0001-01-01T00:00:00Z") == 0.0
+        assert parse_docker_time("") == 0.0
+
+    def test_initial_state(self, watcher, fake_docker):
+        """Test the container states after the initial listing"""
+        assert watcher.get("ultrafeeder") == ContainerState("running", pytest.approx(1714564800.123456), "healthy")
+        assert watcher.get("piaware") == ContainerState("exited", 0.0, "")
+        assert watcher.get("fr24") is None
+        # only the running container gets inspected
+        assert "/containers/aaa/json" in fake_docker.requests
+        assert "/containers/bbb/json" not in fake_docker.requests
+        assert any(r.startswith("/events?since=") for r in fake_docker.requests)
+
+    def test_events_update_state(self, watcher, fake_docker):
+        """Test that docker events update the container states"""
+        fake_docker.event("start", "piaware", time_nano=1714564900_000000000)
+        assert wait_for(lambda: watcher.get("piaware").state == "running")
+        assert watcher.get("piaware").started_at == 1714564900.0
+
+        fake_docker.event("health_status: unhealthy", "ultrafeeder")
+        assert wait_for(lambda: watcher.get("ultrafeeder").health == "unhealthy")
+
+        fake_docker.event("die", "ultrafeeder")
+        assert wait_for(lambda: watcher.get("ultrafeeder").state == "exited")
+
+        fake_docker.event("rename", "piaware_new", oldName="/piaware")
+        assert wait_for(lambda: watcher.get("piaware_new") is not None)
+        assert watcher.get("piaware") is None
+
+        fake_docker.event("destroy", "piaware_new")
+        assert wait_for(lambda: watcher.get("piaware_new") is None)
+
+    def test_reconnect(self, watcher, fake_docker):
+        """Test that the watcher reconnects when the event stream ends"""
+        conns = list(fake_docker.event_conns)
+        fake_docker.event_conns.clear()
+        for conn in conns:
+            conn.close()
+        # the watcher notices the closed stream, lists the containers again and resubscribes
+        assert wait_for(lambda: len(fake_docker.event_conns) == 1)
+        assert wait_for(lambda: watcher.connected)
+        assert sum(r.startswith("/containers/json") for r in fake_docker.requests) == 2
+
+    def test_no_docker(self):
+        """Test the watcher without a docker socket"""
+        w = DockerWatcher(socket_path=Path("/nonexistent/docker.sock"), reconnect_delay=0.05)
+        w.start()
+        time.sleep(0.2)
+        assert not w.connected
+        w.stop()
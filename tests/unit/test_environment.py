@@ -102,6 +102,25 @@ class TestEnvClass:
         # Should have read value from file
         assert env.value == "file_value"
 
+    def test_preload_skips_config_read(self, adsb_test_env):
+        """Test that Envs created while values are preloaded don't read config.json"""
+        write_values_to_config_json({"TEST_VAR": "file_value"}, reason="test")
+
+        try:
+            Env.preload({"TEST_VAR": "preloaded_value", "TEST_LIST": ["a", "b"]})
+            with patch("utils.environment.read_values_from_config_json") as mock_read:
+                env = Env("TEST_VAR", default="default_value")
+                list_env = Env("TEST_LIST", default=[""])
+                mock_read.assert_not_called()
+        finally:
+            Env.preload(None)
+
+        assert env.value == "preloaded_value"
+        assert list_env.value == ["a", "b"]
+
+        # without preloaded values, Envs read the file again
+        assert Env("TEST_VAR", default="default_value").value == "file_value"
+
     def test_reconcile_no_file_value(self, adsb_test_env):
         """Test _reconcile when no value in file - writes to config when using setter"""
         import importlib
@@ -403,6 +422,45 @@ class TestEnvClass:
         # Should still work, but value would be None/default
         assert env.is_mandatory is True
 
+    def test_env_generation(self, adsb_test_env):
+        """Test that the generation changes with every actual change"""
+        env = Env("GEN_VAR", default="a")
+        list_env = Env("GEN_LIST", default=[""])
+        generation = Env.generation()
+
+        env.value = "a"
+        list_env.list_set(0, "")
+        assert Env.generation() == generation
+
+        env.value = "b"
+        assert Env.generation() > generation
+        generation = Env.generation()
+        list_env.list_set(1, "x")
+        assert Env.generation() > generation
+
+    def test_env_generation_after_pull(self, adsb_test_env):
+        """Test that pulling a changed value from the file (like a restore does) changes the generation"""
+        env = Env("GEN_PULL", default="a")
+        list_env = Env("GEN_PULL_LIST", default=[""])
+        generation = Env.generation()
+
+        Env.preload({"GEN_PULL": "a", "GEN_PULL_LIST": [""]})
+        try:
+            env._reconcile(env._value, pull=True)
+            list_env._reconcile(list_env._value, pull=True)
+            assert Env.generation() == generation
+
+            Env.preload({"GEN_PULL": "b", "GEN_PULL_LIST": ["", "x"]})
+            env._reconcile(env._value, pull=True)
+            assert env.value == "b"
+            assert Env.generation() > generation
+            generation = Env.generation()
+            list_env._reconcile(list_env._value, pull=True)
+            assert list_env.value == ["", "x"]
+            assert Env.generation() > generation
+        finally:
+            Env.preload(None)
+
     def test_env_value_call(self, adsb_test_env):
         """Test env with value_call"""
         import importlib
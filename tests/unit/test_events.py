@@ -0,0 +1,89 @@
+"""
+Tests for utils.events module
+"""
+import json
+import threading
+
+from utils.events import EventHub
+
+
+def parse(frame):
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    return json.loads(frame[len("data: ") :])
+
+
+class TestEventHub:
+    """Test EventHub"""
+
+    def test_publish_only_changes(self):
+        """Test that publishing an unchanged value creates no event"""
+        hub = EventHub()
+        assert hub.publish("temperatures", {"cpu": "45"})
+        assert not hub.publish("temperatures", {"cpu": "45"})
+        assert hub.publish("temperatures", {"cpu": "46"})
+        assert hub.version == 2
+        assert hub.get("temperatures") == {"cpu": "46"}
+
+    def test_changes_since(self):
+        """Test getting the changes after an event id"""
+        hub = EventHub()
+        hub.publish("a", 1)
+        version, changes = hub.changes_since(0)
+        assert changes == {"a": 1}
+        hub.publish("b", 2)
+        hub.publish("a", 1)  # unchanged
+        version, changes = hub.changes_since(version)
+        assert changes == {"b": 2}
+        assert hub.changes_since(version) == (version, {})
+
+    def test_stream_sends_snapshot_then_deltas(self):
+        """Test that a stream starts with a snapshot and then sends the changes"""
+        hub = EventHub(keepalive=0.05)
+        hub.publish("status/adsblol/0", {"beast": "good", "mlat": "good"})
+        hub.publish("temperatures", {"cpu": "45"})
+
+        stream = hub.stream()
+        assert next(stream).startswith("retry:")
+        assert hub.subscribers == 1
+        assert parse(next(stream)) == {"status/adsblol/0": {"beast": "good", "mlat": "good"}, "temperatures": {"cpu": "45"}}
+
+        # nothing changed: a keepalive comment
+        assert next(stream) == ": keepalive\n\n"
+
+        hub.publish("temperatures", {"cpu": "46"})
+        hub.publish("temperatures", {"cpu": "46"})
+        assert parse(next(stream)) == {"temperatures": {"cpu": "46"}}
+
+        stream.close()
+        assert hub.subscribers == 0
+
+    def test_stream_wakes_up_on_publish(self):
+        """Test that a waiting stream wakes up when something is published"""
+        hub = EventHub(keepalive=10)
+        stream = hub.stream()
+        next(stream)  # retry
+        result = []
+
+        def reader():
+            result.append(next(stream))
+
+        t = threading.Thread(target=reader)
+        t.start()
+        assert hub.wait_for_subscribers(timeout=1)
+        hub.publish("stage2_stats", [{"pps": 10}])
+        t.join(timeout=2)
+        assert not t.is_alive()
+        assert parse(result[0]) == {"stage2_stats": [{"pps": 10}]}
+        stream.close()
+
+    def test_close_ends_stream(self):
+        """Test that close() ends the streams"""
+        hub = EventHub(keepalive=10)
+        stream = hub.stream()
+        next(stream)
+        t = threading.Thread(target=lambda: list(stream))
+        t.start()
+        hub.close()
+        t.join(timeout=2)
+        assert not t.is_alive()
+        assert not hub.wait_for_subscribers(timeout=0.1)
@@ -0,0 +1,101 @@
+"""
+Tests for utils.http_client module
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.http_client import HttpClient, fan_out
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.peers.add(self.client_address)
+        if self.path == "/slow":
+            time.sleep(0.3)
+        status = 500 if self.path == "/fail" else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=abc")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.peers = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestHttpClient:
+    """Test HttpClient"""
+
+    def test_connections_are_reused(self, server):
+        """Test that requests to a host reuse the connection and keep no cookies"""
+        client = HttpClient()
+        url = f"http://127.0.0.1:{server.server_port}/"
+        for _ in range(5):
+            assert client.request("GET", url).json() == {"ok": True}
+        # all five requests went over the same keep-alive connection
+        assert len(server.peers) == 1
+        # and no cookies were kept from one request to the next
+        assert len(client.session.cookies) == 0
+        client.close()
+
+    def test_stats_per_host(self, server):
+        """Test the per host request and error counts"""
+        client = HttpClient(timeout=2.0)
+        host = f"127.0.0.1:{server.server_port}"
+        client.request("GET", f"http://{host}/")
+        client.request("GET", f"http://{host}/fail")
+        with pytest.raises(requests.ConnectionError):
+            client.request("GET", "http://127.0.0.1:1/")
+        stats = client.stats()
+        assert stats[host]["requests"] == 2
+        assert stats[host]["errors"] == 1
+        assert stats[host]["last_status"] == 500
+        assert stats[host]["last_error"] == "HTTP 500"
+        assert stats["127.0.0.1:1"]["errors"] == 1
+        assert stats["127.0.0.1:1"]["last_error"] == "ConnectionError"
+        assert "total_ms" not in stats[host]
+        client.close()
+
+    def test_default_timeout(self, server):
+        """Test the default timeout and overriding it"""
+        client = HttpClient(timeout=0.1)
+        with pytest.raises(requests.Timeout):
+            client.request("GET", f"http://127.0.0.1:{server.server_port}/slow")
+        # an explicit timeout wins over the default
+        assert client.request("GET", f"http://127.0.0.1:{server.server_port}/slow", timeout=2.0).status_code == 200
+        client.close()
+
+
+class TestFanOut:
+    """Test fan_out"""
+
+    def test_fan_out_takes_as_long_as_the_slowest(self):
+        """Test that fan_out runs the calls concurrently and keeps the order"""
+        def work(n):
+            time.sleep(0.2)
+            return n * 2
+
+        start = time.monotonic()
+        assert fan_out(work, range(6)) == [0, 2, 4, 6, 8, 10]
+        assert time.monotonic() - start < 0.6
+        assert fan_out(work, []) == []
+        assert fan_out(work, [3]) == [6]
@@ -0,0 +1,82 @@
+"""
+Tests for utils.icao_set module
+"""
+import base64
+import gzip
+import json
+import random
+import sys
+
+import pytest
+
+from utils.icao_set import IcaoSet
+
+
+class TestIcaoSet:
+    """Test IcaoSet"""
+
+    def test_from_hex_skips_non_icao(self):
+        """Test that from_hex skips anything that isn't an ICAO hex id"""
+        s = IcaoSet.from_hex(["a1b2c3", "~123456", "000001", "A1B2C3", "", "zzz"])
+        assert len(s) == 2
+        assert 0xA1B2C3 in s
+        assert 1 in s
+        assert "a1b2c3" not in s
+        assert s.hex() == ["000001", "a1b2c3"]
+
+    def test_merge_insert_keeps_sorted_and_unique(self):
+        """Test that adding ids keeps the set sorted and unique"""
+        s = IcaoSet([5, 1, 3])
+        s |= IcaoSet([4, 3, 0xFFFFFF])
+        s.add(2)
+        s.add(2)
+        assert list(s) == [1, 2, 3, 4, 5, 0xFFFFFF]
+
+        # large batches are merged in one pass
+        big = IcaoSet(range(0, 4000, 2))
+        s |= big
+        assert len(s) == len(set(range(0, 4000, 2)) | {1, 3, 5, 0xFFFFFF})
+        assert list(s) == sorted(s)
+
+    def test_union_of_sites(self):
+        """Test the union of the sets of several sites"""
+        a = IcaoSet([1, 2, 3])
+        b = IcaoSet([3, 4])
+        c = IcaoSet()
+        assert list(IcaoSet.union(a, b, c)) == [1, 2, 3, 4]
+        assert list(IcaoSet.union()) == []
+
+    def test_bytes_round_trip(self):
+        """Test encoding to bytes and back"""
+        for values in ([], [0], [0xFFFFFF], [1, 2, 3, 0x800000, 0xFFFFFE]):
+            s = IcaoSet(values)
+            assert IcaoSet.from_bytes(s.to_bytes()) == s
+
+    @pytest.mark.benchmark
+    def test_compact_vs_json_benchmark(self):
+        """Micro-benchmark: a busy day (~20000 aircraft) as a set of hex strings + JSON/gzip vs. IcaoSet + varints"""
+        import time
+
+        rng = random.Random(42)
+        hexes = {f"{rng.randrange(1 << 24):06x}" for _ in range(20000)}
+
+        start = time.perf_counter()
+        legacy = gzip.compress(json.dumps({"planes": [list(hexes)]}).encode())
+        loaded = set(json.loads(gzip.decompress(legacy))["planes"][0])
+        json_time = time.perf_counter() - start
+        set_mem = sys.getsizeof(hexes) + sum(sys.getsizeof(h) for h in hexes)
+
+        compact = IcaoSet.from_hex(hexes)
+        start = time.perf_counter()
+        blob = gzip.compress(json.dumps({"planes_v2": [base64.b64encode(compact.to_bytes()).decode()]}).encode())
+        reloaded = IcaoSet.from_bytes(base64.b64decode(json.loads(gzip.decompress(blob))["planes_v2"][0]))
+        compact_time = time.perf_counter() - start
+
+        assert reloaded == compact
+        assert set(reloaded.hex()) == loaded
+        print(
+            f"{len(compact)} aircraft: set {set_mem} bytes, json.gz {len(legacy)} bytes in {json_time:.4f}s; "
+            f"IcaoSet {compact.nbytes} bytes, varint.gz {len(blob)} bytes in {compact_time:.4f}s"
+        )
+        assert compact.nbytes * 10 < set_mem
+        assert len(blob) < len(legacy)
@@ -0,0 +1,128 @@
+"""
+Tests for utils.logtail module
+"""
+import threading
+import time
+
+from utils.logtail import LogFollower, parse_last_event_id
+
+
+def events(chunks):
+    """Split the SSE output into (id, [data lines]) tuples, ignoring retry and comments."""
+    result = []
+    for chunk in chunks:
+        if not chunk.startswith("id: "):
+            continue
+        lines = chunk.strip("\n").split("\n")
+        result.append((int(lines[0][4:]), [line[6:] for line in lines[1:]]))
+    return result
+
+
+class TestLogFollower:
+    """Test LogFollower"""
+
+    def test_starts_at_the_tail_and_strips_ansi(self, tmp_path):
+        """Test that following starts at the end of the file and strips ANSI codes"""
+        log = tmp_path / "test.log"
+        log.write_text("".join(f"old line {i}\n" for i in range(1000)) + "\x1b[32mgreen\x1b[0m\n")
+        follower = LogFollower(str(log), tail_bytes=100)
+        assert follower.read() > 0
+        lines = [line for _, line in follower.lines_since(None)]
+        # only the tail was read, starting at a full line
+        assert len(lines) < 15
+        assert lines[-1] == "green"
+        assert all(line.startswith("old line ") for line in lines[:-1])
+
+        # partial lines wait for their newline
+        with open(log, "a") as f:
+            f.write("half a")
+        assert follower.read() == 0
+        with open(log, "a") as f:
+            f.write(" line\n")
+        assert follower.read() == 1
+        assert follower.lines_since(follower.last_id - 1) == [(follower.last_id, "half a line")]
+
+    def test_ring_buffer_and_resume(self, tmp_path):
+        """Test the ring buffer, resuming after an event id and a truncated log"""
+        log = tmp_path / "test.log"
+        log.write_text("".join(f"line {i}\n" for i in range(10)))
+        follower = LogFollower(str(log), max_lines=5)
+        follower.read()
+        assert [line for _, line in follower.lines_since(None)] == [f"line {i}" for i in range(5, 10)]
+        last = follower.last_id
+        assert follower.lines_since(last - 2) == [(last - 1, "line 8"), (last, "line 9")]
+        assert follower.lines_since(last) == []
+        # too old or from before a restart: everything that's there
+        assert len(follower.lines_since(1)) == 5
+        assert len(follower.lines_since(last + 100)) == 5
+
+        # truncated log starts over from the beginning
+        log.write_text("new\n")
+        follower.read()
+        assert follower.lines_since(last) == [(last + 1, "new")]
+
+    def test_stream_shared_by_clients(self, tmp_path):
+        """Test that several clients share one reader"""
+        log = tmp_path / "test.log"
+        log.write_text("first\n")
+        follower = LogFollower(str(log), poll=0.05)
+        stop = threading.Event()
+        outputs = [[], []]
+
+        def client(out, last_id=None):
+            for chunk in follower.stream(last_id, keep_going=lambda: not stop.is_set()):
+                out.append(chunk)
+
+        threads = [threading.Thread(target=client, args=(out,)) for out in outputs]
+        for t in threads:
+            t.start()
+        for _ in range(50):
+            if follower.subscribers == 2:
+                break
+            time.sleep(0.02)
+        with open(log, "a") as f:
+            f.write("second\nthird\n")
+        for _ in range(100):
+            if all(sum(len(lines) for _, lines in events(out)) == 3 for out in outputs):
+                break
+            time.sleep(0.02)
+        stop.set()
+        for t in threads:
+            t.join(5)
+        for out in outputs:
+            assert out[0].startswith("retry:")
+            assert [line for _, lines in events(out) for line in lines] == ["first", "second", "third"]
+        assert follower.subscribers == 0
+
+        # a client coming back with the last id it saw only gets what's new
+        with open(log, "a") as f:
+            f.write("fourth\n")
+        last_id = events(outputs[0])[-1][0]
+        out = list(follower.stream(last_id, keep_going=lambda: False))
+        assert events(out) == [(last_id + 1, ["fourth"])]
+
+    def test_close_ends_stream(self, tmp_path):
+        """Test that close() ends the streams"""
+        log = tmp_path / "test.log"
+        log.write_text("first\n")
+        follower = LogFollower(str(log), poll=0.05)
+        stream = follower.stream()
+        next(stream)
+        t = threading.Thread(target=lambda: list(stream))
+        t.start()
+        time.sleep(0.1)
+        follower.close()
+        t.join(timeout=2)
+        assert not t.is_alive()
+        assert follower.subscribers == 0
+
+
+class TestParseLastEventId:
+    """Test parse_last_event_id"""
+
+    def test_parse_last_event_id(self):
+        """Test valid and invalid Last-Event-ID values"""
+        assert parse_last_event_id("42") == 42
+        assert parse_last_event_id("") is None
+        assert parse_last_event_id(None) is None
+        assert parse_last_event_id("nope") is None
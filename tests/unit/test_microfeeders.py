@@ -0,0 +1,109 @@
+"""
+Tests for utils.microfeeders module
+"""
+import time
+from unittest.mock import patch
+
+from utils.microfeeders import MicroPoller
+
+INFO = {"name": "micro", "lat": "1", "lon": "2", "alt": "3", "tz": "UTC", "version": "v3"}
+
+
+def fake_get(answers, calls, delay=0.0):
+    """conditional_get_json replacement: answers maps 'ip:port' to a base_info dict, the ETag is its name."""
+
+    def get(url, etag=None, timeout=5.0):
+        hostport = url.split("/")[2]
+        calls.append(hostport)
+        time.sleep(delay)
+        if hostport not in answers:
+            return None, -1, None
+        info = answers[hostport]
+        current = f'"{info["name"]}"'
+        if etag == current:
+            return None, 304, current
+        return info, 200, current
+
+    return get
+
+
+class TestMicroPoller:
+    """Test MicroPoller"""
+
+    def test_port_fallback_is_remembered(self):
+        """Test that the port a microfeeder answered on is asked first next time"""
+        calls = []
+        poller = MicroPoller()
+        with patch("utils.microfeeders.conditional_get_json", side_effect=fake_get({"10.0.0.1:1099": INFO}, calls)):
+            assert poller.fetch("10.0.0.1", "80") == (INFO, "1099", True)
+            assert calls == ["10.0.0.1:80", "10.0.0.1:1099"]
+            calls.clear()
+            # next time the port that answered is asked first
+            assert poller.fetch("10.0.0.1", "80") == (INFO, "1099", False)
+            assert calls == ["10.0.0.1:1099"]
+            calls.clear()
+            # only a microfeeder configured for port 80 may be on 1099 instead
+            assert poller.fetch("10.0.0.2", "8080") == (None, "8080", False)
+            assert calls == ["10.0.0.2:8080"]
+
+    def test_dead_microfeeders_back_off(self):
+        """Test the exponential back off for microfeeders that don't answer"""
+        calls = []
+        poller = MicroPoller(base_backoff=10, max_backoff=25)
+        now = [1000.0]
+        with patch("utils.microfeeders.conditional_get_json", side_effect=fake_get({}, calls)), patch(
+            "utils.microfeeders.time.monotonic", side_effect=lambda: now[0]
+        ):
+            assert poller.fetch("10.0.0.3", "1099") == (None, "1099", False)
+            assert poller.backing_off("10.0.0.3")
+            poller.fetch("10.0.0.3", "1099")
+            assert len(calls) == 1
+            # forcing (explicit import by the user) always asks
+            poller.fetch("10.0.0.3", "1099", force=True)
+            assert len(calls) == 2
+            # 10s after the first failure, 20s after the second, capped at 25s after that
+            now[0] += 19.9
+            assert poller.backing_off("10.0.0.3")
+            now[0] += 0.2
+            poller.fetch("10.0.0.3", "1099")
+            assert len(calls) == 3
+            now[0] += 25.1
+            poller.fetch("10.0.0.3", "1099")
+            assert len(calls) == 4
+
+        with patch("utils.microfeeders.conditional_get_json", side_effect=fake_get({"10.0.0.3:1099": INFO}, calls)):
+            assert poller.fetch("10.0.0.3", "1099", force=True) == (INFO, "1099", True)
+            assert not poller.backing_off("10.0.0.3")
+
+    def test_poll_is_concurrent(self):
+        """Test that poll() asks all microfeeders at the same time"""
+        calls = []
+        answers = {f"10.0.0.{i}:80": dict(INFO, name=f"micro{i}") for i in range(1, 7)}
+        targets = [(i, f"10.0.0.{i}", "80") for i in range(1, 7)]
+        poller = MicroPoller()
+        start = time.monotonic()
+        with patch("utils.microfeeders.conditional_get_json", side_effect=fake_get(answers, calls, delay=0.2)):
+            results = poller.poll(targets)
+        assert time.monotonic() - start < 0.8
+        assert sorted(results) == [1, 2, 3, 4, 5, 6]
+        assert all(results[i] == (answers[f"10.0.0.{i}:80"], "80", True) for i in results)
+
+    def test_unchanged_base_info_comes_from_the_cache(self):
+        """Test that a 304 answer returns the cached base_info"""
+        calls = []
+        answers = {"10.0.0.4:80": INFO}
+        seen_etags = []
+        get = fake_get(answers, calls)
+
+        def recording_get(url, etag=None, timeout=5.0):
+            seen_etags.append(etag)
+            return get(url, etag, timeout)
+
+        poller = MicroPoller()
+        with patch("utils.microfeeders.conditional_get_json", side_effect=recording_get):
+            assert poller.fetch("10.0.0.4", "80") == (INFO, "80", True)
+            # 304: the cached copy, unchanged
+            assert poller.fetch("10.0.0.4", "80") == (INFO, "80", False)
+            answers["10.0.0.4:80"] = dict(INFO, name="renamed")
+            assert poller.fetch("10.0.0.4", "80") == (answers["10.0.0.4:80"], "80", True)
+        assert seen_etags == [None, '"micro"', '"micro"']
@@ -0,0 +1,152 @@
+"""
+Tests for utils.multioutline module
+"""
+
+import json
+import math
+from unittest.mock import patch
+
+import pytest
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+
+from utils.multioutline import MultiOutline
+
+
+def circle(lat, lon, radius, n=360):
+    return [[lat + radius * math.sin(2 * math.pi * k / n), lon + radius * math.cos(2 * math.pi * k / n)] for k in range(n)]
+
+
+def outline(points):
+    return {"actualRange": {"last24h": {"points": points}}}
+
+
+def square(x, y, size=1.0):
+    return [[x, y], [x + size, y], [x + size, y + size], [x, y + size]]
+
+
+class TestMultiOutline:
+    """Test MultiOutline"""
+
+    def test_overlapping_outlines_are_merged(self):
+        """Test that overlapping outlines are merged and separate ones kept"""
+        result = MultiOutline().create([outline(square(0, 0)), outline(square(0.5, 0.5)), outline(square(10, 10))])
+        assert len(result["multiRange"]) == 2
+        areas = sorted(Polygon(r).area for r in result["multiRange"])
+        assert areas == [1.0, 1.75]
+
+    def test_bounding_boxes_overlap_but_outlines_dont(self):
+        """Test outlines whose bounding boxes overlap but the outlines don't"""
+        # an L shape whose bounding box contains the little square
+        ell = [[0, 0], [3, 0], [3, 1], [1, 1], [1, 3], [0, 3]]
+        result = MultiOutline().create([outline(ell), outline(square(2, 2, 0.5))])
+        assert len(result["multiRange"]) == 2
+
+    def test_heywhatsthat_rings(self):
+        """Test merging the heywhatsthat rings"""
+        data = [
+            {"rings": [{"alt": 3048, "points": square(0, 0)}, {"alt": 12192, "points": square(0, 0, 2)}]},
+            {"rings": [{"alt": 3048, "points": square(0.5, 0)}, {"alt": 12192, "points": square(5, 5)}]},
+        ]
+        assert len(MultiOutline().create(data, hwt_alt=3048)["multiRange"]) == 1
+        assert len(MultiOutline().create(data, hwt_alt=12192)["multiRange"]) == 2
+
+    def test_create_outline_skips_unchanged_inputs(self, tmp_path):
+        """Test that unchanged inputs don't recreate the outline"""
+        path = tmp_path / "multiOutline.json"
+        data = [outline(square(0, 0)), outline(square(0.5, 0.5))]
+        with patch.object(MultiOutline, "_get_outlines", return_value=data), patch("utils.multioutline.MULTIOUTLINE_JSON", str(path)):
+            first = MultiOutline().create_outline(2)
+            assert first is not None and len(first["multiRange"]) == 1
+            path.write_text(json.dumps(first))
+            # unchanged inputs don't even build the polygons
+            with patch.object(MultiOutline, "_polygon", side_effect=AssertionError("polygons built")):
+                assert MultiOutline().create_outline(2) is None
+
+            data[1] = outline(square(5, 5))
+            assert len(MultiOutline().create_outline(2)["multiRange"]) == 2
+
+    def test_rings_have_no_hash(self):
+        """Test that the per ring results don't compute a hash nobody reads"""
+        data = [{"rings": [{"alt": 3048, "points": square(0, 0)}]}]
+        assert "multioutline_hash" not in MultiOutline().create(data, hwt_alt=3048, with_hash=False)
+        assert MultiOutline().create(data, hwt_alt=3048)["multioutline_hash"] == MultiOutline().outline_hash(data, 3048)
+
+    def test_get_heywhatsthat_reads_env_once_and_keeps_site_order(self):
+        """Test that the env is read once and the site order kept"""
+        env = {
+            "AF_TAR1090_PORT": "8081",
+            "_ADSBIM_HEYWHATSTHAT_ENABLED_1": "True",
+            "_ADSBIM_HEYWHATSTHAT_ENABLED_2": "False",
+            "_ADSBIM_HEYWHATSTHAT_ENABLED_3": "True",
+            "_ADSBIM_HEYWHATSTHAT_ENABLED_4": "True",
+        }
+        replies = {
+            "http://127.0.0.1:8081/1/upintheair.json": ("one", 200),
+            "http://127.0.0.1:8081/3/upintheair.json": ("three", 200),
+            "http://127.0.0.1:8081/4/upintheair.json": (None, 404),
+        }
+        with patch("utils.multioutline.read_values_from_env_file", return_value=env) as read_env, patch(
+            "utils.multioutline.get_plain_url", side_effect=lambda url: replies[url]
+        ) as get_url:
+            mo = MultiOutline()
+            assert mo._get_heywhatsthat(4) == ["one", "three"]
+            assert mo._tar1090port() == "8081"
+        assert read_env.call_count == 1
+        assert get_url.call_count == 3
+
+    def test_parallel_rings_match_serial(self):
+        """Test that merging the rings in parallel gives the serial result"""
+        data = [
+            {"lat": 0, "lon": 0, "rings": [{"alt": 3048, "points": square(0, 0)}, {"alt": 12192, "points": square(0, 0, 2)}]},
+            {"lat": 0, "lon": 0, "rings": [{"alt": 3048, "points": square(0.5, 0)}, {"alt": 12192, "points": square(5, 5)}]},
+        ]
+        alts = [3048, 12192]
+        expected = {alt: MultiOutline().create(data, hwt_alt=alt)["multiRange"] for alt in alts}
+        with patch("utils.multioutline.os.cpu_count", return_value=2):
+            assert MultiOutline()._create_rings(data, alts) == expected
+        with patch("utils.multioutline.os.cpu_count", return_value=1):
+            assert MultiOutline()._create_rings(data, alts) == expected
+
+        responses = [json.dumps(d) for d in data]
+        with patch.object(MultiOutline, "_get_heywhatsthat", return_value=responses), patch(
+            "utils.multioutline.get_plain_url", return_value=(None, 404)
+        ):
+            result = MultiOutline().create_heywhatsthat(2)
+        assert [r["alt"] for r in result["rings"]] == [3048, 12192, 12192]
+
+    @pytest.mark.benchmark
+    def test_merge_benchmark(self):
+        """Micro-benchmark: 20 overlapping synthetic outlines, pairwise merge loop vs. one unary_union"""
+        import time
+
+        data = [outline(circle(45 + (k % 5) * 1.5, 10 + (k // 5) * 1.5, 1.0 + 0.1 * (k % 3))) for k in range(20)]
+        polygons = [Polygon(d["actualRange"]["last24h"]["points"]) for d in data]
+
+        # the previous approach: keep merging pairs until nothing changes
+        start = time.perf_counter()
+        merged = list(polygons)
+        made_change = True
+        while made_change:
+            made_change = False
+            for i in range(len(merged)):
+                for j in range(i + 1, len(merged)):
+                    if not merged[i].disjoint(merged[j]):
+                        merged[i] = unary_union([merged[i], merged[j]])
+                        del merged[j]
+                        made_change = True
+                        break
+                if made_change:
+                    break
+        pairwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        union = MultiOutline()._merge(polygons, 0)
+        union_time = time.perf_counter() - start
+
+        result = MultiOutline().create(data)
+
+        assert len(result["multiRange"]) == len(union) == len(merged) == 1
+        assert abs(union[0].area - merged[0].area) < 1e-6
+        print(f"20 outlines: pairwise merge {pairwise_time * 1000:.1f}ms, single unary_union {union_time * 1000:.1f}ms")
+        assert union_time < pairwise_time
@@ -0,0 +1,55 @@
+"""
+Tests for utils.prom module
+"""
+import os
+
+from utils.prom import PromSnapshot
+
+STATS_PROM = """# HELP readsb_uptime uptime in ms
+readsb_uptime 123456000
+readsb_messages_valid 60000
+readsb_last1min_position_count_total 1200
+readsb_aircraft_with_position 42
+readsb_net_connector_status{host="feed.adsb.lol",port="1337"} 3600
+readsb_net_connector_status{host="feed.adsb.fi",port="30004"} 0
+readsb_net_connector_status{host="192.168.1.20",port="30005"} 15
+"""
+
+
+class TestPromSnapshot:
+    """Test PromSnapshot"""
+
+    def test_parse_values_and_labels(self):
+        """Test parsing values with and without labels"""
+        prom = PromSnapshot(STATS_PROM)
+        assert prom.value("readsb_uptime") == 123456000
+        assert prom.value("readsb_net_connector_status", host="feed.adsb.lol", port="1337") == 3600
+        assert prom.value("readsb_net_connector_status", host="feed.adsb.fi", port="30004") == 0
+        # a subset of the labels is enough
+        assert prom.value("readsb_net_connector_status", host="192.168.1.20") == 15
+        assert prom.value("readsb_net_connector_status", host="feed.adsb.lol", port="1") is None
+        assert prom.value("readsb_missing") is None
+        assert prom.find("position_count_total") == 1200
+
+    def test_get_caches_until_the_file_changes(self, tmp_path):
+        """Test that get() reuses the snapshot until the file changes"""
+        path = tmp_path / "stats.prom"
+        path.write_text(STATS_PROM)
+        parses = PromSnapshot.parses
+
+        first = PromSnapshot.get(str(path))
+        assert first is not None
+        assert PromSnapshot.get(str(path)) is first
+        assert PromSnapshot.parses == parses + 1
+
+        path.write_text(STATS_PROM.replace("readsb_aircraft_with_position 42", "readsb_aircraft_with_position 7"))
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = PromSnapshot.get(str(path))
+        assert second is not first
+        assert second.value("readsb_aircraft_with_position") == 7
+        assert PromSnapshot.parses == parses + 2
+
+    def test_get_missing_file(self, tmp_path):
+        """Test that get() returns None for a missing file"""
+        assert PromSnapshot.get(str(tmp_path / "nope.prom")) is None
@@ -0,0 +1,157 @@
+"""
+Tests for utils.restore module
+"""
+import hashlib
+import io
+import os
+import time
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+from utils.backup import BackupEngine
+from utils.restore import RestoreEngine, RestoreError
+
+from .test_backup import KeepOpen, make_tree, run_backup
+
+BOUNDARY = b"----WebKitFormBoundaryabc123"
+
+
+def make_backup(tmp_path):
+    adsb_path, sites = make_tree(tmp_path)
+    out = KeepOpen()
+    engine = BackupEngine(adsb_path, tmp_path / "manifest.json", writeback=lambda p, i: None)
+    assert engine.write(out, sites, include_graphs=True, include_heatmap=True)
+    return adsb_path, out.getvalue()
+
+
+def upload(tmp_path, data, chunk_size=1000):
+    """Feed data to the engine the way AdsbIm.restore does: first chunk already split off the part header."""
+    body = b"\r\n--" + BOUNDARY + b"--\r\n"
+    stream = io.BytesIO(data[chunk_size:] + body)
+    engine = RestoreEngine(tmp_path / "upload.backup")
+    digest = engine.receive(stream, data[:chunk_size], BOUNDARY, len(data) + len(body))
+    return engine, digest
+
+
+class TestRestoreEngine:
+    """Test RestoreEngine"""
+
+    def test_upload_is_hashed_and_trailer_stripped(self, tmp_path):
+        """Test that the upload is hashed while received and the trailer stripped"""
+        _, data = make_backup(tmp_path)
+        engine, digest = upload(tmp_path, data)
+        assert (tmp_path / "upload.backup").read_bytes() == data
+        assert digest == hashlib.sha256(data).hexdigest()
+        assert engine.progress()["state"] == "received"
+        assert engine.progress()["sha256"] == digest
+
+    def test_extract_in_place(self, tmp_path):
+        """Test extracting the backup in place"""
+        adsb_path, data = make_backup(tmp_path)
+        engine, _ = upload(tmp_path, data)
+        assert not engine.check_manifest()
+        assert "config.json" in engine.members()
+        assert not engine.differs("config.json", adsb_path / "config.json")
+
+        dest = tmp_path / "restored"
+        names = engine.names("ultrafeeder/10.0.0.1/") + ["config.json"]
+        engine.extract(names, dest)
+        for name in names:
+            assert (dest / name).read_bytes() == (adsb_path / name).read_bytes()
+        progress = engine.progress()
+        assert progress["state"] == "done"
+        assert progress["bytes_done"] == progress["bytes_total"]
+
+    def test_stored_members_fall_back_to_plain_copy(self, tmp_path):
+        """Test extracting stored members without copy_file_range and sendfile"""
+        adsb_path, data = make_backup(tmp_path)
+        engine, _ = upload(tmp_path, data)
+        name = "ultrafeeder/graphs1090/rrd/localhost.tar.gz"
+        assert engine.members()[name].compress_type == zipfile.ZIP_STORED
+        with patch.object(RestoreEngine, "_copy_file_range", side_effect=OSError), patch.object(
+            RestoreEngine, "_sendfile", side_effect=OSError
+        ):
+            engine.extract([name], tmp_path / "restored")
+        assert (tmp_path / "restored" / name).read_bytes() == (adsb_path / name).read_bytes()
+
+    def test_corrupted_stored_member(self, tmp_path):
+        """Test that a stored member copied by the kernel is still checked"""
+        _, data = make_backup(tmp_path)
+        name = "ultrafeeder/graphs1090/rrd/localhost.tar.gz"
+        info = zipfile.ZipFile(io.BytesIO(data)).getinfo(name)
+        # flip the last byte of the member data, right before the next local header
+        end = info.header_offset + 30 + len(info.orig_filename.encode()) + len(info.extra) + info.compress_size
+        data = data[: end - 1] + bytes([data[end - 1] ^ 0xFF]) + data[end:]
+        engine, _ = upload(tmp_path, data)
+        with pytest.raises(RestoreError):
+            engine.extract([name], tmp_path / "restored")
+        assert engine.progress()["state"] == "failed"
+
+    def test_manifest_mismatch(self, tmp_path):
+        """Test that a member that doesn't match the manifest is rejected"""
+        _, data = make_backup(tmp_path)
+        src = zipfile.ZipFile(io.BytesIO(data))
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as dst:
+            for info in src.infolist():
+                content = src.read(info)
+                if info.filename == "ultrafeeder/globe_history/2026/10/01/acas.csv":
+                    # same size, different content
+                    content = content.replace(b"a", b"b", 1)
+                if info.filename != "ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf":
+                    dst.writestr(info, content)
+        engine, _ = upload(tmp_path, out.getvalue())
+        assert engine.check_manifest() == ["ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf"]
+        with pytest.raises(RestoreError):
+            engine.extract(["ultrafeeder/globe_history/2026/10/01/acas.csv"], tmp_path / "restored")
+        assert engine.progress()["state"] == "failed"
+
+    def test_restore_dir_replaces_the_directory(self, tmp_path):
+        """Test that restoring a directory from a full backup replaces it"""
+        adsb_path, data = make_backup(tmp_path)
+        stray = adsb_path / "ultrafeeder/globe_history/2026/10/03/acas.csv"
+        stray.parent.mkdir(parents=True)
+        stray.write_text("not in the backup")
+        engine, _ = upload(tmp_path, data)
+        assert not engine.incremental
+        engine.restore_dir("ultrafeeder/globe_history/", adsb_path)
+        assert not stray.exists()
+        assert (adsb_path / "ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf").exists()
+
+    def test_incremental_restore_keeps_skipped_files(self, tmp_path):
+        """Test that restoring an incremental backup on top of existing data keeps the files it left out"""
+        adsb_path, sites = make_tree(tmp_path)
+        manifest_path = tmp_path / "manifest.json"
+        run_backup(BackupEngine(adsb_path, manifest_path), sites, include_heatmap=True)
+        acas = adsb_path / "ultrafeeder/globe_history/2026/10/01/acas.csv"
+        acas.write_text("changed")
+        os.utime(acas, ns=(0, time.time_ns() + 10**9))
+        out = KeepOpen()
+        assert BackupEngine(adsb_path, manifest_path).write(out, sites, include_heatmap=True, incremental=True)
+        heatmap = adsb_path / "ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf"
+        skipped = heatmap.read_bytes()
+        names = zipfile.ZipFile(io.BytesIO(out.getvalue())).namelist()
+        assert "ultrafeeder/globe_history/2026/10/01/heatmap/00.bin.ttf" not in names
+
+        acas.write_text("changed again after the backup")
+        engine, _ = upload(tmp_path, out.getvalue())
+        assert engine.incremental
+        engine.restore_dir("ultrafeeder/globe_history/", adsb_path)
+        assert acas.read_text() == "changed"
+        assert heatmap.read_bytes() == skipped
+        assert (adsb_path / "ultrafeeder/globe_history/internal_state/blob").exists()
+
+    def test_unexpected_members_are_ignored(self, tmp_path):
+        """Test that members outside the known paths, or escaping them, are ignored"""
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as zf:
+            zf.writestr("config.json", "{}")
+            zf.writestr("ultrafeeder/../../etc/passwd", "x")
+            zf.writestr("/etc/shadow", "x")
+            zf.writestr("something/else", "x")
+        engine, _ = upload(tmp_path, out.getvalue())
+        assert list(engine.members()) == ["config.json"]
+        assert engine.manifest is None
+        assert engine.check_manifest() == []
@@ -0,0 +1,105 @@
+"""
+Tests for utils.sanitizer module
+"""
+import io
+import zipfile
+
+import pytest
+
+from utils.sanitizer import Sanitizer, SanitizerError, SectionIndex, secrets_from_config, write_bundle
+
+SEPARATOR = b"\n" + b"-" * 106 + b"\n"
+
+
+class TestSanitizer:
+    """Test Sanitizer"""
+
+    def test_secrets_from_config(self):
+        """Test the secrets collected from config.json"""
+        config = {
+            "FEEDER_LAT": "45.1234",
+            "MLAT_SITE_NAME": ["home", " ", "roof"],
+            "FEEDER_SM_PASSWORD": "pa$s",
+            "FEEDER_RV_FEEDER_KEY": "True",
+            "FEEDER_OPENSKY_SERIAL": None,
+        }
+        assert secrets_from_config(config) == [
+            ("45.1234", "FEEDER_LAT"),
+            ("home", "MLAT_SITE_NAME_0"),
+            ("roof", "MLAT_SITE_NAME_2"),
+            ("pa$s", "FEEDER_SM_PASSWORD"),
+            ("pa$$s", "FEEDER_SM_PASSWORD"),
+        ]
+
+    def test_sanitize_rules_and_secrets(self):
+        """Test the built-in rules, and that longer secrets win over shorter ones"""
+        sanitizer = Sanitizer([("myhost", "HOSTNAME"), ("abc", "SHORT"), ("abcdef", "LONG")])
+        log = (
+            b"piaware --lat 45.1 --lon 10.2 started\n"
+            b"connected to 192.168.1.17 from myhost\n"
+            b"uuid 12345678-1234-1234-1234-123456789abc key abcdef and abc\n"
+            b"Accepted publickey for root from somewhere\n"
+        )
+        assert sanitizer.sanitize(log) == (
+            b"piaware --lat <redacted> --lon <redacted> started\n"
+            b"connected to <hidden-ip-address> from HOSTNAME\n"
+            b"uuid <hidden-uuid> key LONG and SHORT\n"
+            b"Accepted publickey <redacted>\n"
+        )
+
+    def test_single_pass_doesnt_replace_placeholders(self):
+        """Test that placeholders aren't replaced again"""
+        # a secret that happens to be part of another secret's placeholder is left alone
+        sanitizer = Sanitizer([("hunter2", "FEEDER_SM_PASSWORD"), ("PASSWORD", "oops")])
+        assert sanitizer.sanitize(b"hunter2\n") == b"FEEDER_SM_PASSWORD\n"
+
+    def test_chunks_never_split_a_line(self):
+        """Test that chunks end at line boundaries, so no secret is split between chunks"""
+        secret = "s3cr3t-value"
+        sanitizer = Sanitizer([(secret, "SECRET")])
+        log = "".join(f"line {i} {secret}\n" for i in range(1000)).encode()
+        chunks = list(sanitizer.chunks(io.BytesIO(log + b"no newline " + secret.encode()), chunk_size=7))
+        out = b"".join(chunks)
+        assert secret.encode() not in out
+        assert out.count(b"SECRET") == 1001
+        assert all(c.endswith(b"\n") for c in chunks[:-1])
+
+    def test_from_config_file(self, tmp_path):
+        """Test that the secrets come from config.json, and that a missing or broken one is an error"""
+        config = tmp_path / "config.json"
+        config.write_text('{"FEEDER_LAT": "47.123"}')
+        assert Sanitizer.from_config_file(config).sanitize(b"lat 47.123\n") == b"lat FEEDER_LAT\n"
+        with pytest.raises(SanitizerError):
+            Sanitizer.from_config_file(tmp_path / "missing.json")
+        config.write_text('{"FEEDER_LAT": ')
+        with pytest.raises(SanitizerError):
+            Sanitizer.from_config_file(config)
+        config.write_text('["FEEDER_LAT"]')
+        with pytest.raises(SanitizerError):
+            Sanitizer.from_config_file(config)
+
+
+class TestBundle:
+    """Test the diagnostics bundle"""
+
+    def test_bundle_has_log_and_index(self):
+        """Test that the bundle contains the log and its section index"""
+        log = b"important:\n{}\n" + SEPARATOR + b"\nuname -a:\nLinux 10.0.0.1\n" + SEPARATOR + b"\ndf:\n/dev/root\n"
+        out = io.BytesIO()
+        write_bundle(Sanitizer([]), io.BytesIO(log), out)
+        with zipfile.ZipFile(out) as bundle:
+            text = bundle.read("diagnostics.txt").decode()
+            index = bundle.read("index.txt").decode().splitlines()
+        assert "<hidden-ip-address>" in text
+        lines = text.split("\n")
+        sections = [line.split(None, 1) for line in index[1:]]
+        assert [title for _, title in sections] == ["important", "uname -a", "df"]
+        for number, title in sections:
+            assert lines[int(number) - 1] == title + ":"
+
+    def test_section_index_across_chunks(self):
+        """Test the section index for sections split across chunks"""
+        index = SectionIndex()
+        for chunk in [b"first:\n", SEPARATOR[1:], b"\n", b"second:\nsome\n"]:
+            index.feed(chunk)
+        assert index.sections == [(1, "first"), (4, "second")]
@@ -0,0 +1,194 @@
+"""
+Tests for utils.server module
+"""
+import http.client
+import socket
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from utils.events import EventHub
+from utils.server import PooledWSGIServer, Server
+
+
+def make_app(release=None, hub=None):
+    app = Flask(__name__)
+
+    @app.route('/fast')
+    def fast():
+        return 'ok'
+
+    @app.route('/slow')
+    def slow():
+        release.wait(5)
+        return 'slow'
+
+    @app.route('/events')
+    def events():
+        return app.response_class(hub.stream(), mimetype='text/event-stream')
+
+    return app
+
+
+@pytest.fixture
+def pooled():
+    servers = []
+
+    def start(app, **kwargs):
+        server = PooledWSGIServer('127.0.0.1', 0, app, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.drain(2)
+
+
+def get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def subscribe(port, path='/events?client=1'):
+    """Open an event stream and read its first event, the connection stays open"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    assert response.status == 200
+    assert response.fp.readline()
+    return conn, response
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestPooledWSGIServer:
+    """Test PooledWSGIServer"""
+
+    def test_chunked_stream(self, pooled):
+        """Test that a response without a length is chunked"""
+        app = make_app()
+
+        @app.route('/stream')
+        def stream():
+            return app.response_class((f'{i}\n' for i in range(3)), mimetype='text/plain')
+
+        server = pooled(app)
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+        conn.request('GET', '/stream')
+        response = conn.getresponse()
+        assert response.getheader('Transfer-Encoding') == 'chunked'
+        assert response.read() == b'0\n1\n2\n'
+
+    def test_silent_clients_are_dropped(self, pooled):
+        """Test that a client that stops sending frees its worker"""
+        server = pooled(make_app(), timeout=0.2)
+        sock = socket.create_connection(('127.0.0.1', server.server_port))
+        sock.sendall(b'GET /fast HTTP/1.1\r\n')
+        time.sleep(0.05)
+        assert server.stats()['open_connections'] == 1
+        time.sleep(0.5)
+        # the worker gave up on the half sent request, so it is free again
+        assert server.stats()['open_connections'] == 0
+        sock.close()
+
+    def test_full_queue_gets_503(self, pooled):
+        """Test the 503 when all workers and the backlog are busy"""
+        release = threading.Event()
+        server = pooled(make_app(release), threads=2, backlog=1)
+        results = []
+
+        def slow():
+            results.append(get(server.server_port, '/slow'))
+
+        clients = [threading.Thread(target=slow) for _ in range(3)]
+        for client in clients:
+            client.start()
+        deadline = time.monotonic() + 2
+        while server.stats()['open_connections'] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert get(server.server_port, '/fast')[0] == 503
+        assert server.stats()['rejected'] == 1
+
+        release.set()
+        for client in clients:
+            client.join()
+        assert results == [(200, b'slow')] * 3
+
+    def test_drain_waits_for_running_requests(self, pooled):
+        """Test that drain waits for the running requests"""
+        release = threading.Event()
+        server = pooled(make_app(release))
+        results = []
+        client = threading.Thread(target=lambda: results.append(get(server.server_port, '/slow')))
+        client.start()
+        deadline = time.monotonic() + 2
+        while server.stats()['open_connections'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        server.shutdown()
+        assert not server.drain(0.1)
+        release.set()
+        assert server.drain(2)
+        client.join()
+        assert results == [(200, b'slow')]
+
+    def test_streams_dont_use_the_pool(self, pooled):
+        """Test that more event streams than workers don't keep other requests from being answered"""
+        hub = EventHub(keepalive=0.1)
+        server = pooled(make_app(hub=hub), threads=2, backlog=0, streams=6, stream_paths=['/events'])
+        clients = [subscribe(server.server_port) for _ in range(5)]
+        assert wait_for(lambda: hub.subscribers == 5)
+        assert server.stats()['open_streams'] == 5
+
+        for _ in range(5):
+            assert get(server.server_port, '/fast') == (200, b'ok')
+        # the streams have their own cap
+        clients.append(subscribe(server.server_port))
+        assert get(server.server_port, '/events')[0] == 503
+
+        hub.close()
+        server.shutdown()
+        assert server.drain(2)
+        for conn, _ in clients:
+            conn.close()
+
+
+class TestServer:
+    """Test Server"""
+
+    def test_server_settings_from_environment(self):
+        """Test the settings from the environment"""
+        app = make_app()
+        environ = {'ADSBIM_SERVER_THREADS': '4', 'ADSBIM_SERVER_TIMEOUT': '2.5', 'ADSBIM_SERVER_STREAMS': '8'}
+        server = Server(app, '127.0.0.1', 0, environ=environ)
+        assert (server.mode, server.threads, server.backlog, server.timeout, server.streams) == ('pooled', 4, 32, 2.5, 8)
+        server = Server(app, '127.0.0.1', 0, environ={'ADSBIM_SERVER': 'werkzeug', 'ADSBIM_SERVER_THREADS': 'lots'})
+        assert (server.mode, server.threads) == ('werkzeug', 16)
+        assert Server(app, '127.0.0.1', 0, debug=True, environ={}).mode == 'werkzeug'
+        assert Server(app, '127.0.0.1', 0, environ={'ADSBIM_SERVER': 'gunicorn'}).mode == 'pooled'
+
+    def test_server_serve_and_shutdown(self):
+        """Test serving and shutting down"""
+        server = Server(make_app(), '127.0.0.1', 0, environ={})
+        thread = threading.Thread(target=server.serve, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 2
+        while server._server is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert get(server._server.server_port, '/fast') == (200, b'ok')
+        assert server.stats()['mode'] == 'pooled'
+        server.shutdown(grace=2)
+        thread.join(2)
+        assert not thread.is_alive()
@@ -0,0 +1,88 @@
+"""
+Tests for utils.stats_store module
+"""
+import pytest
+
+from utils.icao_set import IcaoSet
+from utils.stats_store import DAY, HOUR, StatsStore
+
+T0 = 1700006400  # a UTC midnight
+
+
+def make_store(tmp_path):
+    return StatsStore(str(tmp_path / "stats.db"))
+
+
+class TestStatsStore:
+    """Test StatsStore persistence and queries"""
+
+    def test_hours_are_written_when_over(self, tmp_path):
+        """Test that an hour's row is written once the hour is over, and survives a restart"""
+        store = make_store(tmp_path)
+        store.add_minute(0, T0 + 60, IcaoSet([1, 2]), 600, 100, 2)
+        store.add_minute(0, T0 + 120, IcaoSet([2, 3]), 660, 110, 3)
+
+        # the hour in progress is visible, but not in the database yet
+        assert store.query(T0, T0 + DAY) == {0: [[T0, 3, 1260, 210]]}
+        assert store._db.execute("SELECT COUNT(*) FROM hourly").fetchone()[0] == 0
+
+        store.add_minute(0, T0 + HOUR + 60, IcaoSet([4]), 10, 1, 4)
+        assert store._db.execute("SELECT * FROM hourly").fetchall() == [(0, T0, 3, 1260, 210)]
+        assert store.query(T0, T0 + DAY) == {0: [[T0, 3, 1260, 210], [T0 + HOUR, 1, 10, 1]]}
+        assert store.query(T0, T0 + DAY, "day") == {0: [[T0, 3, 1260, 210]]}
+
+        store.flush()
+        assert store.query(T0, T0 + DAY, "day") == {0: [[T0, 4, 1270, 211]]}
+        store.close()
+
+        # and it's all still there after a restart
+        store = make_store(tmp_path)
+        assert store.query(T0 + HOUR, T0 + 2 * HOUR) == {0: [[T0 + HOUR, 1, 10, 1]]}
+
+    def test_import_days_keeps_existing_rows(self, tmp_path):
+        """Test that importing days doesn't overwrite rows that already exist"""
+        store = make_store(tmp_path)
+        store.add_minute(0, T0 - DAY + 60, IcaoSet([1]), 1, 1, 1)
+        store.flush()
+        store.import_days(0, [(T0 - DAY, 500), (T0 - 2 * DAY, 400)])
+        assert store.query(T0 - 2 * DAY, T0, "day") == {0: [[T0 - 2 * DAY, 400, 0, 0], [T0 - DAY, 1, 1, 1]]}
+
+    def test_remove_and_move_sites(self, tmp_path):
+        """Test removing a site and moving a site to a new index"""
+        store = make_store(tmp_path)
+        for site in range(4):
+            store.add_minute(site, T0, IcaoSet(range(site + 1)), site, site, site + 1)
+        store.flush()
+
+        store.remove_site(1)
+        assert {s: rows[0][1] for s, rows in store.query(T0, T0 + HOUR).items()} == {0: 1, 1: 3, 2: 4}
+
+        store.move_site(2, 1)
+        assert {s: rows[0][1] for s, rows in store.query(T0, T0 + HOUR).items()} == {0: 1, 1: 4, 2: 3}
+        store.move_site(0, 2)
+        assert {s: rows[0][1] for s, rows in store.query(T0, T0 + HOUR).items()} == {0: 4, 1: 3, 2: 1}
+        assert {s: rows[0][1] for s, rows in store.query(T0, T0 + HOUR, "day").items()} == {0: 4, 1: 3, 2: 1}
+
+    @pytest.mark.benchmark
+    def test_year_range_query_benchmark(self, tmp_path):
+        """Micro-benchmark: a year of hourly rows for 5 sites, range queries against the index"""
+        import time
+
+        store = make_store(tmp_path)
+        with store._db:
+            store._db.executemany(
+                "INSERT INTO hourly VALUES (?, ?, ?, ?, ?)",
+                ((site, T0 + h * HOUR, h % 500, h, h) for site in range(5) for h in range(365 * 24)),
+            )
+
+        start = time.perf_counter()
+        week = store.query(T0 + 200 * DAY, T0 + 207 * DAY)
+        week_time = time.perf_counter() - start
+        start = time.perf_counter()
+        year = store.query(T0, T0 + 365 * DAY, site=3)
+        year_time = time.perf_counter() - start
+
+        assert [len(week[s]) for s in range(5)] == [7 * 24] * 5
+        assert len(year[3]) == 365 * 24
+        print(f"43800 hourly rows: one week for all sites {week_time * 1000:.2f}ms, one year for one site {year_time * 1000:.2f}ms")
+        assert week_time < 0.5
@@ -10,6 +10,7 @@ from unittest.mock import patch, MagicMock, call, PropertyMock
 import pytest
 import requests
 
+from utils.docker_watcher import ContainerState
 from utils.system import Lock, Restart, System
 from utils.data import Data
 
@@ -848,6 +849,27 @@ class TestSystemDocker:
         assert status == "down"
 
 
+    @patch('utils.system.run_shell_captured')
+    def test_getContainerStatus_from_docker_watcher(self, mock_run_shell):
+        """Test getContainerStatus uses the docker watcher state when it's connected"""
+        mock_data = MagicMock(spec=Data)
+        system = System(mock_data)
+        system.docker_watcher.connected = True
+        system.docker_watcher.containers = {
+            "ultrafeeder": ContainerState("running", time.time() - 3600, "healthy"),
+            "piaware": ContainerState("running", time.time() - 5, ""),
+            "fr24": ContainerState("exited", 0.0, ""),
+        }
+
+        assert system.getContainerStatus("ultrafeeder") in ("up for 3600", "up for 3601")
+        assert system.getContainerStatus("piaware") in ("up for 5", "up for 6")
+        assert system.getContainerStatus("fr24") == "down"
+        assert system.getContainerStatus("rbfeeder") == "down"
+        assert sorted(system.list_containers()) == ["piaware", "ultrafeeder"]
+        system.refreshDockerPs()
+        mock_run_shell.assert_not_called()
+
+
 class TestSystemThreadSafety:
     """Test System thread safety"""
 
@@ -21,6 +21,7 @@ from utils.util import (
     report_issue,
     mf_get_ip_and_triplet,
     string2file,
+    conditional_get_json,
     generic_get_json,
     run_shell_captured
 )
@@ -394,7 +395,7 @@ class TestString2File:
 class TestGenericGetJson:
     """Test the generic_get_json function"""
 
-    @patch('requests.request')
+    @patch('requests.Session.request')
     def test_generic_get_json_success(self, mock_request):
         """Test successful JSON retrieval"""
         mock_response = MagicMock()
@@ -408,7 +409,7 @@ class TestGenericGetJson:
         assert status == 200
         mock_request.assert_called_once()
 
-    @patch('requests.request')
+    @patch('requests.Session.request')
     def test_generic_get_json_failure(self, mock_request):
         """Test failed JSON retrieval"""
         mock_request.side_effect = requests.ConnectionError()
@@ -418,7 +419,7 @@ class TestGenericGetJson:
         assert result is None
         assert status == -1
 
-    @patch('requests.request')
+    @patch('requests.Session.request')
     def test_generic_get_json_exception(self, mock_request):
         """Test JSON retrieval with exception"""
         mock_request.side_effect = Exception("Network error")
@@ -429,6 +430,56 @@ class TestGenericGetJson:
         assert status == -1
 
 
+class TestConditionalGetJson:
+    """Test the conditional_get_json function"""
+
+    @patch('requests.Session.request')
+    def test_sends_etag_and_handles_304(self, mock_request):
+        """Test that the ETag is sent and a 304 returns no body"""
+        mock_response = MagicMock()
+        mock_response.status_code = 304
+        mock_response.headers = {"ETag": '"abc"'}
+        mock_request.return_value = mock_response
+
+        result, status, etag = conditional_get_json("http://example.com/api", etag='"abc"')
+
+        assert (result, status, etag) == (None, 304, '"abc"')
+        assert mock_request.call_args.kwargs["headers"]["If-None-Match"] == '"abc"'
+        mock_response.json.assert_not_called()
+
+    @patch('requests.Session.request')
+    def test_returns_new_etag(self, mock_request):
+        """Test a full response with its ETag"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"ETag": '"def"'}
+        mock_response.json.return_value = {"name": "test"}
+        mock_request.return_value = mock_response
+
+        assert conditional_get_json("http://example.com/api") == ({"name": "test"}, 200, '"def"')
+        assert "If-None-Match" not in mock_request.call_args.kwargs["headers"]
+
+    @patch('requests.Session.request')
+    def test_failure(self, mock_request):
+        """Test failed request"""
+        mock_request.side_effect = requests.ConnectionError()
+
+        assert conditional_get_json("http://example.com/api", etag='"abc"') == (None, -1, None)
+
+    @patch('requests.Session.request')
+    def test_local_microfeeder(self, mock_request):
+        """Test that a local microfeeder is asked on localhost, like in generic_get_json"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {"name": "local"}
+        mock_request.return_value = mock_response
+        ip, _ = mf_get_ip_and_triplet("local")
+
+        assert conditional_get_json(f"http://{ip}:80/api/base_info") == ({"name": "local"}, 200, None)
+        assert mock_request.call_args.args[1] == "http://localhost:80/api/base_info"
+
+
 class TestRunShellCaptured:
     """Test the run_shell_captured function"""
 